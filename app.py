@@ -1,19 +1,55 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, g
 import mysql.connector
 from werkzeug.security import check_password_hash
 from datetime import datetime
 from decimal import Decimal
-import requests
+import hashlib
+import hmac
+import logging
 import json
+import math
 from flask import jsonify
 import os
+import re
+import tempfile
+import time
+import uuid
 from dotenv import load_dotenv
 from flask import send_from_directory
+from flask.cli import AppGroup
+import click
+from db_pool import ConnectionPool
+from exchange_rate import ExchangeRateService, DEFAULT_RATE_URL
+from cache import TableCache
+from pagination import ORDER_DATE_KEY_SQL, fetch_keyset_page, is_valid_cursor, order_by
+from search_index import RefreshingIndex
+from typeahead import TypeaheadIndex
+from balances import record_transaction, remove_transaction, rebuild_customer_balances, verify_customer_balances
+from sales_rollup import add_orders, subtract_orders, rebuild_sales_rollup, verify_sales_rollup
+from customer_links import get_or_create_customer_id, reconcile_order_customers
+from history_writer import BatchWriter
+from row_mapper import RowMapper, MONEY, TEXT, default
+from json_provider import FastJSONProvider
+from table_versions import get_table_versions, bump_table_versions
+from app_logging import configure_logging_from_env, bind_request, unbind_request, logging_stats
+from query_stats import QueryStats
+from request_metrics import RequestMetrics
+from schema_migrations import MigrationError, migrate, status as migration_status, check_plans
+from asset_import import ImportFileError, create_import, run_import, start_import, import_status
+from exports import (EXPORT_FORMATS, CONTENT_TYPES, ORDERS_EXPORT_SQL, ORDERS_EXPORT_COLUMNS,
+                     CUSTOMERS_EXPORT_SQL, CUSTOMERS_EXPORT_COLUMNS, LEDGER_EXPORT_SQL,
+                     LEDGER_EXPORT_COLUMNS, ExportStream, open_export_cursor)
 
 # Initialize Flask app ONCE - remove the duplicate
 load_dotenv()
+# JSON logs through a background queue (LOG_LEVEL, LOG_LEVELS, LOG_FORMAT; see app_logging.py)
+configure_logging_from_env()
+log = logging.getLogger(__name__)
+
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 app.secret_key = os.getenv('APP_SECRET_KEY', 'dev-secret-change')
+# jsonify() encodes dates as ISO strings and Decimals as floats (orjson if installed)
+app.json = FastJSONProvider(app)
 
 # Add CORS headers for API calls
 @app.after_request
@@ -26,12 +62,12 @@ def after_request(response):
 # Add error handlers for debugging
 @app.errorhandler(404)
 def not_found_error(error):
-    print(f"404 Error: {error}")
+    log.info("404 Not Found: %s", request.path)
     return "Page not found", 404
 
 @app.errorhandler(500)
 def internal_error(error):
-    print(f"500 Error: {error}")
+    log.error("500 Error: %s", error)
     return "Internal server error", 500
 
 # Database connection configuration (ONLY ONCE)
@@ -40,21 +76,165 @@ DB_USER = os.getenv('DB_USER', 'root')
 DB_PASS = os.getenv('DB_PASS', 'secret')
 DB_NAME = os.getenv('DB_NAME', 'clubinho')
 
+# Connection pool sizing (see db_pool.ConnectionPool for the meaning of each knob)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = float(os.getenv('DB_POOL_RECYCLE', '3600'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '30'))
+
+# SQL timing per endpoint (see query_stats.py); QUERY_STATS_ENABLED=false
+# hands out plain cursors instead
+QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+query_stats = QueryStats(slow_query_ms=float(os.getenv('SLOW_QUERY_MS', '100')),
+                         n_plus_one_threshold=int(os.getenv('N_PLUS_ONE_THRESHOLD', '10')))
+
+db_pool = ConnectionPool(
+    {
+        'host': DB_HOST,
+        'user': DB_USER,
+        'password': DB_PASS,
+        'database': DB_NAME,
+    },
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    timeout=DB_POOL_TIMEOUT,
+    recycle=DB_POOL_RECYCLE,
+    pre_ping=DB_POOL_PRE_PING,
+    ping_after=DB_POOL_PING_AFTER,
+    cursor_wrapper=query_stats.wrap_cursor if QUERY_STATS_ENABLED else None
+)
+
 def get_db_connection():
-    conn = mysql.connector.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASS,
-        database=DB_NAME
-    )
-    # Relax strict date checks so legacy '0000-00-00' rows don't error
-    try:
-        cur = conn.cursor()
-        cur.execute("SET SESSION sql_mode=(SELECT REPLACE(@@sql_mode,'NO_ZERO_DATE',''))")
-        cur.execute("SET SESSION sql_mode=(SELECT REPLACE(@@sql_mode,'NO_ZERO_IN_DATE',''))")
-    finally:
-        cur.close()
-    return conn
+    """Borrow a pooled connection; conn.close() returns it to the pool"""
+    return db_pool.get_connection()
+
+# Request ids tie together the log lines of one request; an incoming
+# X-Request-ID (e.g. from a proxy) is reused when it looks sane
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+@app.before_request
+def bind_request_id():
+    request_id = request.headers.get('X-Request-ID', '')
+    if not REQUEST_ID_RE.match(request_id):
+        request_id = uuid.uuid4().hex
+    g.request_id = request_id
+    g.log_token = bind_request(request_id, request.endpoint)
+
+@app.after_request
+def add_request_id_header(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def unbind_request_id(exc):
+    token = g.pop('log_token', None)
+    if token is not None:
+        unbind_request(token)
+
+@app.before_request
+def begin_query_stats():
+    if QUERY_STATS_ENABLED and request.endpoint != 'static':
+        g.query_stats_token = query_stats.begin(request.endpoint)
+
+@app.teardown_request
+def end_query_stats(exc):
+    token = g.pop('query_stats_token', None)
+    if token is not None:
+        query_stats.end(token)
+
+# Latency/size histograms per endpoint and upstream timings (see request_metrics.py)
+request_metrics = RequestMetrics()
+
+@app.before_request
+def begin_request_metrics():
+    g.request_started = request_metrics.request_started()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        request_metrics.request_finished(started, request.endpoint, request.method,
+                                         response.status_code, response.content_length)
+    return response
+
+@app.teardown_request
+def end_request_metrics(exc):
+    if g.pop('request_started', None) is not None:
+        request_metrics.request_closed(request.endpoint, exception=exc is not None)
+
+# Query result cache shared by the read routes (see cache.TableCache)
+query_cache = TableCache(default_ttl=float(os.getenv('QUERY_CACHE_TTL', '60')),
+                         max_entries=int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '1000')))
+
+# Customer/asset lists for dropdowns and the calculator lookups; a list longer
+# than REFERENCE_CACHE_MAX_ROWS is read from the database each time instead
+reference_cache = TableCache(default_ttl=float(os.getenv('REFERENCE_CACHE_TTL', '60')),
+                             max_entries=int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', '16')),
+                             max_entry_size=int(os.getenv('REFERENCE_CACHE_MAX_ROWS', '50000')))
+
+DASHBOARD_TABLES = ('customers', 'assets', 'orders', 'quotes', 'customer_accounts')
+DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', '60'))
+
+# Tables whose lookup lists are served with ETags (shared counters in table_versions,
+# bumped by bump_table_versions() inside every transaction that writes them)
+VERSIONED_TABLES = ('customers', 'assets')
+
+def mark_tables_changed(*tables):
+    """Call after committing a write so cached results built from these tables are dropped"""
+    query_cache.invalidate_tables(*tables)
+    reference_cache.invalidate_tables(*tables)
+    for table, index in search_indexes.values():
+        if table in tables:
+            index.mark_stale()
+    for table, index in typeahead_indexes.values():
+        if table in tables:
+            index.mark_stale()
+
+def customer_names(cursor):
+    """Sorted distinct customer names (cached until customers is written)"""
+    def load():
+        cursor.execute("""
+            SELECT DISTINCT customer_name FROM customers
+            WHERE customer_name IS NOT NULL AND customer_name != ''
+            ORDER BY customer_name
+        """)
+        return tuple(row[0] for row in cursor.fetchall())
+    return reference_cache.get_or_load('customer_names', ('customers',), load)
+
+def asset_names(cursor):
+    """Sorted distinct asset names (cached until assets is written)"""
+    def load():
+        cursor.execute("""
+            SELECT DISTINCT asset_name FROM assets
+            WHERE asset_name IS NOT NULL AND asset_name != ''
+            ORDER BY asset_name
+        """)
+        return tuple(row[0] for row in cursor.fetchall())
+    return reference_cache.get_or_load('asset_names', ('assets',), load)
+
+def asset_prices(cursor):
+    """(asset_name, real) rows sorted by name (cached until assets is written)"""
+    def load():
+        cursor.execute("""
+            SELECT asset_name, `real` FROM assets
+            WHERE asset_name IS NOT NULL AND asset_name != ''
+            ORDER BY asset_name
+        """)
+        return tuple(cursor.fetchall())
+    return reference_cache.get_or_load('asset_prices', ('assets',), load)
+
+def list_items(mapper, rows):
+    """
+    rows mapped for a JSON list: dicts by default, or with ?shape=columnar
+    {'columns': [...], 'rows': [[...], ...]}, which sends each key once
+    instead of once per row (for big lists such as /api/assets).
+    """
+    if request.args.get('shape') == 'columnar':
+        return {'columns': mapper.names, 'rows': mapper.map_lists(rows)}
+    return mapper.map_all(rows)
 
 # Utility function to safely convert Decimal to float (ONLY ONCE)
 def safe_decimal_to_float(value):
@@ -75,31 +255,67 @@ def safe_convert_row(row):
         for item in row
     )
 
-# Exchange rate function (ONLY ONCE)
-def get_exchange_rate():
-    """
-    Get current BRL to JPY exchange rate from external API
-    Returns tuple (rate, source)
-    """
+# Exchange rate service (ONLY ONCE)
+def load_last_recorded_rate():
+    """Most recent upstream rate saved with a calculation, used to seed the rate cache"""
+    conn = None
     try:
-        # Try ExchangeRate-API (free tier available)
-        response = requests.get(
-            'https://api.exchangerate-api.com/v4/latest/BRL',
-            timeout=5
-        )
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT exchange_rate FROM calculations
+            WHERE rate_source LIKE 'ExchangeRate-API%'
+            ORDER BY id DESC
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+        return safe_decimal_to_float(row[0]) if row else None
+    finally:
+        if conn:
+            conn.close()
 
-        if response.status_code == 200:
-            data = response.json()
-            if 'rates' in data and 'JPY' in data['rates']:
-                rate = data['rates']['JPY']
-                return round(rate, 4), 'ExchangeRate-API'
+exchange_rates = ExchangeRateService(
+    url=os.getenv('EXCHANGE_RATE_URL', DEFAULT_RATE_URL),
+    ttl=float(os.getenv('EXCHANGE_RATE_TTL', '3600')),
+    timeout=float(os.getenv('EXCHANGE_RATE_TIMEOUT', '5')),
+    retry_interval=float(os.getenv('EXCHANGE_RATE_RETRY', '60')),
+    cache_file=os.getenv('EXCHANGE_RATE_CACHE_FILE',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exchange_rate_cache.json')),
+    default_rate=float(os.getenv('EXCHANGE_RATE_DEFAULT', '30.0')),
+    seed_loader=load_last_recorded_rate,
+    on_fetch=lambda seconds, ok: request_metrics.observe_upstream('exchange_rate', seconds, ok)
+)
+
+# Calculation history is written by a background batch writer, so
+# /api/calculate never waits on the database
+CALCULATION_INSERT_SQL = """
+    INSERT INTO calculations (
+        customer_name, book_title, book_price, profit_percent, profit,
+        shipping_cost, shipping_adjustment_jpy, total_brl, total_jpy,
+        exchange_rate, rate_source, admin_id
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+calculation_history = BatchWriter(
+    connect=lambda: get_db_connection(),
+    insert_sql=CALCULATION_INSERT_SQL,
+    max_queue=int(os.getenv('CALC_HISTORY_QUEUE_SIZE', '1000')),
+    batch_size=int(os.getenv('CALC_HISTORY_BATCH_SIZE', '100')),
+    flush_interval=float(os.getenv('CALC_HISTORY_FLUSH_INTERVAL', '0.5')),
+    put_timeout=float(os.getenv('CALC_HISTORY_PUT_TIMEOUT', '0.05')),
+    name='calculation-history'
+)
 
-    except Exception as e:
-        print(f"Error fetching from ExchangeRate-API: {e}")
+def get_exchange_rate():
+    """
+    Get current BRL to JPY exchange rate from the in-process rate cache
+    Returns tuple (rate, source, stale, as_of) and never waits on the network
+    """
+    return exchange_rates.get_rate_info()
 
-    # Fallback to a reasonable default rate if API fails
-    # You should update this periodically with a reasonable BRL to JPY rate
-    return 30.0, 'Fallback (Update manually)'
+def rate_freshness(stale, as_of):
+    """Response fields telling the client whether the rate is a last known good one"""
+    return {'rate_stale': stale, 'rate_as_of': as_of.isoformat(timespec='minutes') if as_of else None}
 
 # Route 1: Root - Redirect to login
 @app.route('/')
@@ -153,48 +369,53 @@ def admin_login():
     return render_template('admin_login.html')
 
 # Route 3: Dashboard (Main Homepage)
-@app.route('/dashboard')
-def dashboard():
-    """Main dashboard - shows stats and recent activity"""
-    if not session.get('is_admin'):
-        flash('Please login as admin to access the dashboard')
-        return redirect(url_for('admin_login'))
-
+DASHBOARD_PROCESSING_ROW = RowMapper(
+    'order_id', ('customer_name', default('Unknown Customer')), ('asset_name', default('Unknown Asset')),
+    'order_date', ('total_value', MONEY), None, 'created_at'
+)
+DASHBOARD_BALANCE_ROW = RowMapper(
+    'name', ('total_debt', MONEY), ('total_payments', MONEY), ('total_credits', MONEY),
+    ('balance', MONEY), ('last_description', default('No description'))
+)
+DASHBOARD_RECENT_ROW = RowMapper(
+    'id', ('customer_name', default('Unknown Customer')), ('book_title', default('Unknown Book')),
+    'order_date', ('amount', MONEY), ('status', default('Pending')), 'order_type'
+)
+DASHBOARD_TOP_CUSTOMER_ROW = RowMapper('name', 'order_count', ('total_spent', MONEY))
+
+def build_dashboard_snapshot():
+    """Run the dashboard queries and return the template payload"""
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Get dashboard statistics
-        stats = {}
-
-        # Total customers - using correct field from your schema
-        cursor.execute("SELECT COUNT(*) FROM customers")
-        stats['total_customers'] = cursor.fetchone()[0]
-
-        # Total books (using assets table) - using correct field from your schema
-        cursor.execute("SELECT COUNT(*) FROM assets")
-        stats['total_books'] = cursor.fetchone()[0]
-
-        # Total orders - using correct field from your schema
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        stats['total_orders'] = cursor.fetchone()[0]
-
-        # Total revenue - using correct field from your schema
-        cursor.execute("SELECT COALESCE(SUM(total_value), 0) FROM orders")
-        total_revenue = cursor.fetchone()[0]
-        stats['total_revenue'] = safe_decimal_to_float(total_revenue)
-
-        # Quote statistics
-        cursor.execute("SELECT COUNT(*) FROM quotes WHERE status = 'pending'")
-        stats['pending_quotes'] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM quotes WHERE status = 'approved'")
-        stats['approved_quotes'] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM quotes WHERE status = 'rejected'")
-        stats['rejected_quotes'] = cursor.fetchone()[0]
-
-
+        # Dashboard statistics in one round trip (conditional aggregates for quotes)
+        cursor.execute("""
+            SELECT c.total_customers, a.total_books, o.total_orders, o.total_revenue,
+                q.pending_quotes, q.approved_quotes, q.rejected_quotes
+            FROM (SELECT COUNT(*) AS total_customers FROM customers) c
+            CROSS JOIN (SELECT COUNT(*) AS total_books FROM assets) a
+            CROSS JOIN (
+                SELECT COUNT(*) AS total_orders, COALESCE(SUM(total_value), 0) AS total_revenue
+                FROM orders
+            ) o
+            CROSS JOIN (
+                SELECT COALESCE(SUM(status = 'pending'), 0) AS pending_quotes,
+                    COALESCE(SUM(status = 'approved'), 0) AS approved_quotes,
+                    COALESCE(SUM(status = 'rejected'), 0) AS rejected_quotes
+                FROM quotes
+            ) q
+        """)
+        row = cursor.fetchone()
+        stats = {
+            'total_customers': row[0],
+            'total_books': row[1],
+            'total_orders': row[2],
+            'total_revenue': safe_decimal_to_float(row[3]),
+            'pending_quotes': int(row[4]),
+            'approved_quotes': int(row[5]),
+            'rejected_quotes': int(row[6])
+        }
 
         # Processing orders (orders with order_date but no delivery_date)
         cursor.execute("""
@@ -209,52 +430,19 @@ def dashboard():
             WHERE o.order_date IS NOT NULL AND (o.delivery_date IS NULL OR o.delivery_date = '0000-00-00')
             ORDER BY o.order_date DESC, o.order_id DESC
         """)
-        processing_orders_raw = cursor.fetchall()
-        processing_orders = []
-
-        for row in processing_orders_raw:
-            processing_orders.append({
-                'order_id': row[0],
-                'customer_name': row[1] or 'Unknown Customer',
-                'asset_name': row[2] or 'Unknown Asset',
-                'order_date': row[3],
-                'total_value': safe_decimal_to_float(row[4]),
-                'created_at': row[6]
-            })
-
+        processing_orders = DASHBOARD_PROCESSING_ROW.map_all(cursor.fetchall())
 
-        # Customer account balances with last transaction info
+        # Customer account balances with last transaction info (materialized in customer_balances)
         cursor.execute("""
-            SELECT c.customer_name,
-                COALESCE(SUM(CASE WHEN ca.transaction_type = 'debit' THEN ca.amount ELSE 0 END), 0) as total_debt,
-                COALESCE(SUM(CASE WHEN ca.transaction_type = 'payment' THEN ca.amount ELSE 0 END), 0) as total_payments,
-                COALESCE(SUM(CASE WHEN ca.transaction_type = 'credit' THEN ca.amount ELSE 0 END), 0) as total_credits,
-                (COALESCE(SUM(CASE WHEN ca.transaction_type = 'debit' THEN ca.amount ELSE 0 END), 0) -
-                    COALESCE(SUM(CASE WHEN ca.transaction_type = 'payment' THEN ca.amount ELSE 0 END), 0) -
-                    COALESCE(SUM(CASE WHEN ca.transaction_type = 'credit' THEN ca.amount ELSE 0 END), 0)) as balance,
-                (SELECT description FROM customer_accounts ca2
-                    WHERE ca2.customer_id = c.customer_id
-                    ORDER BY ca2.transaction_date DESC, ca2.created_at DESC
-                    LIMIT 1) as last_description
-            FROM customers c
-            LEFT JOIN customer_accounts ca ON c.customer_id = ca.customer_id
-            GROUP BY c.customer_id, c.customer_name
-            HAVING balance != 0
-            ORDER BY balance DESC
+            SELECT c.customer_name, b.total_debt, b.total_payments, b.total_credits,
+                b.balance, b.last_description
+            FROM customer_balances b
+            JOIN customers c ON c.customer_id = b.customer_id
+            WHERE b.balance != 0
+            ORDER BY b.balance DESC
             LIMIT 10
         """)
-        customer_balances_raw = cursor.fetchall()
-        customer_balances = []
-
-        for row in customer_balances_raw:
-            customer_balances.append({
-                'name': row[0],
-                'total_debt': safe_decimal_to_float(row[1]),
-                'total_payments': safe_decimal_to_float(row[2]),
-                'total_credits': safe_decimal_to_float(row[3]),
-                'balance': safe_decimal_to_float(row[4]),
-                'last_description': row[5] or 'No description'
-            })
+        customer_balances = DASHBOARD_BALANCE_ROW.map_all(cursor.fetchall())
 
         # Recent orders (last 5) - using correct fields from your schema
         cursor.execute("""
@@ -266,19 +454,7 @@ def dashboard():
             ORDER BY o.order_date DESC, o.order_id DESC
             LIMIT 5
         """)
-        recent_orders_raw = cursor.fetchall()
-        recent_orders = []
-
-        for row in recent_orders_raw:
-            recent_orders.append({
-                'id': row[0],
-                'customer_name': row[1] or 'Unknown Customer',
-                'book_title': row[2] or 'Unknown Book',
-                'order_date': row[3],
-                'amount': safe_decimal_to_float(row[4]),
-                'status': row[5] or 'Pending',
-                'order_type': row[6]
-            })
+        recent_orders = DASHBOARD_RECENT_ROW.map_all(cursor.fetchall())
 
         # Top customers by total spent - using correct fields from your schema
         cursor.execute("""
@@ -291,34 +467,41 @@ def dashboard():
             ORDER BY total_spent DESC
             LIMIT 5
         """)
-        top_customers_raw = cursor.fetchall()
-        top_customers = []
+        top_customers = DASHBOARD_TOP_CUSTOMER_ROW.map_all(cursor.fetchall())
+
+        return {
+            'stats': stats,
+            'recent_orders': recent_orders,
+            'top_customers': top_customers,
+            'customer_balances': customer_balances,
+            'processing_orders': processing_orders
+        }
+    finally:
+        conn.close()
+
+@app.route('/dashboard')
+def dashboard():
+    """Main dashboard - shows stats and recent activity"""
+    if not session.get('is_admin'):
+        flash('Please login as admin to access the dashboard')
+        return redirect(url_for('admin_login'))
 
-        for row in top_customers_raw:
-            top_customers.append({
-                'name': row[0],
-                'order_count': row[1],
-                'total_spent': safe_decimal_to_float(row[2])
-            })
+    try:
+        # Served from the snapshot cache until one of DASHBOARD_TABLES is written
+        snapshot = query_cache.get_or_load('dashboard', DASHBOARD_TABLES, build_dashboard_snapshot,
+                                           ttl=DASHBOARD_CACHE_TTL)
 
         # Current admin user info
         current_user = f"Admin ({session.get('admin_login')})"
 
         return render_template('dashboard.html',
-                     stats=stats,
-                     recent_orders=recent_orders,
-                     top_customers=top_customers,
-                     customer_balances=customer_balances,
-                     processing_orders=processing_orders,
-                     current_user=current_user)
+                     current_user=current_user,
+                     **snapshot)
 
     except Exception as e:
-        print(f"Dashboard error: {e}")
+        log.exception("Dashboard error: %s", e)
         flash(f'Error loading dashboard: {e}')
         return redirect(url_for('admin_login'))
-    finally:
-        if conn:
-            conn.close()
 
 # Route 4: Admin Logout
 @app.route('/admin/logout')
@@ -330,6 +513,11 @@ def admin_logout():
     flash('Logged out successfully!')
     return redirect(url_for('admin_login'))
 
+CUSTOMER_LIST_ROW = RowMapper(
+    'customer_id', 'customer_name', 'customer_address', 'customer_telephone',
+    'customer_delivery_time_request', 'created_at', 'total_orders', ('total_spent', MONEY), 'last_order'
+)
+
 @app.route('/customers', methods=['GET', 'POST'])
 def customers():
     """Customers page - full CRUD operations"""
@@ -355,8 +543,10 @@ def customers():
                     INSERT INTO customers (customer_name, customer_address, customer_telephone, customer_delivery_time_request)
                     VALUES (%s, %s, %s, %s)
                 """, (customer_name, customer_address, customer_telephone, customer_delivery_time))
+                bump_table_versions(cursor, ('customers',))
 
                 conn.commit()
+                mark_tables_changed('customers')
                 flash(f'Customer "{customer_name}" added successfully!')
 
             elif action == 'edit':
@@ -373,8 +563,10 @@ def customers():
                         customer_delivery_time_request = %s, updated_at = CURRENT_TIMESTAMP
                     WHERE customer_id = %s
                 """, (customer_name, customer_address, customer_telephone, customer_delivery_time, customer_id))
+                bump_table_versions(cursor, ('customers',))
 
                 conn.commit()
+                mark_tables_changed('customers')
                 flash(f'Customer "{customer_name}" updated successfully!')
 
             elif action == 'delete':
@@ -395,7 +587,9 @@ def customers():
                 else:
                     # Safe to delete customer
                     cursor.execute("DELETE FROM customers WHERE customer_id = %s", (customer_id,))
+                    bump_table_versions(cursor, ('customers',))
                     conn.commit()
+                    mark_tables_changed('customers', 'customer_accounts')
                     flash(f'Customer "{customer_name}" deleted successfully!')
 
         except mysql.connector.Error as e:
@@ -426,27 +620,13 @@ def customers():
                 COALESCE(SUM(o.total_value), 0) as total_spent,
                 MAX(o.order_date) as last_order
             FROM customers c
-            LEFT JOIN orders o ON c.customer_name = o.customer_name
+            LEFT JOIN orders o ON o.customer_id = c.customer_id
             GROUP BY c.customer_id, c.customer_name, c.customer_address,
                      c.customer_telephone, c.customer_delivery_time_request, c.created_at
             ORDER BY c.customer_name
         """)
-        customers_raw = cursor.fetchall()
-
         # Convert to list of dictionaries for easier template access
-        customers = []
-        for row in customers_raw:
-            customers.append({
-                'customer_id': row[0],
-                'customer_name': row[1],
-                'customer_address': row[2],
-                'customer_telephone': row[3],
-                'customer_delivery_time_request': row[4],
-                'created_at': row[5],
-                'total_orders': row[6],
-                'total_spent': safe_decimal_to_float(row[7]),
-                'last_order': row[8]
-            })
+        customers = CUSTOMER_LIST_ROW.map_all(cursor.fetchall())
 
         return render_template('customers.html', customers=customers, now=datetime.now().date)
 
@@ -457,6 +637,11 @@ def customers():
         if conn:
             conn.close()
 
+BOOK_LIST_ROW = RowMapper(
+    'asset_code', 'asset_name', ('real', MONEY), 'ienes', 'black', 'private', 'created_at',
+    'times_sold', ('total_revenue', MONEY), 'usage_status'
+)
+
 @app.route('/books', methods=['GET', 'POST'])
 def books():
     """Books/Assets page - full CRUD operations"""
@@ -483,8 +668,10 @@ def books():
                     INSERT INTO assets (asset_name, `real`, ienes, black, private)
                     VALUES (%s, %s, %s, %s, %s)
                 """, (asset_name, real_price, ienes_price, black_market, private))
+                bump_table_versions(cursor, ('assets',))
 
                 conn.commit()
+                mark_tables_changed('assets')
                 flash(f'Book "{asset_name}" added successfully!')
 
             elif action == 'edit':
@@ -502,8 +689,10 @@ def books():
                         private = %s, updated_at = CURRENT_TIMESTAMP
                     WHERE asset_code = %s
                 """, (asset_name, real_price, ienes_price, black_market, private, asset_code))
+                bump_table_versions(cursor, ('assets',))
 
                 conn.commit()
+                mark_tables_changed('assets')
                 flash(f'Book "{asset_name}" updated successfully!')
 
             elif action == 'delete':
@@ -517,7 +706,9 @@ def books():
 
                 # Delete asset
                 cursor.execute("DELETE FROM assets WHERE asset_code = %s", (asset_code,))
+                bump_table_versions(cursor, ('assets',))
                 conn.commit()
+                mark_tables_changed('assets')
                 flash(f'Book "{asset_name}" deleted successfully!')
 
         except mysql.connector.Error as e:
@@ -546,23 +737,8 @@ def books():
             GROUP BY a.asset_code, a.asset_name, a.real, a.ienes, a.black, a.private, a.created_at
             ORDER BY times_sold DESC, a.asset_name
         """)
-        assets_raw = cursor.fetchall()
-
         # Convert to list of dictionaries for easier template access
-        books = []
-        for row in assets_raw:
-            books.append({
-                'asset_code': row[0],
-                'asset_name': row[1],
-                'real': safe_decimal_to_float(row[2]),
-                'ienes': row[3],
-                'black': row[4],
-                'private': row[5],
-                'created_at': row[6],
-                'times_sold': row[7],
-                'total_revenue': safe_decimal_to_float(row[8]),
-                'usage_status': row[9]
-            })
+        books = BOOK_LIST_ROW.map_all(cursor.fetchall())
 
         return render_template('books.html', books=books)
 
@@ -574,6 +750,63 @@ def books():
             conn.close()
 
 
+CUSTOMER_MATCH_MODES = ('exact', 'prefix', 'contains')
+
+def escape_like(value):
+    """Escape LIKE wildcards so user input matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def customer_match_mode(cursor, customer_filter, requested='auto'):
+    """
+    Resolve ?match= for the orders customer filter.
+
+    'auto' becomes 'exact' when the filter is a known customer name (so the
+    customer_name index is used) and 'contains' otherwise.
+    """
+    if requested in CUSTOMER_MATCH_MODES:
+        return requested
+    cursor.execute("SELECT 1 FROM customers WHERE customer_name = %s LIMIT 1", (customer_filter,))
+    return 'exact' if cursor.fetchone() else 'contains'
+
+def customer_filter_condition(customer_filter, match_mode):
+    """WHERE fragment and parameter for the orders customer filter"""
+    if match_mode == 'exact':
+        return "o.customer_name = %s", customer_filter
+    if match_mode == 'prefix':
+        return "o.customer_name LIKE %s", f"{escape_like(customer_filter)}%"
+    return "o.customer_name LIKE %s", f"%{escape_like(customer_filter)}%"
+
+def order_filter_conditions(cursor, customer_filter, match_mode='auto'):
+    """WHERE conditions, parameters and resolved match mode for the /orders filters"""
+    where_conditions = []
+    query_params = []
+    if customer_filter:
+        match_mode = customer_match_mode(cursor, customer_filter, match_mode)
+        condition, param = customer_filter_condition(customer_filter, match_mode)
+        where_conditions.append(condition)
+        query_params.append(param)
+    return where_conditions, query_params, match_mode
+
+ORDER_COUNT_CACHE_TTL = float(os.getenv('ORDER_COUNT_CACHE_TTL', '300'))
+
+def count_orders(cursor, where_conditions, query_params):
+    """COUNT(*) over orders with the given filters, cached until orders is written"""
+    def load():
+        count_query = "SELECT COUNT(*) FROM orders o"
+        if where_conditions:
+            count_query += " WHERE " + " AND ".join(where_conditions)
+        cursor.execute(count_query, query_params)
+        return cursor.fetchone()[0]
+
+    key = ('orders_count', tuple(where_conditions), tuple(query_params))
+    return query_cache.get_or_load(key, ('orders',), load, ttl=ORDER_COUNT_CACHE_TTL)
+
+ORDER_LIST_ROW = RowMapper(
+    'order_id', 'customer_id', 'asset_code', 'customer_name', 'asset_name', 'order_date',
+    ('order_real', MONEY), 'order_ien', ('frete_brasil', MONEY), ('frete_jp', MONEY),
+    ('total_value', MONEY), 'delivery_date', 'payment_type', 'created_at', 'source_type'
+)
+
 @app.route('/orders', methods=['GET', 'POST'])
 def orders():
     """Orders page - full CRUD operations with calculator integration and customer filtering"""
@@ -601,14 +834,18 @@ def orders():
                 delivery_date = request.form.get('delivery_date') or None
                 payment_type = request.form.get('payment_type', '')
 
+                customer_id = get_or_create_customer_id(cursor, customer_name)
+
                 cursor.execute("""
-                    INSERT INTO orders (customer_name, asset_name, order_date, order_real, order_ien,
+                    INSERT INTO orders (customer_id, customer_name, asset_name, order_date, order_real, order_ien,
                                       frete_brasil, frete_jp, total_value, delivery_date, payment_type)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (customer_name, asset_name, order_date, order_real, order_ien,
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (customer_id, customer_name, asset_name, order_date, order_real, order_ien,
                      frete_brasil, frete_jp, total_value, delivery_date, payment_type))
+                add_orders(cursor, "order_id = %s", (cursor.lastrowid,))
 
                 conn.commit()
+                mark_tables_changed('orders', 'customers')
                 flash(f'Order for "{customer_name}" added successfully!')
 
             elif action == 'edit':
@@ -625,16 +862,21 @@ def orders():
                 delivery_date = request.form.get('delivery_date') or None
                 payment_type = request.form.get('payment_type', '')
 
+                customer_id = get_or_create_customer_id(cursor, customer_name)
+
+                subtract_orders(cursor, "order_id = %s", (order_id,))
                 cursor.execute("""
                     UPDATE orders
-                    SET customer_name = %s, asset_name = %s, order_date = %s, order_real = %s,
+                    SET customer_id = %s, customer_name = %s, asset_name = %s, order_date = %s, order_real = %s,
                         order_ien = %s, frete_brasil = %s, frete_jp = %s, total_value = %s,
                         delivery_date = %s, payment_type = %s, updated_at = CURRENT_TIMESTAMP
                     WHERE order_id = %s
-                """, (customer_name, asset_name, order_date, order_real, order_ien,
+                """, (customer_id, customer_name, asset_name, order_date, order_real, order_ien,
                      frete_brasil, frete_jp, total_value, delivery_date, payment_type, order_id))
+                add_orders(cursor, "order_id = %s", (order_id,))
 
                 conn.commit()
+                mark_tables_changed('orders', 'customers')
                 flash(f'Order updated successfully!')
 
             elif action == 'delete':
@@ -647,8 +889,10 @@ def orders():
                 customer_name = order[0] if order else 'Unknown'
 
                 # Delete order
+                subtract_orders(cursor, "order_id = %s", (order_id,))
                 cursor.execute("DELETE FROM orders WHERE order_id = %s", (order_id,))
                 conn.commit()
+                mark_tables_changed('orders')
                 flash(f'Order for "{customer_name}" deleted successfully!')
 
         except mysql.connector.Error as e:
@@ -670,107 +914,69 @@ def orders():
         sort_order = request.args.get('sort', 'recent')
         limit_results = request.args.get('limit', type=int)
 
-        # Get all orders with pagination and filtering
-        page = request.args.get('page', 1, type=int)
+        # Pagination: next/prev links carry a keyset cursor; numbered page links fall back to OFFSET
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_cursor = request.args.get('cursor') or None
+        if page_cursor and not is_valid_cursor(page_cursor):
+            page_cursor = None
         per_page = 20 if not limit_results else limit_results
         offset = (page - 1) * per_page
 
         # Build the base query with optional customer filtering
-        # Build the base query with optional customer filtering
-        base_query = """
+        base_query = f"""
             SELECT o.order_id, o.customer_id, o.asset_code, o.customer_name, o.asset_name,
                 o.order_date, o.order_real, o.order_ien, o.frete_brasil, o.frete_jp,
                 o.total_value, o.delivery_date, o.payment_type, o.created_at,
-                CASE WHEN o.asset_code IS NULL THEN 'quote-only' ELSE 'with-asset' END as source_type
+                CASE WHEN o.asset_code IS NULL THEN 'quote-only' ELSE 'with-asset' END as source_type,
+                {ORDER_DATE_KEY_SQL} as order_date_key
             FROM orders o
         """
 
-        where_conditions = []
-        query_params = []
-
         # Add customer filter if specified
-        if customer_filter:
-            where_conditions.append("customer_name LIKE %s")
-            query_params.append(f"%{customer_filter}%")
-
-        # Add WHERE clause if there are conditions
-        if where_conditions:
-            base_query += " WHERE " + " AND ".join(where_conditions)
-
-        # Add ORDER BY clause based on sort parameter
-        if sort_order == 'recent':
-            base_query += " ORDER BY order_date DESC, order_id DESC"
-        elif sort_order == 'oldest':
-            base_query += " ORDER BY order_date ASC, order_id ASC"
-        else:
-            base_query += " ORDER BY order_date DESC, order_id DESC"
-
-        # Get total count for pagination (with same filters)
-        count_query = "SELECT COUNT(*) FROM orders"
-        if where_conditions:
-            count_query += " WHERE " + " AND ".join(where_conditions)
+        where_conditions, query_params, match_mode = order_filter_conditions(
+            cursor, customer_filter, request.args.get('match', 'auto')
+        )
 
-        cursor.execute(count_query, query_params)
-        total_orders = cursor.fetchone()[0]
+        ascending = sort_order == 'oldest'
 
-        # Skip pagination if filtering by customer
-        if customer_filter:
-            final_query = base_query  # No LIMIT/OFFSET for customer filter
-            final_params = query_params
-        else:
-            # Add LIMIT and OFFSET for pagination only when not filtering
-            final_query = base_query + " LIMIT %s OFFSET %s"
-            final_params = query_params + [per_page, offset]
+        # Total count for pagination (with same filters), cached until orders is written
+        total_orders = count_orders(cursor, where_conditions, query_params)
 
-        # Get orders for current page
-        cursor.execute(final_query, final_params)
-        orders_raw = cursor.fetchall()
+        # Filtered or not, only one page of orders is loaded
+        orders_raw, next_cursor, prev_cursor = fetch_keyset_page(
+            cursor, base_query, where_conditions, query_params, ascending, per_page,
+            cursor_token=page_cursor, offset=offset, key_index=(15, 0)
+        )
 
         # Convert to list of dictionaries for easier template access
-        orders = []
-        for row in orders_raw:
-            orders.append({
-                'order_id': row[0],
-                'customer_id': row[1],
-                'asset_code': row[2],
-                'customer_name': row[3],
-                'asset_name': row[4],
-                'order_date': row[5],
-                'order_real': safe_decimal_to_float(row[6]),
-                'order_ien': row[7],
-                'frete_brasil': safe_decimal_to_float(row[8]),
-                'frete_jp': safe_decimal_to_float(row[9]),
-                'total_value': safe_decimal_to_float(row[10]),
-                'delivery_date': row[11],
-                'payment_type': row[12],
-                'created_at': row[13],
-                'source_type': row[14]
-            })
-
-        # Calculate pagination info (disable pagination when filtering by customer)
-        if customer_filter:
-            total_pages = 1
-            has_prev = False
-            has_next = False
-            page = 1
-        else:
-            total_pages = (total_orders + per_page - 1) // per_page
-            has_prev = page > 1
-            has_next = page < total_pages
+        orders = ORDER_LIST_ROW.map_all(orders_raw)
 
-        # Get customers and assets for dropdown lists
-        cursor.execute("SELECT DISTINCT customer_name FROM customers WHERE customer_name IS NOT NULL ORDER BY customer_name")
-        customers = [row[0] for row in cursor.fetchall()]
+        # Calculate pagination info
+        total_pages = max((total_orders + per_page - 1) // per_page, 1)
+        has_prev = prev_cursor is not None
+        has_next = next_cursor is not None
 
-        cursor.execute("SELECT DISTINCT asset_name FROM assets WHERE asset_name IS NOT NULL ORDER BY asset_name")
-        assets = [row[0] for row in cursor.fetchall()]
+        # Get customers and assets for dropdown lists
+        customers = customer_names(cursor)
+        assets = asset_names(cursor)
 
         # Prepare filter info for template
         filter_info = {
             'customer_filter': customer_filter,
             'sort_order': sort_order,
             'is_filtered': bool(customer_filter),
-            'limit_results': limit_results
+            'limit_results': limit_results,
+            'match_mode': match_mode if customer_filter else None
+        }
+
+        # Query string carried by the pagination links so pages keep the same filter
+        filter_info['page_args'] = {
+            key: value for key, value in (
+                ('customer', customer_filter or None),
+                ('match', filter_info['match_mode']),
+                ('sort', sort_order),
+                ('limit', limit_results)
+            ) if value
         }
 
         return render_template('orders.html',
@@ -781,11 +987,13 @@ def orders():
                              total_pages=total_pages,
                              has_prev=has_prev,
                              has_next=has_next,
+                             next_cursor=next_cursor,
+                             prev_cursor=prev_cursor,
                              total_orders=total_orders,
                              filter_info=filter_info)
 
     except Exception as e:
-        print(f"ERROR in orders route: {e}")
+        log.exception("Error in orders route: %s", e)
         flash(f'Error loading orders: {e}')
         return redirect(url_for('dashboard'))
     finally:
@@ -815,6 +1023,33 @@ def customer_last_order(customer_name):
     # Redirect to orders page with customer filter, recent sort, and limit to 1
     return redirect(url_for('orders', customer=customer_name, sort='recent', limit=1))
 
+ORDER_STATUS_CONDITIONS = {
+    'PROCESSING': 'o.delivery_date IS NULL',
+    'DELIVERED': 'o.delivery_date IS NOT NULL',
+}
+ORDER_STATUS_PAGE_SIZE = 25
+
+ORDER_STATUS_ROW = RowMapper(
+    'order_id', 'customer_name', 'asset_name', 'order_date', 'delivery_date',
+    ('total_value', MONEY), 'payment_type', ('order_real', MONEY), 'order_ien',
+    ('frete_brasil', MONEY), ('frete_jp', MONEY)
+)
+
+def count_orders_by_status(cursor):
+    """{status: count} for dated orders in one query, cached until orders is written"""
+    def load():
+        cursor.execute("""
+            SELECT COALESCE(SUM(delivery_date IS NULL), 0),
+                   COALESCE(SUM(delivery_date IS NOT NULL), 0)
+            FROM orders
+            WHERE order_date IS NOT NULL
+        """)
+        processing, delivered = cursor.fetchone()
+        return {'PROCESSING': int(processing), 'DELIVERED': int(delivered)}
+
+    return query_cache.get_or_load('orders_by_status_counts', ('orders',), load,
+                                   ttl=ORDER_COUNT_CACHE_TTL)
+
 @app.route('/reports')
 def reports():
     """Reports page - analytics and statistics"""
@@ -826,40 +1061,40 @@ def reports():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Key metrics for overview cards
-        cursor.execute("SELECT COALESCE(SUM(total_value), 0) FROM orders")
-        total_revenue = safe_decimal_to_float(cursor.fetchone()[0])
-
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        total_orders = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(DISTINCT customer_name) FROM orders WHERE customer_name IS NOT NULL")
-        active_customers = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COALESCE(AVG(total_value), 0) FROM orders WHERE total_value > 0")
-        avg_order_value = safe_decimal_to_float(cursor.fetchone()[0])
+        # Key metrics for overview cards, from the pre-aggregated sales_rollup
+        cursor.execute("""
+            SELECT COALESCE(SUM(revenue), 0),
+                   COALESCE(SUM(order_count), 0),
+                   COUNT(DISTINCT NULLIF(customer_name, '')),
+                   COALESCE(SUM(priced_revenue) / NULLIF(SUM(priced_orders), 0), 0)
+            FROM sales_rollup
+        """)
+        total_revenue, total_orders, active_customers, avg_order_value = cursor.fetchone()
+        total_revenue = safe_decimal_to_float(total_revenue)
+        total_orders = int(total_orders)
+        avg_order_value = safe_decimal_to_float(avg_order_value)
 
-        # Monthly sales report
+        # Monthly sales report: the current month and the 11 before it
         cursor.execute("""
             SELECT
-                DATE_FORMAT(order_date, '%Y-%m') as month,
-                COUNT(*) as total_orders,
-                SUM(total_value) as total_revenue
-            FROM orders
-            WHERE order_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
-            GROUP BY DATE_FORMAT(order_date, '%Y-%m')
+                month,
+                SUM(order_count) as total_orders,
+                SUM(revenue) as total_revenue
+            FROM sales_rollup
+            WHERE month >= DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 11 MONTH), '%Y-%m')
+            GROUP BY month
             ORDER BY month ASC
         """)
         monthly_sales = cursor.fetchall()
 
         # Top selling books - showing both asset-based and quote-only orders
         cursor.execute("""
-            SELECT o.asset_name, COUNT(*) as times_sold, SUM(o.total_value) as revenue,
-                COUNT(CASE WHEN o.asset_code IS NOT NULL THEN 1 END) as from_assets,
-                COUNT(CASE WHEN o.asset_code IS NULL THEN 1 END) as from_quotes
-            FROM orders o
-            WHERE o.asset_name IS NOT NULL
-            GROUP BY o.asset_name
+            SELECT asset_name, SUM(order_count) as times_sold, SUM(revenue) as revenue,
+                SUM(asset_orders) as from_assets,
+                SUM(order_count) - SUM(asset_orders) as from_quotes
+            FROM sales_rollup
+            WHERE asset_name <> ''
+            GROUP BY asset_name
             ORDER BY times_sold DESC
             LIMIT 10
         """)
@@ -867,9 +1102,9 @@ def reports():
 
         # Customer analytics
         cursor.execute("""
-            SELECT customer_name, COUNT(*) as orders, SUM(total_value) as total_spent
-            FROM orders
-            WHERE customer_name IS NOT NULL
+            SELECT customer_name, SUM(order_count) as orders, SUM(revenue) as total_spent
+            FROM sales_rollup
+            WHERE customer_name <> ''
             GROUP BY customer_name
             ORDER BY total_spent DESC
             LIMIT 10
@@ -902,55 +1137,13 @@ def reports():
         assets_added_count = cursor.fetchone()[0]
 
 
-        # Orders by status
-        cursor.execute("""
-            SELECT order_id, customer_name, asset_name, order_date, delivery_date,
-                total_value, payment_type, order_real, order_ien, frete_brasil, frete_jp,
-                CASE
-                    WHEN delivery_date IS NOT NULL THEN 'DELIVERED'
-                    WHEN order_date IS NOT NULL THEN 'PROCESSING'
-                    ELSE 'PENDING'
-                END as status
-            FROM orders
-            WHERE order_date IS NOT NULL
-            ORDER BY
-                CASE
-                    WHEN delivery_date IS NOT NULL THEN 1
-                    WHEN order_date IS NOT NULL THEN 2
-                    ELSE 3
-                END,
-                order_date DESC
-        """)
-        orders_by_status_raw = cursor.fetchall()
-        orders_by_status = []
-
-        for row in orders_by_status_raw:
-            orders_by_status.append({
-                'order_id': row[0],
-                'customer_name': row[1],
-                'asset_name': row[2],
-                'order_date': row[3],
-                'delivery_date': row[4],
-                'total_value': safe_decimal_to_float(row[5]),
-                'payment_type': row[6],
-                'order_real': safe_decimal_to_float(row[7]),
-                'order_ien': row[8],
-                'frete_brasil': safe_decimal_to_float(row[9]),
-                'frete_jp': safe_decimal_to_float(row[10]),
-                'status': row[11]
-            })
-
-        # Debug: Print the orders data
-        print(f"DEBUG: Found {len(orders_by_status)} orders by status")
-        for order in orders_by_status[:3]:  # Print first 3 orders
-            print(f"DEBUG: Order {order['order_id']} - Status: {order['status']} - Customer: {order['customer_name']}")
+        # Orders by status: only the per-status counts; the rows are paged in
+        # by the page from /api/reports/orders-by-status
+        status_counts = count_orders_by_status(cursor)
 
         # Get customers and assets for dropdown lists (same as in orders route)
-        cursor.execute("SELECT DISTINCT customer_name FROM customers WHERE customer_name IS NOT NULL ORDER BY customer_name")
-        customers = [row[0] for row in cursor.fetchall()]
-
-        cursor.execute("SELECT DISTINCT asset_name FROM assets WHERE asset_name IS NOT NULL ORDER BY asset_name")
-        assets = [row[0] for row in cursor.fetchall()]
+        customers = customer_names(cursor)
+        assets = asset_names(cursor)
 
 
         return render_template('reports.html',
@@ -968,7 +1161,7 @@ def reports():
                             new_customers_count=new_customers_count,
                             weekly_revenue=weekly_revenue,
                             assets_added_count=assets_added_count,
-                            orders_by_status=orders_by_status,
+                            status_counts=status_counts,
                             # Add these new variables
                             customers=customers,
                             assets=assets)
@@ -981,6 +1174,126 @@ def reports():
         if conn:
             conn.close()
 
+@app.route('/api/reports/orders-by-status')
+def api_orders_by_status():
+    """One page of the reports 'Orders by Status' list, newest first"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    status = request.args.get('status', 'PROCESSING').upper()
+    page_cursor = request.args.get('cursor') or None
+    per_page = min(max(request.args.get('limit', ORDER_STATUS_PAGE_SIZE, type=int), 1), 100)
+
+    if status not in ORDER_STATUS_CONDITIONS:
+        return jsonify({'success': False, 'error': f'Unknown status: {status}'}), 400
+    if page_cursor and not is_valid_cursor(page_cursor):
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        rows, next_cursor, _ = fetch_keyset_page(
+            cursor,
+            f"""
+            SELECT o.order_id, o.customer_name, o.asset_name, o.order_date, o.delivery_date,
+                   o.total_value, o.payment_type, o.order_real, o.order_ien, o.frete_brasil, o.frete_jp,
+                   {ORDER_DATE_KEY_SQL} as order_date_key
+            FROM orders o
+            """,
+            ['o.order_date IS NOT NULL', ORDER_STATUS_CONDITIONS[status]], [],
+            False, per_page, cursor_token=page_cursor, key_index=(11, 0)
+        )
+
+        orders = ORDER_STATUS_ROW.map_all(rows)
+        for order in orders:
+            order['status'] = status
+
+        return jsonify({
+            'success': True,
+            'status': status,
+            'orders': orders,
+            'next_cursor': next_cursor,
+            'counts': count_orders_by_status(cursor)
+        })
+
+    except mysql.connector.Error as e:
+        return jsonify({'success': False, 'error': f'Database error: {e}'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    finally:
+        if conn:
+            conn.close()
+
+def load_search_rows(sql):
+    """Loader for a search index: all rows of one entity"""
+    def load():
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            return cursor.fetchall()
+        finally:
+            conn.close()
+    return load
+
+SEARCH_INDEX_MAX_AGE = float(os.getenv('SEARCH_INDEX_MAX_AGE', '300'))
+
+# One in-process index per searchable entity: (table it is built from, index)
+# Result rows keep the column order the search page has always used.
+search_indexes = {
+    'customers': ('customers', RefreshingIndex(
+        load_search_rows("""
+            SELECT customer_id, customer_name, customer_address, customer_telephone
+            FROM customers
+            ORDER BY customer_name
+        """),
+        {1: 3.0, 2: 1.0, 3: 1.0},
+        max_age=SEARCH_INDEX_MAX_AGE
+    )),
+    'books': ('assets', RefreshingIndex(
+        load_search_rows("""
+            SELECT asset_code, asset_name, `real`, ienes
+            FROM assets
+            ORDER BY asset_name
+        """),
+        {1: 3.0},
+        max_age=SEARCH_INDEX_MAX_AGE
+    )),
+    'orders': ('orders', RefreshingIndex(
+        load_search_rows("""
+            SELECT order_id, customer_name, asset_name, order_date, total_value
+            FROM orders
+            ORDER BY order_date DESC, order_id DESC
+        """),
+        {1: 2.0, 2: 2.0},
+        max_age=SEARCH_INDEX_MAX_AGE
+    ))
+}
+
+# Prefix indexes for /api/typeahead, synced row by row after writes
+typeahead_indexes = {
+    'customers': ('customers', TypeaheadIndex(
+        get_db_connection, 'customers', 'customer_id', 'customer_name',
+        max_age=SEARCH_INDEX_MAX_AGE
+    )),
+    'books': ('assets', TypeaheadIndex(
+        get_db_connection, 'assets', 'asset_code', 'asset_name', '`real`',
+        max_age=SEARCH_INDEX_MAX_AGE
+    ))
+}
+
+def run_search(query, search_type='all', limit=20):
+    """Ranked matches per entity: {'customers': [(row, score), ...], ...}"""
+    results = {}
+    for entity, (table, index) in search_indexes.items():
+        if search_type in ('all', entity):
+            results[entity] = index.get().search(query, limit=limit)
+        else:
+            results[entity] = []
+    return results
+
 @app.route('/search')
 def search():
     """Search page - global search across all entities"""
@@ -999,47 +1312,12 @@ def search():
 
     if query:
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-
-            search_term = f"%{query}%"
-
-            if search_type in ['all', 'customers']:
-                # Search customers
-                cursor.execute("""
-                    SELECT customer_id, customer_name, customer_address, customer_telephone
-                    FROM customers
-                    WHERE customer_name LIKE %s OR customer_address LIKE %s OR customer_telephone LIKE %s
-                    LIMIT 20
-                """, (search_term, search_term, search_term))
-                results['customers'] = cursor.fetchall()
-
-            if search_type in ['all', 'books']:
-                # Search books/assets
-                cursor.execute("""
-                    SELECT asset_code, asset_name, real, ienes
-                    FROM assets
-                    WHERE asset_name LIKE %s
-                    LIMIT 20
-                """, (search_term,))
-                results['books'] = cursor.fetchall()
-
-            if search_type in ['all', 'orders']:
-                # Search orders
-                cursor.execute("""
-                    SELECT order_id, customer_name, asset_name, order_date, total_value
-                    FROM orders
-                    WHERE customer_name LIKE %s OR asset_name LIKE %s
-                    ORDER BY order_date DESC
-                    LIMIT 20
-                """, (search_term, search_term))
-                results['orders'] = cursor.fetchall()
+            # Ranked, typo-tolerant matches from the in-process search indexes
+            for entity, matches in run_search(query, search_type).items():
+                results[entity] = [row for row, score in matches]
 
         except Exception as e:
             flash(f'Search error: {e}')
-        finally:
-            if conn:
-                conn.close()
 
     return render_template('search.html',
                          query=query,
@@ -1047,6 +1325,87 @@ def search():
                          results=results)
 
 
+@app.route('/api/search')
+def api_search():
+    """API endpoint for search-as-you-type across customers, books and orders"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    query = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'all')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+
+    try:
+        matches = run_search(query, search_type, limit) if query else {}
+
+        results = {
+            'customers': [{
+                'customer_id': row[0],
+                'customer_name': row[1],
+                'customer_address': row[2],
+                'customer_telephone': row[3],
+                'score': score
+            } for row, score in matches.get('customers', [])],
+            'books': [{
+                'asset_code': row[0],
+                'asset_name': row[1],
+                'real': safe_decimal_to_float(row[2]),
+                'ienes': row[3],
+                'score': score
+            } for row, score in matches.get('books', [])],
+            'orders': [{
+                'order_id': row[0],
+                'customer_name': row[1],
+                'asset_name': row[2],
+                'order_date': row[3],
+                'total_value': safe_decimal_to_float(row[4]),
+                'score': score
+            } for row, score in matches.get('orders', [])]
+        }
+
+        return jsonify({'success': True, 'query': query, 'results': results})
+
+    except mysql.connector.Error as e:
+        return jsonify({'success': False, 'error': f'Database error: {e}'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@app.route('/api/typeahead')
+def api_typeahead():
+    """Top prefix matches for a customer or book combobox (books with their price)"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    query = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'books')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if search_type not in typeahead_indexes:
+        return jsonify({'success': False, 'error': f'Unknown type: {search_type}'}), 400
+
+    try:
+        started = time.perf_counter()
+        matches = typeahead_indexes[search_type][1].search(query, limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if search_type == 'books':
+            results = [{'id': item_id, 'name': name, 'price': price}
+                       for item_id, name, price in matches]
+        else:
+            # Several customer rows may share a name; the combobox wants names
+            names = list(dict.fromkeys(name for _, name, _ in matches))
+            results = [{'name': name} for name in names]
+
+        response = jsonify({'success': True, 'type': search_type, 'query': query, 'results': results})
+        response.headers['Server-Timing'] = f'typeahead;dur={elapsed_ms:.3f}'
+        return response
+
+    except mysql.connector.Error as e:
+        return jsonify({'success': False, 'error': f'Database error: {e}'}), 500
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/create_order')
 def create_order():
     """Create order page - calculator functionality with quotes workflow"""
@@ -1083,6 +1442,16 @@ def create_order():
         if conn:
             conn.close()
 
+def calculate_price(book_price, shipping_cost, profit_percent, shipping_adjustment_jpy, exchange_rate):
+    """
+    Price one book: profit on the BRL book price, plus shipping, converted to
+    JPY, plus the JPY shipping adjustment. Returns (profit, total_brl, total_jpy).
+    """
+    profit = book_price * (profit_percent / 100)
+    total_brl = book_price + profit + shipping_cost
+    total_jpy = total_brl * exchange_rate + shipping_adjustment_jpy
+    return profit, total_brl, int(round(total_jpy))
+
 @app.route('/api/calculate', methods=['POST'])
 def api_calculate():
     """API endpoint for book import calculations"""
@@ -1091,7 +1460,7 @@ def api_calculate():
 
     try:
         data = request.get_json()
-        print(f"Calculate API called with data: {data}")  # Debug line
+        log.debug("Calculate API called", extra={'data': data})
 
         # Validate required fields
         if not data.get('book_price') or not data.get('shipping_cost'):
@@ -1102,20 +1471,12 @@ def api_calculate():
         profit_percent = float(data.get('profit_percent', 30))
         shipping_adjustment_jpy = float(data.get('shipping_adjustment_jpy', 0))
 
-        # Calculate profit
-        profit = book_price * (profit_percent / 100)
-
-        # Calculate total in BRL
-        total_brl = book_price + profit + shipping_cost
-
         # Get current exchange rate
-        exchange_rate, rate_source = get_exchange_rate()
+        exchange_rate, rate_source, rate_stale, rate_as_of = get_exchange_rate()
 
-        # Convert to JPY
-        total_jpy_before_adjustment = total_brl * exchange_rate
-
-        # Add shipping adjustment
-        total_jpy = total_jpy_before_adjustment + shipping_adjustment_jpy
+        profit, total_brl, total_jpy = calculate_price(
+            book_price, shipping_cost, profit_percent, shipping_adjustment_jpy, exchange_rate
+        )
 
         result = {
             'success': True,
@@ -1125,79 +1486,193 @@ def api_calculate():
             'shipping_cost': shipping_cost,
             'total_brl': total_brl,
             'shipping_adjustment_jpy': shipping_adjustment_jpy,
-            'total_jpy': int(round(total_jpy)),
+            'total_jpy': total_jpy,
             'exchange_rate': exchange_rate,
-            'rate_source': rate_source
+            'rate_source': rate_source,
+            **rate_freshness(rate_stale, rate_as_of)
         }
 
-        print(f"Calculate API returning: {result}")  # Debug line
-
-        # Save calculation to calculations table (optional)
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+        log.debug("Calculate API returning", extra={'result': result})
 
-            # Insert calculation into calculations table if it exists
-            cursor.execute("""
-                INSERT INTO calculations (
-                    customer_name, book_title, book_price, profit_percent, profit,
-                    shipping_cost, shipping_adjustment_jpy, total_brl, total_jpy,
-                    exchange_rate, rate_source, admin_id
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                data.get('customer_name', ''),
-                data.get('book_title', ''),
-                book_price,
-                profit_percent,
-                profit,
-                shipping_cost,
-                shipping_adjustment_jpy,
-                total_brl,
-                int(round(total_jpy)),
-                exchange_rate,
-                rate_source,
-                session.get('admin_id')
-            ))
-
-            conn.commit()
-
-        except mysql.connector.Error as e:
-            # If calculations table doesn't exist, just continue
-            print(f"Note: Could not save to calculations table: {e}")
-        finally:
-            if conn:
-                conn.close()
+        # Queue the calculation for the history writer (dropped if the queue stays full)
+        calculation_history.submit((
+            # calculations.customer_name is VARCHAR(100), book_title VARCHAR(200)
+            str(data.get('customer_name') or '')[:100],
+            str(data.get('book_title') or '')[:200],
+            book_price,
+            profit_percent,
+            profit,
+            shipping_cost,
+            shipping_adjustment_jpy,
+            total_brl,
+            total_jpy,
+            exchange_rate,
+            rate_source[:50],  # calculations.rate_source is VARCHAR(50)
+            session.get('admin_id')
+        ))
 
         response = jsonify(result)
         response.headers['Content-Type'] = 'application/json'
         return response
 
     except ValueError as e:
-        print(f"ValueError in calculate API: {e}")
+        log.warning("ValueError in calculate API: %s", e)
         return jsonify({'success': False, 'error': 'Invalid numeric values provided'}), 400
     except Exception as e:
-        print(f"General error in calculate API: {e}")
+        log.exception("General error in calculate API: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+CALC_BATCH_MAX_ITEMS = int(os.getenv('CALC_BATCH_MAX_ITEMS', '500'))
+CALC_BATCH_FIELDS = ('book_price', 'shipping_cost', 'profit_percent', 'shipping_adjustment_jpy')
+
+def calculation_inputs(item):
+    """
+    (book_price, shipping_cost, profit_percent, shipping_adjustment_jpy) for
+    one batch item, given as an object or as an array in CALC_BATCH_FIELDS
+    order. Raises ValueError with a message for the client.
+    """
+    if isinstance(item, list):
+        item = dict(zip(CALC_BATCH_FIELDS, item))
+    if not isinstance(item, dict):
+        raise ValueError('Item must be an object or an array')
+    if not item.get('book_price') or not item.get('shipping_cost'):
+        raise ValueError('Book price and shipping cost are required')
+
+    profit_percent = item.get('profit_percent')
+    shipping_adjustment_jpy = item.get('shipping_adjustment_jpy')
+    try:
+        values = (float(item['book_price']),
+                  float(item['shipping_cost']),
+                  float(30 if profit_percent in (None, '') else profit_percent),
+                  float(0 if shipping_adjustment_jpy in (None, '') else shipping_adjustment_jpy))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid numeric values provided')
+    # float() accepts "nan" and "inf", which can't be priced
+    if not all(math.isfinite(value) for value in values):
+        raise ValueError('Invalid numeric values provided')
+    return values
+
+@app.route('/api/calculate/batch', methods=['POST'])
+def api_calculate_batch():
+    """
+    Price many books in one request.
+
+    Body: {"items": [{"book_price", "shipping_cost", "profit_percent",
+    "shipping_adjustment_jpy", "book_title"?, "customer_name"?} or
+    [book_price, shipping_cost, profit_percent, adjustment], ...],
+    "customer_name"?}. Invalid items get an error entry in results; the
+    rest of the batch is still priced.
+    """
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'items must be a non-empty array'}), 400
+    if len(items) > CALC_BATCH_MAX_ITEMS:
+        return jsonify({'success': False,
+                        'error': f'At most {CALC_BATCH_MAX_ITEMS} items per batch'}), 400
+
+    # One rate for the whole batch, so every row is priced consistently
+    exchange_rate, rate_source, rate_stale, rate_as_of = get_exchange_rate()
+    default_customer = str(data.get('customer_name') or '')
+    if len(default_customer) > 100:
+        return jsonify({'success': False, 'error': 'Customer name is too long (max 100 characters)'}), 400
+    admin_id = session.get('admin_id')
+
+    results = []
+    history_rows = []
+    for index, item in enumerate(items):
+        details = item if isinstance(item, dict) else {}
+        try:
+            book_price, shipping_cost, profit_percent, shipping_adjustment_jpy = calculation_inputs(item)
+            # Checked here so one item cannot fail the history writer's batch INSERT
+            book_title = str(details.get('book_title') or '')
+            customer_name = str(details.get('customer_name') or default_customer)
+            if len(book_title) > 200:
+                raise ValueError('Book title is too long (max 200 characters)')
+            if len(customer_name) > 100:
+                raise ValueError('Customer name is too long (max 100 characters)')
+            profit, total_brl, total_jpy = calculate_price(
+                book_price, shipping_cost, profit_percent, shipping_adjustment_jpy, exchange_rate
+            )
+        except ValueError as e:
+            results.append({'index': index, 'success': False, 'error': str(e)})
+            continue
+        except OverflowError:
+            # e.g. 1e308 is finite but the JPY total is not
+            results.append({'index': index, 'success': False, 'error': 'Amounts are too large to price'})
+            continue
+        results.append({
+            'index': index,
+            'success': True,
+            'book_title': book_title,
+            'book_price': book_price,
+            'profit': profit,
+            'profit_percent': profit_percent,
+            'shipping_cost': shipping_cost,
+            'total_brl': total_brl,
+            'shipping_adjustment_jpy': shipping_adjustment_jpy,
+            'total_jpy': total_jpy
+        })
+        history_rows.append((
+            customer_name,
+            book_title,
+            book_price,
+            profit_percent,
+            profit,
+            shipping_cost,
+            shipping_adjustment_jpy,
+            total_brl,
+            total_jpy,
+            exchange_rate,
+            rate_source[:50],
+            admin_id
+        ))
+
+    # The history writer sends these as multi-row INSERTs in the background
+    calculation_history.submit_many(history_rows)
+
+    return jsonify({
+        'success': True,
+        'exchange_rate': exchange_rate,
+        'rate_source': rate_source,
+        **rate_freshness(rate_stale, rate_as_of),
+        'results': results,
+        'priced': len(history_rows),
+        'errors': len(results) - len(history_rows)
+    })
+
 @app.route('/api/exchange-rate')
 def api_exchange_rate():
     """API endpoint for getting current BRL to JPY exchange rate"""
     try:
-        rate, source = get_exchange_rate()
+        rate, source, stale, as_of = get_exchange_rate()
         return jsonify({
             'success': True,
             'rate': rate,
-            'source': source
+            'source': source,
+            **rate_freshness(stale, as_of)
         })
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e),
-            'rate': 30.0,  # Fallback rate
+            'rate': exchange_rates.default_rate,  # Fallback rate
             'source': 'Fallback'
         })
 
 
+@app.route('/api/exchange-rate/status')
+def api_exchange_rate_status():
+    """API endpoint describing the exchange rate cache (age, failures, upstream timing)"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    return jsonify({'success': True, 'exchange_rate': exchange_rates.status()})
+
+
 
 @app.route('/api/save-order-legacy', methods=['POST'])
 def api_save_order_legacy():
@@ -1254,6 +1729,7 @@ def api_save_order_legacy():
 
             # Get the customer ID
             customer_id = cursor.lastrowid
+            bump_table_versions(cursor, ('customers',))
         else:
             customer_id = customer_result[0]
 
@@ -1295,10 +1771,12 @@ def api_save_order_legacy():
             total_value_jpy,                          # total_value (JPY final total)
             'Quote Approved'                          # payment_type
         ))
+        order_id = cursor.lastrowid
+        add_orders(cursor, "order_id = %s", (order_id,))
 
         # Commit the transaction
         conn.commit()
-        order_id = cursor.lastrowid
+        mark_tables_changed('orders', 'customers')
 
         return jsonify({
             'success': True,
@@ -1311,7 +1789,7 @@ def api_save_order_legacy():
     except mysql.connector.IntegrityError as e:
         if conn:
             conn.rollback()
-        print(f"MySQL Integrity Error: {e}")
+        log.warning("MySQL integrity error in save order: %s", e)
         return jsonify({
             'success': False,
             'error': f'Database integrity error: {str(e)}'
@@ -1320,7 +1798,7 @@ def api_save_order_legacy():
     except mysql.connector.Error as e:
         if conn:
             conn.rollback()
-        print(f"MySQL error: {e}")
+        log.error("MySQL error in save order: %s", e)
         return jsonify({
             'success': False,
             'error': f'Database error: {str(e)}'
@@ -1329,7 +1807,7 @@ def api_save_order_legacy():
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"General error: {e}")
+        log.exception("General error in save order: %s", e)
         return jsonify({
             'success': False,
             'error': f'Unexpected error: {str(e)}'
@@ -1372,10 +1850,10 @@ def create_calculations_table():
         """)
 
         conn.commit()
-        print("Calculations table created successfully")
+        log.info("Calculations table created successfully")
 
     except mysql.connector.Error as e:
-        print(f"Error creating calculations table: {e}")
+        log.error("Error creating calculations table: %s", e)
     finally:
         if conn:
             conn.close()
@@ -1406,9 +1884,11 @@ def api_create_customer():
             INSERT INTO customers (customer_name)
             VALUES (%s)
         """, (customer_name,))
+        customer_id = cursor.lastrowid
+        bump_table_versions(cursor, ('customers',))
 
         conn.commit()
-        customer_id = cursor.lastrowid
+        mark_tables_changed('customers')
 
         return jsonify({
             'success': True,
@@ -1426,6 +1906,12 @@ def api_create_customer():
             conn.close()
 
 
+CALCULATION_ROW = RowMapper(
+    'customer_name', 'book_title', ('book_price', MONEY), ('profit_percent', MONEY), ('profit', MONEY),
+    ('shipping_cost', MONEY), 'shipping_adjustment_jpy', ('total_brl', MONEY), 'total_jpy',
+    ('exchange_rate', MONEY), 'rate_source', 'created_at'
+)
+
 @app.route('/api/calculations-history')
 def api_calculations_history():
     """API endpoint to get calculation history"""
@@ -1447,24 +1933,7 @@ def api_calculations_history():
             LIMIT 50
         """, (session.get('admin_id'),))
 
-        calculations_raw = cursor.fetchall()
-        calculations = []
-
-        for row in calculations_raw:
-            calculations.append({
-                'customer_name': row[0],
-                'book_title': row[1],
-                'book_price': safe_decimal_to_float(row[2]),
-                'profit_percent': safe_decimal_to_float(row[3]),
-                'profit': safe_decimal_to_float(row[4]),
-                'shipping_cost': safe_decimal_to_float(row[5]),
-                'shipping_adjustment_jpy': row[6],
-                'total_brl': safe_decimal_to_float(row[7]),
-                'total_jpy': row[8],
-                'exchange_rate': safe_decimal_to_float(row[9]),
-                'rate_source': row[10],
-                'created_at': row[11].isoformat() if row[11] else None
-            })
+        calculations = list_items(CALCULATION_ROW, cursor.fetchall())
 
         return jsonify({
             'success': True,
@@ -1507,9 +1976,11 @@ def api_create_asset():
             INSERT INTO assets (asset_name, `real`)
             VALUES (%s, %s)
         """, (asset_name, book_price))
+        asset_code = cursor.lastrowid
+        bump_table_versions(cursor, ('assets',))
 
         conn.commit()
-        asset_code = cursor.lastrowid
+        mark_tables_changed('assets')
 
         return jsonify({
             'success': True,
@@ -1526,9 +1997,102 @@ def api_create_asset():
         if conn:
             conn.close()
 
+ASSET_IMPORT_EXTENSIONS = ('.csv', '.txt', '.tsv', '.xlsx', '.xlsm')
+
+@app.route('/api/assets/import', methods=['POST'])
+def api_import_assets():
+    """
+    Start a bulk import of a supplier book list (CSV/XLSX upload, field "file").
+    The import runs in the background; poll the returned status_url.
+    """
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    extension = os.path.splitext(upload.filename)[1].lower()
+    if extension not in ASSET_IMPORT_EXTENSIONS:
+        return jsonify({'success': False, 'error': f'Unsupported file type "{extension}"; use .csv or .xlsx'}), 400
+
+    # The upload is copied to disk in chunks; the import streams it from there
+    fd, path = tempfile.mkstemp(prefix='asset-import-', suffix=extension)
+    os.close(fd)
+    conn = None
+    try:
+        upload.save(path)
+        conn = get_db_connection()
+        import_id = create_import(conn, upload.filename, session.get('admin_id'))
+    except Exception as e:
+        os.remove(path)
+        return jsonify({'success': False, 'error': f'Could not start import: {e}'})
+    finally:
+        if conn:
+            conn.close()
+
+    start_import(lambda: get_db_connection(), import_id, path, upload.filename,
+                 on_done=lambda counts: mark_tables_changed('assets') if counts else None)
+
+    return jsonify({
+        'success': True,
+        'import_id': import_id,
+        'status_url': url_for('api_asset_import_status', import_id=import_id)
+    }), 202
+
+@app.route('/api/assets/import/<import_id>')
+def api_asset_import_status(import_id):
+    """Progress of an asset import and a page of its rejected rows"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        status = import_status(cursor, import_id, limit, offset)
+        if status is None:
+            return jsonify({'success': False, 'error': 'Import not found'}), 404
+        return jsonify({'success': True, 'import': status})
+
+    except mysql.connector.Error as e:
+        return jsonify({'success': False, 'error': f'Database error: {e}'})
+    finally:
+        if conn:
+            conn.close()
+
+LOOKUP_CACHE_MAX_AGE = int(os.getenv('LOOKUP_CACHE_MAX_AGE', '0'))
+
+def lookup_etag(cursor, tables):
+    """
+    Strong ETag for a GET whose body depends only on tables and the query
+    string (e.g. ?shape=columnar), from the shared table_versions counters.
+    """
+    versions = get_table_versions(cursor, tables)
+    key = repr((request.endpoint, sorted(request.args.items(multi=True)), sorted(versions.items())))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def lookup_cache_headers(response, etag):
+    """ETag plus Cache-Control: browsers revalidate with If-None-Match (or reuse for max-age)"""
+    response.set_etag(etag)
+    response.cache_control.private = True
+    if LOOKUP_CACHE_MAX_AGE > 0:
+        response.cache_control.max_age = LOOKUP_CACHE_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def lookup_not_modified(etag):
+    """304 for a matching If-None-Match, or None to build the full response"""
+    if request.if_none_match.contains(etag):
+        return lookup_cache_headers(app.response_class(status=304), etag)
+    return None
+
 @app.route('/api/customers')
 def api_customers():
-    """API endpoint to get customers list"""
+    """API endpoint to get customers list (answers If-None-Match with 304)"""
     if not session.get('is_admin'):
         return jsonify({'success': False, 'error': 'Authentication required'}), 401
 
@@ -1536,15 +2100,16 @@ def api_customers():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Get distinct customer names from customers table
-        cursor.execute("SELECT DISTINCT customer_name FROM customers WHERE customer_name IS NOT NULL AND customer_name != '' ORDER BY customer_name")
-        customers_raw = cursor.fetchall()
-        customers = [row[0] for row in customers_raw]
+        etag = lookup_etag(cursor, ('customers',))
+        not_modified = lookup_not_modified(etag)
+        if not_modified:
+            return not_modified
 
-        return jsonify({
+        # Get distinct customer names from customers table
+        return lookup_cache_headers(jsonify({
             'success': True,
-            'customers': customers
-        })
+            'customers': customer_names(cursor)
+        }), etag)
 
     except mysql.connector.Error as e:
         return jsonify({'success': False, 'error': f'Database error: {e}'})
@@ -1555,9 +2120,11 @@ def api_customers():
             conn.close()
 
 
+ASSET_PRICE_ROW = RowMapper('name', ('price', MONEY))
+
 @app.route('/api/assets')
 def api_assets():
-    """API endpoint to get assets list with prices"""
+    """API endpoint to get assets list with prices (answers If-None-Match with 304)"""
     if not session.get('is_admin'):
         return jsonify({'success': False, 'error': 'Authentication required'}), 401
 
@@ -1565,103 +2132,225 @@ def api_assets():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Get asset names and prices from assets table
-        cursor.execute("SELECT asset_name, `real` FROM assets WHERE asset_name IS NOT NULL AND asset_name != '' ORDER BY asset_name")
-        assets_raw = cursor.fetchall()
+        etag = lookup_etag(cursor, ('assets',))
+        not_modified = lookup_not_modified(etag)
+        if not_modified:
+            return not_modified
 
-        # Convert to list of dictionaries with name and price
-        assets = []
-        for row in assets_raw:
-            assets.append({
-                'name': row[0],
-                'price': float(row[1]) if row[1] else 0.0
-            })
+        # Get asset names and prices from assets table
+        assets_raw = asset_prices(cursor)
 
-        print(f"API assets called - returning {len(assets)} assets with prices")
+        log.debug("API assets called - returning %d assets with prices", len(assets_raw))
 
-        response = jsonify({
+        return lookup_cache_headers(jsonify({
             'success': True,
-            'assets': assets
-        })
-        response.headers['Content-Type'] = 'application/json'
-        return response
+            'assets': list_items(ASSET_PRICE_ROW, assets_raw)
+        }), etag)
 
     except mysql.connector.Error as e:
-        print(f"Database error in api_assets: {e}")
+        log.error("Database error in api_assets: %s", e)
         return jsonify({'success': False, 'error': f'Database error: {e}'}), 500
     except Exception as e:
-        print(f"General error in api_assets: {e}")
+        log.exception("General error in api_assets: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
     finally:
         if conn:
             conn.close()
 
+API_ORDER_ROW = RowMapper(
+    'order_id', 'customer_id', 'asset_code', 'customer_name', 'asset_name', 'order_date',
+    ('order_real', MONEY), 'order_ien', ('frete_brasil', MONEY), ('frete_jp', MONEY),
+    ('total_value', MONEY), 'delivery_date', 'payment_type', 'created_at'
+)
+
 @app.route('/api/orders')
 def api_orders():
     """API endpoint to get orders with pagination"""
     if not session.get('is_admin'):
         return jsonify({'success': False, 'error': 'Authentication required'}), 401
 
+    conn = None
     try:
-        page = request.args.get('page', 1, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_cursor = request.args.get('cursor') or None
         per_page = 20
         offset = (page - 1) * per_page
 
+        if page_cursor and not is_valid_cursor(page_cursor):
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Get total count for pagination
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        total_orders = cursor.fetchone()[0]
-
-        # Get orders for current page
-        cursor.execute("""
-            SELECT order_id, customer_id, asset_code, customer_name, asset_name,
-                   order_date, order_real, order_ien, frete_brasil, frete_jp,
-                   total_value, delivery_date, payment_type, created_at
-            FROM orders
-            ORDER BY order_date DESC, order_id DESC
-            LIMIT %s OFFSET %s
-        """, (per_page, offset))
+        # Get total count for pagination (cached until orders is written)
+        total_orders = count_orders(cursor, [], [])
 
-        orders_raw = cursor.fetchall()
-        orders = []
+        # Get orders for current page: seek from the cursor, or OFFSET for a numbered page
+        orders_raw, next_cursor, prev_cursor = fetch_keyset_page(
+            cursor,
+            f"""
+            SELECT o.order_id, o.customer_id, o.asset_code, o.customer_name, o.asset_name,
+                   o.order_date, o.order_real, o.order_ien, o.frete_brasil, o.frete_jp,
+                   o.total_value, o.delivery_date, o.payment_type, o.created_at,
+                   {ORDER_DATE_KEY_SQL} as order_date_key
+            FROM orders o
+            """,
+            [], [], False, per_page,
+            cursor_token=page_cursor, offset=offset, key_index=(14, 0)
+        )
 
-        for row in orders_raw:
-            orders.append({
-                'order_id': row[0],
-                'customer_id': row[1],
-                'asset_code': row[2],
-                'customer_name': row[3],
-                'asset_name': row[4],
-                'order_date': row[5].isoformat() if row[5] else None,
-                'order_real': safe_decimal_to_float(row[6]),
-                'order_ien': row[7],
-                'frete_brasil': safe_decimal_to_float(row[8]),
-                'frete_jp': safe_decimal_to_float(row[9]),
-                'total_value': safe_decimal_to_float(row[10]),
-                'delivery_date': row[11].isoformat() if row[11] else None,
-                'payment_type': row[12],
-                'created_at': row[13].isoformat() if row[13] else None
-            })
+        orders = list_items(API_ORDER_ROW, orders_raw)
 
         # Calculate pagination info
-        total_pages = (total_orders + per_page - 1) // per_page
+        total_pages = max((total_orders + per_page - 1) // per_page, 1)
 
         return jsonify({
             'success': True,
             'orders': orders,
             'page': page,
             'total_pages': total_pages,
-            'has_prev': page > 1,
-            'has_next': page < total_pages,
+            'has_prev': prev_cursor is not None,
+            'has_next': next_cursor is not None,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
             'total_orders': total_orders
         })
 
     except mysql.connector.Error as e:
-        return jsonify({'success': False, 'error': f'Database error: {e}'})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return jsonify({'success': False, 'error': f'Database error: {e}'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+    finally:
+        if conn:
+            conn.close()
+
+
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '500'))
+EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', str(64 * 1024)))
+
+def export_format():
+    """?format= for the export routes (csv by default), or None if unsupported"""
+    fmt = request.args.get('format', 'csv').lower()
+    return fmt if fmt in EXPORT_FORMATS else None
+
+def export_response(conn, name, sql, params, columns, fmt):
+    """
+    Streamed download of sql. From here the response owns conn: it goes
+    back to the pool when the last row is sent (see exports.ExportStream).
+    """
+    cursor = open_export_cursor(conn, sql, params)
+    body = ExportStream(conn, cursor, columns, fmt,
+                        fetch_size=EXPORT_FETCH_SIZE, chunk_bytes=EXPORT_CHUNK_BYTES)
+    response = Response(body, content_type=CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"'
+    # Let a reverse proxy pass chunks through instead of spooling the whole file
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/export/orders')
+def export_orders():
+    """Orders as CSV or JSON, with the same customer/match/sort filters as /orders"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    fmt = export_format()
+    if fmt is None:
+        return jsonify({'success': False, 'error': 'format must be csv or json'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        where_conditions, query_params, _ = order_filter_conditions(
+            cursor, request.args.get('customer', '').strip(), request.args.get('match', 'auto')
+        )
+        cursor.close()
+
+        sql = ORDERS_EXPORT_SQL
+        if where_conditions:
+            sql += " WHERE " + " AND ".join(where_conditions)
+        sql += order_by(request.args.get('sort', 'recent') == 'oldest')
+
+        response = export_response(conn, 'orders', sql, query_params, ORDERS_EXPORT_COLUMNS, fmt)
+        conn = None
+        return response
+
+    except mysql.connector.Error as e:
+        return jsonify({'success': False, 'error': f'Database error: {e}'}), 500
+    finally:
+        if conn:
+            conn.close()
+
+@app.route('/export/customers')
+def export_customers():
+    """Customers with order totals and account balances, as CSV or JSON"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    fmt = export_format()
+    if fmt is None:
+        return jsonify({'success': False, 'error': 'format must be csv or json'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        response = export_response(conn, 'customers', CUSTOMERS_EXPORT_SQL, (), CUSTOMERS_EXPORT_COLUMNS, fmt)
+        conn = None
+        return response
+
+    except mysql.connector.Error as e:
+        return jsonify({'success': False, 'error': f'Database error: {e}'}), 500
+    finally:
+        if conn:
+            conn.close()
+
+@app.route('/export/customer-accounts')
+def export_customer_accounts():
+    """
+    Ledger (customer_accounts) as CSV or JSON.
+
+    Optional filters: ?customer= (exact name), ?from= / ?to= (YYYY-MM-DD,
+    inclusive, on transaction_date).
+    """
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    fmt = export_format()
+    if fmt is None:
+        return jsonify({'success': False, 'error': 'format must be csv or json'}), 400
+
+    where_conditions = []
+    query_params = []
+
+    customer_name = request.args.get('customer', '').strip()
+    if customer_name:
+        where_conditions.append("a.customer_id IN (SELECT customer_id FROM customers WHERE customer_name = %s)")
+        query_params.append(customer_name)
+
+    for arg, operator in (('from', '>='), ('to', '<=')):
+        value = request.args.get(arg, '').strip()
+        if not value:
+            continue
+        try:
+            query_params.append(datetime.strptime(value, '%Y-%m-%d').date())
+        except ValueError:
+            return jsonify({'success': False, 'error': f'{arg} must be a YYYY-MM-DD date'}), 400
+        where_conditions.append(f"a.transaction_date {operator} %s")
+
+    sql = LEDGER_EXPORT_SQL
+    if where_conditions:
+        sql += " WHERE " + " AND ".join(where_conditions)
+    sql += " ORDER BY a.account_id"
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        response = export_response(conn, 'customer-accounts', sql, query_params, LEDGER_EXPORT_COLUMNS, fmt)
+        conn = None
+        return response
+
+    except mysql.connector.Error as e:
+        return jsonify({'success': False, 'error': f'Database error: {e}'}), 500
     finally:
         if conn:
             conn.close()
@@ -1669,6 +2358,61 @@ def api_orders():
 
 # Add these new API endpoints to your app.py file after the existing API routes
 
+QUOTE_INSERT_SQL = """
+    INSERT INTO quotes (
+        customer_name, book_title, book_price, profit_percent, profit,
+        shipping_cost, shipping_adjustment_jpy, total_brl, total_jpy,
+        exchange_rate, rate_source, status, admin_id
+    ) VALUES """
+QUOTE_VALUES_SQL = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+
+def quote_values(data, admin_id):
+    """
+    Validate a quote from a request body and return its quotes row values.
+    Raises ValueError with a message for the client.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Quote must be an object')
+
+    # Validate required fields
+    required_fields = ['customer_name', 'book_title', 'total_jpy']
+    for field in required_fields:
+        if not data.get(field):
+            raise ValueError(f'{field} is required')
+
+    # Sanitize input data
+    customer_name = str(data['customer_name']).strip()
+    book_title = str(data['book_title']).strip()
+
+    if not customer_name or not book_title:
+        raise ValueError('Customer name and book title cannot be empty')
+    if len(customer_name) > 100:
+        raise ValueError('Customer name is too long (max 100 characters)')
+    if len(book_title) > 200:
+        raise ValueError('Book title is too long (max 200 characters)')
+
+    # Validate numeric fields
+    try:
+        book_price = float(data.get('book_price', 0))
+        profit_percent = float(data.get('profit_percent', 30))
+        profit = float(data.get('profit', 0))
+        shipping_cost = float(data.get('shipping_cost', 0))
+        shipping_adjustment_jpy = float(data.get('shipping_adjustment_jpy', 0))
+        total_brl = float(data.get('total_brl', 0))
+        total_jpy = float(data.get('total_jpy', 0))
+        exchange_rate = float(data.get('exchange_rate', 30))
+        # quotes.rate_source is VARCHAR(50); the label comes from the client
+        rate_source = str(data.get('rate_source', 'Unknown')).strip()[:50] or 'Unknown'
+    except (ValueError, TypeError):
+        raise ValueError('Invalid numeric values provided')
+
+    if total_jpy <= 0:
+        raise ValueError('Total value must be greater than 0')
+
+    return (customer_name, book_title, book_price, profit_percent, profit,
+            shipping_cost, shipping_adjustment_jpy, total_brl, total_jpy,
+            exchange_rate, rate_source, 'pending', admin_id)
+
 @app.route('/api/save-quote', methods=['POST'])
 def api_save_quote():
     """API endpoint to save a calculation as a quote (not an order)"""
@@ -1679,74 +2423,19 @@ def api_save_quote():
     try:
         data = request.get_json()
 
-        # Validate required fields
-        required_fields = ['customer_name', 'book_title', 'total_jpy']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'success': False, 'error': f'{field} is required'})
-
-        # Sanitize input data
-        customer_name = str(data['customer_name']).strip()
-        book_title = str(data['book_title']).strip()
-
-        if not customer_name or not book_title:
-            return jsonify({'success': False, 'error': 'Customer name and book title cannot be empty'})
-
-        # Validate numeric fields
         try:
-            book_price = float(data.get('book_price', 0))
-            profit_percent = float(data.get('profit_percent', 30))
-            profit = float(data.get('profit', 0))
-            shipping_cost = float(data.get('shipping_cost', 0))
-            shipping_adjustment_jpy = float(data.get('shipping_adjustment_jpy', 0))
-            total_brl = float(data.get('total_brl', 0))
-            total_jpy = float(data.get('total_jpy', 0))
-            exchange_rate = float(data.get('exchange_rate', 30))
-            rate_source = str(data.get('rate_source', 'Unknown'))
-
-            if total_jpy <= 0:
-                return jsonify({'success': False, 'error': 'Total value must be greater than 0'})
-
-        except (ValueError, TypeError):
-            return jsonify({'success': False, 'error': 'Invalid numeric values provided'})
+            values = quote_values(data, session.get('admin_id'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
 
         conn = get_db_connection()
         cursor = conn.cursor()
 
         # Insert new quote
-        cursor.execute("""
-            INSERT INTO quotes (
-                customer_name,
-                book_title,
-                book_price,
-                profit_percent,
-                profit,
-                shipping_cost,
-                shipping_adjustment_jpy,
-                total_brl,
-                total_jpy,
-                exchange_rate,
-                rate_source,
-                status,
-                admin_id
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            customer_name,
-            book_title,
-            book_price,
-            profit_percent,
-            profit,
-            shipping_cost,
-            shipping_adjustment_jpy,
-            total_brl,
-            total_jpy,
-            exchange_rate,
-            rate_source,
-            'pending',
-            session.get('admin_id')
-        ))
+        cursor.execute(QUOTE_INSERT_SQL + QUOTE_VALUES_SQL, values)
 
         conn.commit()
+        mark_tables_changed('quotes')
         quote_id = cursor.lastrowid
 
         return jsonify({
@@ -1758,7 +2447,7 @@ def api_save_quote():
     except mysql.connector.Error as e:
         if conn:
             conn.rollback()
-        print(f"MySQL error in save quote: {e}")
+        log.error("MySQL error in save quote: %s", e)
         return jsonify({
             'success': False,
             'error': f'Database error: {str(e)}'
@@ -1767,7 +2456,7 @@ def api_save_quote():
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"General error in save quote: {e}")
+        log.exception("General error in save quote: %s", e)
         return jsonify({
             'success': False,
             'error': f'Unexpected error: {str(e)}'
@@ -1818,6 +2507,7 @@ def api_approve_quote(quote_id):
                 VALUES (%s, %s, %s, %s)
             """, (customer_name, '', '', ''))
             customer_id = cursor.lastrowid
+            bump_table_versions(cursor, ('customers',))
         else:
             customer_id = customer_result[0]
 
@@ -1869,10 +2559,12 @@ def api_approve_quote(quote_id):
         ))
 
         order_id = cursor.lastrowid
+        add_orders(cursor, "order_id = %s", (order_id,))
 
         # Remove asset from assets table if it existed (since it's now sold)
         if should_remove_asset:
             cursor.execute("DELETE FROM assets WHERE asset_code = %s", (asset_code,))
+            bump_table_versions(cursor, ('assets',))
 
 
         # Update quote status to approved
@@ -1884,6 +2576,7 @@ def api_approve_quote(quote_id):
 
         # Commit the transaction
         conn.commit()
+        mark_tables_changed('quotes', 'orders', 'customers', 'assets')
 
         return jsonify({
             'success': True,
@@ -1896,7 +2589,7 @@ def api_approve_quote(quote_id):
     except mysql.connector.Error as e:
         if conn:
             conn.rollback()
-        print(f"MySQL error in approve quote: {e}")
+        log.error("MySQL error in approve quote: %s", e)
         return jsonify({
             'success': False,
             'error': f'Database error: {str(e)}'
@@ -1905,7 +2598,7 @@ def api_approve_quote(quote_id):
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"General error in approve quote: {e}")
+        log.exception("General error in approve quote: %s", e)
         return jsonify({
             'success': False,
             'error': f'Unexpected error: {str(e)}'
@@ -1949,6 +2642,7 @@ def api_reject_quote(quote_id):
         # cursor.execute("DELETE FROM quotes WHERE quote_id = %s", (quote_id,))
 
         conn.commit()
+        mark_tables_changed('quotes')
 
         return jsonify({
             'success': True,
@@ -1964,6 +2658,300 @@ def api_reject_quote(quote_id):
             conn.close()
 
 
+QUOTE_BULK_MAX = int(os.getenv('QUOTE_BULK_MAX', '200'))
+
+def bulk_quote_ids(data):
+    """Distinct quote ids from {"quote_ids": [...]}, in request order; raises ValueError"""
+    quote_ids = data.get('quote_ids') if isinstance(data, dict) else None
+    if not isinstance(quote_ids, list) or not quote_ids:
+        raise ValueError('quote_ids must be a non-empty array')
+    if len(quote_ids) > QUOTE_BULK_MAX:
+        raise ValueError(f'At most {QUOTE_BULK_MAX} quotes per request')
+    try:
+        return list(dict.fromkeys(int(quote_id) for quote_id in quote_ids))
+    except (TypeError, ValueError):
+        raise ValueError('quote_ids must be integers')
+
+def lock_pending_quotes(cursor, quote_ids, results):
+    """
+    Lock the requested quotes and return the pending ones' ids. Quotes that
+    are missing or no longer pending get their outcome in results.
+    """
+    placeholders = ', '.join(['%s'] * len(quote_ids))
+    cursor.execute(f"""
+        SELECT quote_id, status FROM quotes
+        WHERE quote_id IN ({placeholders})
+        FOR UPDATE
+    """, quote_ids)
+    status_by_id = dict(cursor.fetchall())
+
+    pending = []
+    for quote_id in quote_ids:
+        status = status_by_id.get(quote_id)
+        if status == 'pending':
+            pending.append(quote_id)
+        else:
+            results[quote_id] = {
+                'quote_id': quote_id,
+                'success': False,
+                'error': 'Quote not found' if status is None else f'Quote already {status}'
+            }
+    return pending
+
+@app.route('/api/save-quotes', methods=['POST'])
+def api_save_quotes():
+    """
+    Save many quotes in one request: {"quotes": [{...}, ...]}, each shaped
+    like the /api/save-quote body. Invalid quotes are reported per item and
+    the valid ones are inserted in one transaction.
+    """
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    data = request.get_json(silent=True) or {}
+    quotes = data.get('quotes')
+    if not isinstance(quotes, list) or not quotes:
+        return jsonify({'success': False, 'error': 'quotes must be a non-empty array'}), 400
+    if len(quotes) > QUOTE_BULK_MAX:
+        return jsonify({'success': False, 'error': f'At most {QUOTE_BULK_MAX} quotes per request'}), 400
+
+    admin_id = session.get('admin_id')
+    results = []
+    rows = []
+    for index, quote in enumerate(quotes):
+        try:
+            rows.append(quote_values(quote, admin_id))
+            results.append({'index': index, 'success': True})
+        except ValueError as e:
+            results.append({'index': index, 'success': False, 'error': str(e)})
+
+    if not rows:
+        return jsonify({'success': False, 'error': 'No valid quotes', 'results': results})
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # One INSERT per quote: a multi-row INSERT's ids are not guaranteed
+        # consecutive (innodb_autoinc_lock_mode=2), so each row's id is read back
+        quote_ids = []
+        for row in rows:
+            cursor.execute(QUOTE_INSERT_SQL + QUOTE_VALUES_SQL, row)
+            quote_ids.append(cursor.lastrowid)
+
+        conn.commit()
+        mark_tables_changed('quotes')
+
+        created = (result for result in results if result['success'])
+        for result, quote_id in zip(created, quote_ids):
+            result['quote_id'] = quote_id
+
+        return jsonify({
+            'success': True,
+            'created': len(rows),
+            'errors': len(results) - len(rows),
+            'results': results
+        })
+
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        log.error("MySQL error in save quotes: %s", e)
+        return jsonify({'success': False, 'error': f'Database error: {str(e)}'})
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        log.exception("General error in save quotes: %s", e)
+        return jsonify({'success': False, 'error': f'Unexpected error: {str(e)}'})
+    finally:
+        if conn:
+            conn.close()
+
+@app.route('/api/quotes/bulk-approve', methods=['POST'])
+def api_bulk_approve_quotes():
+    """
+    Approve many quotes in one transaction: {"quote_ids": [...]}.
+
+    Same effect as approving them one by one in id order (customers created
+    as needed, a matching in-stock asset attached to the order and removed
+    from stock), but with set-based statements for everything except the
+    order INSERTs, which run once per quote so each order id is known.
+    """
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    try:
+        quote_ids = bulk_quote_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        conn.start_transaction()
+
+        results = {}
+        pending = sorted(lock_pending_quotes(cursor, quote_ids, results))
+
+        if pending:
+            placeholders = ', '.join(['%s'] * len(pending))
+
+            # Create the customers that don't exist yet
+            cursor.execute(f"""
+                INSERT INTO customers (customer_name, customer_address, customer_telephone, customer_delivery_time_request)
+                SELECT DISTINCT q.customer_name, '', '', ''
+                FROM quotes q
+                LEFT JOIN customers c ON c.customer_name = q.customer_name
+                WHERE q.quote_id IN ({placeholders}) AND c.customer_id IS NULL
+            """, pending)
+            if cursor.rowcount:
+                bump_table_versions(cursor, ('customers',))
+
+            # Quote details with the customer each one belongs to
+            cursor.execute(f"""
+                SELECT q.quote_id, MIN(c.customer_id), q.customer_name, q.book_title, q.book_price,
+                       q.shipping_cost, q.shipping_adjustment_jpy, q.total_jpy
+                FROM quotes q
+                JOIN customers c ON c.customer_name = q.customer_name
+                WHERE q.quote_id IN ({placeholders})
+                GROUP BY q.quote_id
+                ORDER BY q.quote_id
+            """, pending)
+            quotes = cursor.fetchall()
+
+            # In-stock assets matching the titles; each one can be sold once,
+            # to the lowest quote id asking for it
+            cursor.execute(f"""
+                SELECT q.quote_id, a.asset_code
+                FROM quotes q
+                JOIN assets a ON a.asset_name = q.book_title
+                WHERE q.quote_id IN ({placeholders})
+                ORDER BY q.quote_id, a.asset_code
+                FOR UPDATE
+            """, pending)
+            sold = set()
+            asset_by_quote = {}
+            for quote_id, asset_code in cursor.fetchall():
+                if quote_id not in asset_by_quote and asset_code not in sold:
+                    asset_by_quote[quote_id] = asset_code
+                    sold.add(asset_code)
+
+            # One INSERT per order, reading back each id: a multi-row INSERT's
+            # ids are not guaranteed consecutive (innodb_autoinc_lock_mode=2)
+            order_date = datetime.now().date()
+            order_ids = []
+            for (quote_id, customer_id, customer_name, book_title, book_price,
+                 shipping_cost, shipping_adjustment_jpy, total_jpy) in quotes:
+                cursor.execute("""
+                    INSERT INTO orders (
+                        customer_id, asset_code, customer_name, asset_name, order_date,
+                        order_real, order_ien, frete_brasil, frete_jp, total_value, payment_type
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (customer_id, asset_by_quote.get(quote_id), customer_name, book_title, order_date,
+                      book_price, total_jpy, shipping_cost, shipping_adjustment_jpy, total_jpy, 'Quote Approved'))
+                order_ids.append(cursor.lastrowid)
+            add_orders(cursor, f"order_id IN ({', '.join(['%s'] * len(order_ids))})", order_ids)
+
+            # Sold assets leave stock
+            if sold:
+                cursor.execute(f"""
+                    DELETE FROM assets WHERE asset_code IN ({', '.join(['%s'] * len(sold))})
+                """, list(sold))
+                bump_table_versions(cursor, ('assets',))
+
+            cursor.execute(f"""
+                UPDATE quotes
+                SET status = 'approved', updated_at = CURRENT_TIMESTAMP
+                WHERE quote_id IN ({placeholders})
+            """, pending)
+
+            for quote, order_id in zip(quotes, order_ids):
+                quote_id = quote[0]
+                results[quote_id] = {
+                    'quote_id': quote_id,
+                    'success': True,
+                    'order_id': order_id,
+                    'customer_id': quote[1],
+                    'asset_code': asset_by_quote.get(quote_id)
+                }
+
+        conn.commit()
+        if pending:
+            mark_tables_changed('quotes', 'orders', 'customers', 'assets')
+
+        return jsonify({
+            'success': True,
+            'approved': len(pending),
+            'results': [results[quote_id] for quote_id in quote_ids]
+        })
+
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        log.error("MySQL error in bulk approve quotes: %s", e)
+        return jsonify({'success': False, 'error': f'Database error: {str(e)}'})
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        log.exception("General error in bulk approve quotes: %s", e)
+        return jsonify({'success': False, 'error': f'Unexpected error: {str(e)}'})
+    finally:
+        if conn:
+            conn.close()
+
+@app.route('/api/quotes/bulk-reject', methods=['POST'])
+def api_bulk_reject_quotes():
+    """Reject many pending quotes with one UPDATE: {"quote_ids": [...]}"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    try:
+        quote_ids = bulk_quote_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        conn.start_transaction()
+
+        results = {}
+        pending = lock_pending_quotes(cursor, quote_ids, results)
+        if pending:
+            cursor.execute(f"""
+                UPDATE quotes
+                SET status = 'rejected', updated_at = CURRENT_TIMESTAMP
+                WHERE quote_id IN ({', '.join(['%s'] * len(pending))})
+            """, pending)
+            for quote_id in pending:
+                results[quote_id] = {'quote_id': quote_id, 'success': True}
+
+        conn.commit()
+        if pending:
+            mark_tables_changed('quotes')
+
+        return jsonify({
+            'success': True,
+            'rejected': len(pending),
+            'results': [results[quote_id] for quote_id in quote_ids]
+        })
+
+    except mysql.connector.Error as e:
+        if conn:
+            conn.rollback()
+        return jsonify({'success': False, 'error': f'Database error: {e}'})
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+    finally:
+        if conn:
+            conn.close()
+
+
 # Update the existing api_save_order function to remove it or rename it
 # Since we now have quotes, the old direct order creation should be removed
 # or renamed to avoid confusion
@@ -2025,6 +3013,7 @@ def api_save_order_direct():
             """, (customer_name, '', '', ''))
 
             customer_id = cursor.lastrowid
+            bump_table_versions(cursor, ('customers',))
         else:
             customer_id = customer_result[0]
 
@@ -2066,10 +3055,12 @@ def api_save_order_direct():
             total_value_jpy,
             'Direct Order'
         ))
+        order_id = cursor.lastrowid
+        add_orders(cursor, "order_id = %s", (order_id,))
 
         # Commit the transaction
         conn.commit()
-        order_id = cursor.lastrowid
+        mark_tables_changed('orders', 'customers')
 
         return jsonify({
             'success': True,
@@ -2082,7 +3073,7 @@ def api_save_order_direct():
     except mysql.connector.IntegrityError as e:
         if conn:
             conn.rollback()
-        print(f"MySQL Integrity Error: {e}")
+        log.warning("MySQL integrity error in save order (direct): %s", e)
         return jsonify({
             'success': False,
             'error': f'Database integrity error: {str(e)}'
@@ -2091,7 +3082,7 @@ def api_save_order_direct():
     except mysql.connector.Error as e:
         if conn:
             conn.rollback()
-        print(f"MySQL error: {e}")
+        log.error("MySQL error in save order (direct): %s", e)
         return jsonify({
             'success': False,
             'error': f'Database error: {str(e)}'
@@ -2100,7 +3091,7 @@ def api_save_order_direct():
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"General error: {e}")
+        log.exception("General error in save order (direct): %s", e)
         return jsonify({
             'success': False,
             'error': f'Unexpected error: {str(e)}'
@@ -2111,6 +3102,12 @@ def api_save_order_direct():
             conn.close()
 
 
+API_QUOTE_ROW = RowMapper(
+    'quote_id', 'customer_name', 'book_title', ('book_price', MONEY), ('profit_percent', MONEY),
+    ('profit', MONEY), ('shipping_cost', MONEY), 'shipping_adjustment_jpy', ('total_brl', MONEY),
+    'total_jpy', ('exchange_rate', MONEY), 'rate_source', 'status', 'created_at'
+)
+
 @app.route('/api/quotes')
 def api_quotes():
     """API endpoint to get pending quotes"""
@@ -2131,26 +3128,7 @@ def api_quotes():
             ORDER BY created_at DESC
         """)
 
-        quotes_raw = cursor.fetchall()
-        quotes = []
-
-        for row in quotes_raw:
-            quotes.append({
-                'quote_id': row[0],
-                'customer_name': row[1],
-                'book_title': row[2],
-                'book_price': safe_decimal_to_float(row[3]),
-                'profit_percent': safe_decimal_to_float(row[4]),
-                'profit': safe_decimal_to_float(row[5]),
-                'shipping_cost': safe_decimal_to_float(row[6]),
-                'shipping_adjustment_jpy': row[7],
-                'total_brl': safe_decimal_to_float(row[8]),
-                'total_jpy': row[9],
-                'exchange_rate': safe_decimal_to_float(row[10]),
-                'rate_source': row[11],
-                'status': row[12],
-                'created_at': row[13].isoformat() if row[13] else None
-            })
+        quotes = list_items(API_QUOTE_ROW, cursor.fetchall())
 
         return jsonify({
             'success': True,
@@ -2166,6 +3144,11 @@ def api_quotes():
             conn.close()
 
 
+QUOTE_LIST_ROW = RowMapper(
+    'quote_id', 'customer_name', 'book_title', ('book_price', MONEY), 'total_jpy',
+    'status', 'created_at', 'updated_at'
+)
+
 @app.route('/quotes', methods=['GET', 'POST'])
 def quotes():
     """Quotes management page - view and manage pending quotes"""
@@ -2188,20 +3171,7 @@ def quotes():
             ORDER BY created_at DESC
         """, (status_filter,))
 
-        quotes_raw = cursor.fetchall()
-        quotes = []
-
-        for row in quotes_raw:
-            quotes.append({
-                'quote_id': row[0],
-                'customer_name': row[1],
-                'book_title': row[2],
-                'book_price': safe_decimal_to_float(row[3]),
-                'total_jpy': row[4],
-                'status': row[5],
-                'created_at': row[6],
-                'updated_at': row[7]
-            })
+        quotes = QUOTE_LIST_ROW.map_all(cursor.fetchall())
 
         return render_template('quotes.html', quotes=quotes, status_filter=status_filter)
 
@@ -2214,6 +3184,11 @@ def quotes():
 
 
 
+TRANSACTION_ROW = RowMapper(
+    'account_id', 'transaction_type', ('amount', MONEY), ('description', TEXT), 'order_id',
+    'transaction_date', 'created_at'
+)
+
 @app.route('/customer-account/<customer_name>')
 def customer_account(customer_name):
     """Customer account page - shows financial transactions and balance"""
@@ -2250,33 +3225,27 @@ def customer_account(customer_name):
             ORDER BY transaction_date DESC, created_at DESC
         """, (customer_id,))
 
-        transactions_raw = cursor.fetchall()
-        transactions = []
-
-        for row in transactions_raw:
-            transactions.append({
-                'account_id': row[0],
-                'transaction_type': row[1],
-                'amount': safe_decimal_to_float(row[2]),
-                'description': row[3] or '',
-                'order_id': row[4],
-                'transaction_date': row[5],
-                'created_at': row[6]
-            })
+        transactions = TRANSACTION_ROW.map_all(cursor.fetchall())
 
-        # Calculate balances
-        total_debits = sum(t['amount'] for t in transactions if t['transaction_type'] == 'debit')
-        total_payments = sum(t['amount'] for t in transactions if t['transaction_type'] == 'payment')
-        total_credits = sum(t['amount'] for t in transactions if t['transaction_type'] == 'credit')
+        # Balances are maintained in customer_balances by the ledger write routes
+        cursor.execute("""
+            SELECT total_debt, total_payments, total_credits, balance
+            FROM customer_balances
+            WHERE customer_id = %s
+        """, (customer_id,))
+        balance_row = cursor.fetchone() or (0, 0, 0, 0)
 
-        current_balance = total_debits - total_payments - total_credits
+        total_debits = safe_decimal_to_float(balance_row[0])
+        total_payments = safe_decimal_to_float(balance_row[1])
+        total_credits = safe_decimal_to_float(balance_row[2])
+        current_balance = safe_decimal_to_float(balance_row[3])
 
         # Get orders summary for this customer
         cursor.execute("""
             SELECT COUNT(*) as total_orders, COALESCE(SUM(total_value), 0) as total_orders_value
             FROM orders
-            WHERE customer_name = %s
-        """, (customer_name,))
+            WHERE customer_id = %s
+        """, (customer_id,))
 
         orders_summary = cursor.fetchone()
 
@@ -2318,6 +3287,9 @@ def add_customer_transaction(customer_name):
         if not transaction_type or amount <= 0:
             return jsonify({'success': False, 'error': 'Transaction type and valid amount are required'})
 
+        if transaction_type not in ('debit', 'payment', 'credit'):
+            return jsonify({'success': False, 'error': f'Unknown transaction type: {transaction_type}'})
+
         conn = get_db_connection()
         cursor = conn.cursor()
 
@@ -2338,7 +3310,11 @@ def add_customer_transaction(customer_name):
         """, (customer_id, customer_name, transaction_type, amount, description,
               transaction_date, session.get('admin_id')))
 
+        # Keep the materialized balance in the same transaction
+        record_transaction(cursor, customer_id, transaction_type, amount, description, transaction_date)
+
         conn.commit()
+        mark_tables_changed('customer_accounts')
 
         if request.is_json:
             return jsonify({'success': True, 'message': 'Transaction added successfully'})
@@ -2376,16 +3352,20 @@ def delete_customer_transaction(customer_name, account_id):
 
         # Verify transaction belongs to customer
         cursor.execute("""
-            SELECT account_id FROM customer_accounts
+            SELECT customer_id, transaction_type, amount FROM customer_accounts
             WHERE account_id = %s AND customer_name = %s
+            FOR UPDATE
         """, (account_id, customer_name))
 
-        if not cursor.fetchone():
+        transaction = cursor.fetchone()
+        if not transaction:
             return jsonify({'success': False, 'error': 'Transaction not found'})
 
-        # Delete transaction
+        # Delete transaction and take it out of the materialized balance
         cursor.execute("DELETE FROM customer_accounts WHERE account_id = %s", (account_id,))
+        remove_transaction(cursor, transaction[0], transaction[1], transaction[2])
         conn.commit()
+        mark_tables_changed('customer_accounts')
 
         if request.method == 'DELETE':
             return jsonify({'success': True, 'message': 'Transaction deleted successfully'})
@@ -2431,14 +3411,19 @@ def api_create_order_transaction():
         customer_id = customer[0]
 
         # Insert debit transaction
+        transaction_date = datetime.now().date()
         cursor.execute("""
             INSERT INTO customer_accounts (customer_id, customer_name, transaction_type, amount,
                                          description, order_id, transaction_date, admin_id)
             VALUES (%s, %s, 'debit', %s, %s, %s, %s, %s)
         """, (customer_id, customer_name, amount, description, order_id,
-              datetime.now().date(), session.get('admin_id')))
+              transaction_date, session.get('admin_id')))
+
+        # Keep the materialized balance in the same transaction
+        record_transaction(cursor, customer_id, 'debit', amount, description, transaction_date)
 
         conn.commit()
+        mark_tables_changed('customer_accounts')
 
         return jsonify({'success': True, 'message': 'Order transaction created successfully'})
 
@@ -2478,9 +3463,8 @@ def batch_edit_orders():
         flash('Please login as admin to access this page')
         return redirect(url_for('admin_login'))
 
-    # ADD THIS DEBUG LINE
-    print(f"DEBUG: Form data: {request.form}")
-    print(f"DEBUG: Args: {request.args}")
+    log.debug("Batch edit orders request", extra={'form': request.form.to_dict(flat=False),
+                                                  'query_args': request.args.to_dict(flat=False)})
 
     try:
         order_ids = request.form.get('order_ids', '').split(',')
@@ -2525,7 +3509,8 @@ def batch_edit_orders():
         placeholders = ','.join(['%s'] * len(order_ids))
         update_values.extend(order_ids)
 
-        # Execute batch update
+        # Execute batch update. delivery_date and payment_type are not rolled
+        # up, so sales_rollup needs no adjustment here
         query = f"""
             UPDATE orders
             SET {', '.join(update_fields)}
@@ -2534,6 +3519,7 @@ def batch_edit_orders():
 
         cursor.execute(query, update_values)
         conn.commit()
+        mark_tables_changed('orders')
 
         updated_count = cursor.rowcount
         flash(f'Successfully updated {updated_count} orders!')
@@ -2552,6 +3538,345 @@ def batch_edit_orders():
         return redirect(url_for('orders'))
 
 
+@app.route('/admin/pool-stats')
+def admin_pool_stats():
+    """Connection pool usage (in use, idle, wait time) for sizing the pool"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    return jsonify({'success': True, 'pool': db_pool.stats()})
+
+@app.route('/admin/cache-stats')
+def admin_cache_stats():
+    """Hit/miss/eviction counters of the in-process caches"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    return jsonify({
+        'success': True,
+        'query_cache': query_cache.stats(),
+        'reference_cache': reference_cache.stats(),
+        'typeahead': {entity: index.stats() for entity, (table, index) in typeahead_indexes.items()}
+    })
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@app.route('/admin/query-stats')
+def admin_query_stats():
+    """SQL statements per endpoint, slowest statements, slow queries and N+1 patterns"""
+    if not session.get('is_admin'):
+        if request.args.get('format') == 'json':
+            return jsonify({'success': False, 'error': 'Authentication required'}), 401
+        flash('Please login as admin to access this page')
+        return redirect(url_for('admin_login'))
+
+    snapshot = query_stats.snapshot(top=request.args.get('top', 20, type=int))
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'enabled': QUERY_STATS_ENABLED, **snapshot})
+    snapshot['since'] = datetime.fromtimestamp(snapshot['since'])
+    return render_template('query_stats.html', enabled=QUERY_STATS_ENABLED, **snapshot)
+
+@app.route('/admin/query-stats/reset', methods=['POST'])
+def admin_query_stats_reset():
+    """Start the query statistics over"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    query_stats.reset()
+    return jsonify({'success': True})
+
+@app.route('/admin/query-stats/metrics')
+def admin_query_metrics():
+    """Query statistics in the Prometheus text format"""
+    if not session.get('is_admin'):
+        return Response('Authentication required\n', status=401, mimetype='text/plain')
+
+    return Response('\n'.join(query_stats.prometheus_lines()) + '\n',
+                    content_type=PROMETHEUS_CONTENT_TYPE)
+
+# Scrapers without an admin session authenticate with "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+def metrics_authorized():
+    if session.get('is_admin'):
+        return True
+    auth = request.headers.get('Authorization', '')
+    return bool(METRICS_TOKEN) and hmac.compare_digest(auth, f'Bearer {METRICS_TOKEN}')
+
+POOL_COUNTERS = ('created', 'closed', 'recycled', 'failed_pings', 'borrows', 'waits', 'timeouts')
+
+def pool_metric_lines():
+    lines = []
+    for key, value in db_pool.stats().items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE db_pool_{key} {'counter' if key in POOL_COUNTERS else 'gauge'}")
+            lines.append(f'db_pool_{key} {value}')
+    return lines
+
+@app.route('/metrics')
+def metrics():
+    """Request, upstream, SQL and pool metrics in the Prometheus text format"""
+    if not metrics_authorized():
+        return Response('Authentication required\n', status=401, mimetype='text/plain')
+
+    lines = request_metrics.prometheus_lines() + query_stats.prometheus_lines() + pool_metric_lines()
+    return Response('\n'.join(lines) + '\n', content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/admin/request-stats')
+def admin_request_stats():
+    """Per-endpoint request counts, error rates and estimated p50/p95/p99 latency"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    return jsonify({'success': True, **request_metrics.summary()})
+
+@app.route('/admin/logging-stats')
+def admin_logging_stats():
+    """Log queue depth and records dropped or sampled out"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    return jsonify({'success': True, 'logging': logging_stats()})
+
+@app.route('/admin/calculation-history-stats')
+def admin_calculation_history_stats():
+    """Background calculation history writer: queue depth, batches, dropped rows"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+
+    return jsonify({'success': True, 'writer': calculation_history.stats()})
+
+
+# Maintenance commands: flask --app app balances rebuild|verify
+balances_cli = AppGroup('balances', help='Materialized customer balance maintenance')
+
+@balances_cli.command('rebuild')
+def balances_rebuild_command():
+    """Recompute customer_balances from customer_accounts (the table comes from migration 0004)"""
+    conn = get_db_connection()
+    try:
+        rebuilt = rebuild_customer_balances(conn)
+        mark_tables_changed('customer_accounts')
+        click.echo(f'Rebuilt balances for {rebuilt} customers')
+    finally:
+        conn.close()
+
+@balances_cli.command('verify')
+def balances_verify_command():
+    """Report customers whose stored balance differs from the ledger"""
+    conn = get_db_connection()
+    try:
+        mismatches = verify_customer_balances(conn)
+    finally:
+        conn.close()
+
+    for customer_id, field, expected, stored in mismatches:
+        click.echo(f'customer {customer_id}: {field} expected {expected}, stored {stored}')
+    if mismatches:
+        raise SystemExit(f'{len(mismatches)} mismatches found; run "flask --app app balances rebuild"')
+    click.echo('customer_balances matches customer_accounts')
+
+app.cli.add_command(balances_cli)
+
+# Maintenance commands: flask --app app rollup rebuild|verify
+rollup_cli = AppGroup('rollup', help='Sales rollup maintenance')
+
+@rollup_cli.command('rebuild')
+def rollup_rebuild_command():
+    """Recompute sales_rollup from orders (the table comes from migration 0005)"""
+    conn = get_db_connection()
+    try:
+        rebuilt = rebuild_sales_rollup(conn)
+        click.echo(f'Rebuilt {rebuilt} sales rollup rows')
+    finally:
+        conn.close()
+
+@rollup_cli.command('verify')
+def rollup_verify_command():
+    """Report rollup rows that differ from a fresh aggregate of orders"""
+    conn = get_db_connection()
+    try:
+        mismatches = verify_sales_rollup(conn)
+    finally:
+        conn.close()
+
+    for (month, customer_name, asset_name), field, expected, stored in mismatches:
+        click.echo(f'{month or "(no date)"} / {customer_name} / {asset_name}: '
+                   f'{field} expected {expected}, stored {stored}')
+    if mismatches:
+        raise SystemExit(f'{len(mismatches)} mismatches found; run "flask --app app rollup rebuild"')
+    click.echo('sales_rollup matches orders')
+
+app.cli.add_command(rollup_cli)
+
+# Maintenance commands: flask --app app customers reconcile
+customers_cli = AppGroup('customers', help='Customer data maintenance')
+
+@customers_cli.command('reconcile')
+@click.option('--fix-mismatched', is_flag=True,
+              help='Also repoint orders whose customer_id is valid but whose name belongs to another customer')
+@click.option('--dry-run', is_flag=True, help='Only report what would change')
+def customers_reconcile_command(fix_mismatched, dry_run):
+    """Backfill/repair orders.customer_id from orders.customer_name"""
+    conn = get_db_connection()
+    try:
+        status, updated = reconcile_order_customers(conn, fix_mismatched=fix_mismatched, dry_run=dry_run)
+        if updated:
+            mark_tables_changed('orders')
+    finally:
+        conn.close()
+
+    click.echo(f"Orders with a missing customer, matched by name: {status['dangling']}")
+    click.echo(f"Orders whose name belongs to another customer: {status['mismatched']}")
+    click.echo(f"Orders that could not be matched: {status['unresolved']}")
+    if dry_run:
+        click.echo('Dry run; nothing was changed')
+    else:
+        click.echo(f'Updated {updated} orders')
+
+app.cli.add_command(customers_cli)
+
+# Maintenance commands: flask --app app assets import FILE
+assets_cli = AppGroup('assets', help='Book catalog maintenance')
+
+@assets_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def assets_import_command(path):
+    """Import a supplier book list (CSV or XLSX) into assets"""
+    conn = get_db_connection()
+    try:
+        import_id = create_import(conn, os.path.basename(path))
+        counts = run_import(
+            conn, import_id, path, path,
+            progress=lambda c: click.echo(f"read {c['rows_read']}, staged {c['rows_staged']}, "
+                                          f"rejected {c['rows_rejected']}")
+        )
+        mark_tables_changed('assets')
+        status = import_status(conn.cursor(), import_id, reject_limit=50)
+    except ImportFileError as e:
+        raise SystemExit(str(e))
+    finally:
+        conn.close()
+
+    for reject in status['rejects']:
+        click.echo(f"row {reject['row']}: {reject['reason']} ({reject['value']})")
+    if counts['rows_rejected'] > len(status['rejects']):
+        click.echo(f"... see /api/assets/import/{import_id} for all rejected rows")
+    click.echo(f"Imported {counts['rows_inserted']} books, rejected {counts['rows_rejected']} rows")
+
+app.cli.add_command(assets_cli)
+
+# Maintenance commands: flask --app app versions bump
+versions_cli = AppGroup('versions', help='Lookup list versions (ETags)')
+
+@versions_cli.command('bump')
+@click.argument('tables', nargs=-1)
+def versions_bump_command(tables):
+    """Invalidate client caches of customers/assets after writes made outside the app"""
+    tables = tables or VERSIONED_TABLES
+    unknown = [table for table in tables if table not in VERSIONED_TABLES]
+    if unknown:
+        raise SystemExit(f"Not a versioned table: {', '.join(unknown)} (choose from {', '.join(VERSIONED_TABLES)})")
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        bump_table_versions(cursor, tables)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    click.echo(f"Bumped versions of {', '.join(tables)}")
+
+app.cli.add_command(versions_cli)
+
+# Maintenance commands: flask --app app migrations upgrade|status|check
+# The app never migrates by itself; run "migrations upgrade" when deploying,
+# before the new version starts serving
+migrations_cli = AppGroup('migrations', help='Versioned schema migrations (migrations/)')
+
+@migrations_cli.command('upgrade')
+@click.option('--target', type=int, help='Stop after this migration version')
+def migrations_upgrade_command(target):
+    """Apply pending migrations in version order"""
+    conn = get_db_connection()
+    try:
+        applied = migrate(conn, target=target, echo=click.echo)
+    except MigrationError as e:
+        raise SystemExit(str(e))
+    finally:
+        conn.close()
+    click.echo(f'Applied {len(applied)} migrations' if applied else 'Schema is up to date')
+
+@migrations_cli.command('status')
+def migrations_status_command():
+    """List migrations as applied, pending or changed since applied"""
+    conn = get_db_connection()
+    try:
+        rows = migration_status(conn)
+    finally:
+        conn.close()
+
+    for migration, state, applied_at in rows:
+        when = f' ({applied_at})' if applied_at else ''
+        click.echo(f'{migration.version:04d}_{migration.name:<40} {state}{when}')
+
+@migrations_cli.command('check')
+def migrations_check_command():
+    """EXPLAIN the hot queries and report whether they use the migrated indexes"""
+    conn = get_db_connection()
+    try:
+        results = check_plans(conn)
+    finally:
+        conn.close()
+
+    failed = 0
+    for migration, description, expected, keys, ok in results:
+        used = ', '.join(str(key) for key in keys)
+        click.echo(f"{'ok  ' if ok else 'FAIL'} {migration.version:04d} {description}: "
+                   f"expected {expected}, plan uses {used}")
+        failed += not ok
+    if failed:
+        raise SystemExit(f'{failed} of {len(results)} plans do not use the expected index')
+
+# "up" is the older name of the command
+migrations_cli.add_command(migrations_upgrade_command, 'up')
+
+app.cli.add_command(migrations_cli)
+
+# Routes depend on tables the migrations create, so each process checks the
+# schema once, on its first request (never at import, so the CLI commands
+# and plain imports don't touch the database)
+schema_checked = False
+
+@app.before_request
+def check_schema_once():
+    global schema_checked
+    if schema_checked:
+        return
+    schema_checked = True
+    check_schema()
+
+def check_schema():
+    """Log an error naming any migration that is not applied, or was edited after it was"""
+    conn = None
+    try:
+        conn = get_db_connection()
+        rows = migration_status(conn)
+        pending = [f'{migration.version:04d}_{migration.name}' for migration, state, _ in rows if state == 'pending']
+        changed = [f'{migration.version:04d}_{migration.name}' for migration, state, _ in rows if state == 'changed']
+        if pending:
+            log.error("Schema migrations not applied: %s. Pages that need their tables fail "
+                      "until 'flask --app app migrations upgrade' runs", ', '.join(pending))
+        if changed:
+            log.error("Schema migrations edited after they were applied: %s "
+                      "(see 'flask --app app migrations status')", ', '.join(changed))
+    except Exception as e:
+        log.error("Could not check the schema migrations: %s", e)
+    finally:
+        if conn:
+            conn.close()
+
+
 # Uncomment the line below to create the calculations table (run once)
 # create_calculations_table()
 
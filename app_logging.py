@@ -0,0 +1,220 @@
+# app_logging.py
+"""
+Structured, non-blocking logging for the app and its helper modules.
+
+Modules log through logging.getLogger(__name__) with %-style arguments, so
+a disabled level costs one comparison and no string formatting:
+
+    log.debug("Calculate API called", extra={'data': data})
+    log.warning("Could not seed exchange rate: %s", e)
+
+configure_logging() puts one bounded QueueHandler on the root logger. The
+request thread only enqueues the record; a QueueListener thread formats it
+(one JSON object per line, or plain text) and writes it to stderr. When the
+queue is full the record is dropped and counted instead of blocking the
+request.
+
+Every record carries the request id and endpoint of the request that logged
+it (bind_request() from before_request), and anything passed in extra= as
+structured fields. DEBUG records can be sampled: only debug_sample_rate of
+them are kept, or extra={'sample_rate': ...} for a single call site.
+
+Environment (read by configure_logging_from_env):
+    LOG_LEVEL               root level (INFO)
+    LOG_LEVELS              per-logger levels, e.g. "app=DEBUG,werkzeug=WARNING"
+    LOG_FORMAT              json or text (json)
+    LOG_QUEUE_SIZE          records buffered before dropping (10000)
+    LOG_DEBUG_SAMPLE_RATE   fraction of DEBUG records kept (1.0)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+_request = ContextVar('log_request', default=None)
+
+# LogRecord attributes that are not user fields (anything else came from extra=)
+_RESERVED = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'endpoint', 'sample_rate'
+}
+
+
+def bind_request(request_id, endpoint=None):
+    """Attach request_id/endpoint to records logged in this context; returns a token"""
+    return _request.set((request_id, endpoint))
+
+
+def unbind_request(token):
+    _request.reset(token)
+
+
+def current_request_id():
+    bound = _request.get()
+    return bound[0] if bound else None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the bound request id / endpoint and samples DEBUG records"""
+
+    def __init__(self, debug_sample_rate=1.0):
+        super().__init__()
+        self.debug_sample_rate = float(debug_sample_rate)
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG:
+            rate = getattr(record, 'sample_rate', self.debug_sample_rate)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return False
+        bound = _request.get()
+        record.request_id, record.endpoint = bound if bound else (None, None)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request fields, extras"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+            entry['endpoint'] = getattr(record, 'endpoint', None)
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        elif record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development, extras appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [f'{key}={value!r}' for key, value in record.__dict__.items() if key not in _RESERVED]
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            fields.insert(0, f'request_id={request_id}')
+        return f"{line} [{' '.join(fields)}]" if fields else line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve what can't cross threads safely (args, live exception objects),
+        # keeping the extras for the formatter on the listener thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room: the queue may be full at shutdown, and it is draining
+        self.queue.put(self._sentinel)
+
+
+_state = {}
+_state_lock = threading.Lock()
+
+
+def parse_levels(spec):
+    """Parse "app=DEBUG,werkzeug=WARNING" into {'app': 'DEBUG', 'werkzeug': 'WARNING'}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level='INFO', levels=None, fmt='json', queue_size=10000,
+                      debug_sample_rate=1.0, stream=None):
+    """Install the queue handler on the root logger (once per process)"""
+    with _state_lock:
+        if _state:
+            return _state['handler']
+
+        log_queue = queue.Queue(maxsize=int(queue_size))
+        handler = DroppingQueueHandler(log_queue)
+        context_filter = RequestContextFilter(debug_sample_rate)
+        handler.addFilter(context_filter)
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+        listener = _Listener(log_queue, output, respect_handler_level=False)
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level.upper())
+        for name, logger_level in (levels or {}).items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        listener.start()
+        # Flush what is still queued on a normal shutdown
+        atexit.register(listener.stop)
+        _state.update(handler=handler, filter=context_filter, listener=listener, queue=log_queue)
+        return handler
+
+
+def configure_logging_from_env():
+    return configure_logging(
+        level=os.getenv('LOG_LEVEL', 'INFO'),
+        levels=parse_levels(os.getenv('LOG_LEVELS', '')),
+        fmt=os.getenv('LOG_FORMAT', 'json').lower(),
+        queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+        debug_sample_rate=float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0')),
+    )
+
+
+def logging_stats():
+    """Queue depth and records dropped (queue full) or sampled out"""
+    if not _state:
+        return {'configured': False}
+    return {
+        'configured': True,
+        'queued': _state['queue'].qsize(),
+        'queue_size': _state['queue'].maxsize,
+        'dropped': _state['handler'].dropped,
+        'sampled_out': _state['filter'].sampled_out,
+        'debug_sample_rate': _state['filter'].debug_sample_rate,
+    }
@@ -0,0 +1,454 @@
+# asset_import.py
+"""
+Bulk import of supplier book lists (CSV or XLSX) into assets.
+
+Files are read row by row and loaded in chunks of multi-row INSERTs into
+asset_import_staging, so memory use depends on the chunk size, not on the
+file size. Once the whole file is staged, three set-based statements finish
+the job in one transaction: rows repeating an earlier title in the same
+file are rejected, titles already in the catalog are rejected, and the rest
+go into assets with one INSERT ... SELECT. Titles are compared the way MySQL
+compares asset_name (case-insensitive, trailing spaces ignored). The tables
+are utf8mb3, so a title with a 4-byte UTF-8 character (emoji) is rejected on
+its own row instead of failing the chunk.
+
+Progress lives in asset_imports and rejected rows in asset_import_rejects,
+so any worker process can report on an import (the tables are created by
+migration 0007). Row numbers count the header as row 1, like a spreadsheet.
+
+XLSX support needs openpyxl (pip install openpyxl).
+"""
+import codecs
+import csv
+import logging
+import os
+import re
+import threading
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from table_versions import bump_table_versions
+
+log = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_NAME_LENGTH = 200
+MAX_RAW_LENGTH = 500
+
+CREATE_IMPORT_TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS asset_imports (
+        import_id CHAR(32) NOT NULL,
+        filename VARCHAR(255) DEFAULT NULL,
+        status ENUM('queued','staging','loading','done','failed') NOT NULL DEFAULT 'queued',
+        rows_read INT NOT NULL DEFAULT 0,
+        rows_staged INT NOT NULL DEFAULT 0,
+        rows_rejected INT NOT NULL DEFAULT 0,
+        rows_inserted INT NOT NULL DEFAULT 0,
+        error VARCHAR(500) DEFAULT NULL,
+        admin_id INT DEFAULT NULL,
+        created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP NULL DEFAULT NULL,
+        PRIMARY KEY (import_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS asset_import_staging (
+        import_id CHAR(32) NOT NULL,
+        line_no INT NOT NULL,
+        asset_name VARCHAR(200) NOT NULL,
+        `real` DECIMAL(10,2) DEFAULT NULL,
+        ienes INT DEFAULT NULL,
+        black TINYINT(1) NOT NULL DEFAULT 0,
+        private TINYINT(1) NOT NULL DEFAULT 0,
+        PRIMARY KEY (import_id, line_no),
+        KEY idx_asset_import_staging_name (import_id, asset_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS asset_import_rejects (
+        import_id CHAR(32) NOT NULL,
+        line_no INT NOT NULL,
+        reason VARCHAR(255) NOT NULL,
+        raw_value VARCHAR(500) DEFAULT NULL,
+        PRIMARY KEY (import_id, line_no)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3
+    """,
+)
+
+# Accepted header names (compared lower-cased, spaces and dashes as underscores)
+COLUMN_ALIASES = {
+    'asset_name': ('asset_name', 'name', 'title', 'book_title', 'book', 'titulo', 'título', 'nome', 'livro'),
+    'real': ('real', 'price_brl', 'brl', 'preco', 'preço', 'price', 'real_price'),
+    'ienes': ('ienes', 'price_jpy', 'jpy', 'yen', 'iene', 'ienes_price'),
+    'black': ('black', 'black_market'),
+    'private': ('private', 'privado'),
+}
+
+FLAG_VALUES = {
+    '': 0, '0': 0, 'false': 0, 'no': 0, 'n': 0, 'nao': 0, 'não': 0,
+    '1': 1, 'true': 1, 'yes': 1, 'y': 1, 'sim': 1, 's': 1, 'x': 1,
+}
+
+# '1.500' style thousands grouping in yen columns
+YEN_DOT_GROUPED = re.compile(r'^\d{1,3}(\.\d{3})+$')
+
+# Characters outside the Basic Multilingual Plane (emoji etc.) take 4 bytes in
+# UTF-8, which the utf8mb3 tables can't store
+NON_BMP = re.compile('[\U00010000-\U0010FFFF]')
+
+
+class ImportFileError(ValueError):
+    """The file as a whole can't be imported (unknown format, no title column)"""
+
+
+# -- reading ------------------------------------------------------------------
+
+def _detect_encoding(path):
+    """utf-8 (with or without BOM) if the start of the file decodes, else cp1252"""
+    with open(path, 'rb') as f:
+        sample = f.read(65536)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+
+def read_csv(path):
+    """Yield the rows of a CSV file as lists of strings; the delimiter is sniffed"""
+    encoding = _detect_encoding(path)
+    with open(path, newline='', encoding=encoding, errors='replace') as f:
+        sample = f.read(16384)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def read_xlsx(path):
+    """Yield the rows of the first worksheet, streaming (openpyxl read-only mode)"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportFileError('XLSX import needs openpyxl (pip install openpyxl); upload a CSV instead')
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def read_rows(path, filename):
+    extension = os.path.splitext(filename or path)[1].lower()
+    if extension in ('.csv', '.txt', '.tsv'):
+        return read_csv(path)
+    if extension in ('.xlsx', '.xlsm'):
+        return read_xlsx(path)
+    raise ImportFileError(f'Unsupported file type "{extension}"; use .csv or .xlsx')
+
+
+# -- parsing ------------------------------------------------------------------
+
+def column_indexes(header):
+    """{field: column index} from the header row"""
+    indexes = {}
+    for position, title in enumerate(header):
+        key = str(title or '').strip().lower().replace(' ', '_').replace('-', '_')
+        for field, aliases in COLUMN_ALIASES.items():
+            if key in aliases and field not in indexes:
+                indexes[field] = position
+    if 'asset_name' not in indexes:
+        raise ImportFileError('No title column found (expected one of: ' +
+                              ', '.join(COLUMN_ALIASES['asset_name']) + ')')
+    return indexes
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def parse_price(value):
+    """BRL price; accepts 12.5, '12,50', '1.234,56', 'R$ 10'. None if blank."""
+    if isinstance(value, (int, float, Decimal)):
+        amount = Decimal(str(value))
+    else:
+        text = _text(value).replace('R$', '').replace(' ', '')
+        if not text:
+            return None
+        if ',' in text and '.' in text:
+            # Whichever separator comes last is the decimal point
+            if text.rfind(',') > text.rfind('.'):
+                text = text.replace('.', '').replace(',', '.')
+            else:
+                text = text.replace(',', '')
+        else:
+            text = text.replace(',', '.')
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f'Invalid price "{value}"')
+    if not amount.is_finite() or amount < 0 or amount >= Decimal('100000000'):
+        raise ValueError(f'Price out of range "{value}"')
+    return amount.quantize(Decimal('0.01'))
+
+
+def parse_yen(value):
+    """Whole yen amount; accepts 1500, '1,500', '1.500', '¥1500'. None if blank."""
+    text = _text(value).replace('¥', '').replace('円', '').replace(',', '').replace(' ', '')
+    if not text:
+        return None
+    if YEN_DOT_GROUPED.match(text):
+        # Brazilian spreadsheets group thousands with dots
+        text = text.replace('.', '')
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f'Invalid yen amount "{value}"')
+    if not amount.is_finite() or amount != amount.to_integral_value() or not 0 <= amount < 2**31:
+        raise ValueError(f'Invalid yen amount "{value}"')
+    return int(amount)
+
+
+def parse_flag(value):
+    text = _text(value).lower()
+    if text.endswith('.0'):
+        text = text[:-2]
+    if text not in FLAG_VALUES:
+        raise ValueError(f'Invalid yes/no value "{value}"')
+    return FLAG_VALUES[text]
+
+
+def parse_row(values, indexes):
+    """(asset_name, real, ienes, black, private) for one data row; raises ValueError"""
+    def cell(field):
+        position = indexes.get(field)
+        return values[position] if position is not None and position < len(values) else None
+
+    asset_name = ' '.join(_text(cell('asset_name')).split())
+    if not asset_name:
+        raise ValueError('Missing title')
+    if len(asset_name) > MAX_NAME_LENGTH:
+        raise ValueError(f'Title longer than {MAX_NAME_LENGTH} characters')
+    if NON_BMP.search(asset_name):
+        raise ValueError('Title contains characters the catalog can\'t store (emoji or other 4-byte UTF-8)')
+    return (asset_name, parse_price(cell('real')), parse_yen(cell('ienes')),
+            parse_flag(cell('black')), parse_flag(cell('private')))
+
+
+def _storable(text):
+    """text with 4-byte UTF-8 characters replaced, for the utf8mb3 reject columns"""
+    return NON_BMP.sub('\ufffd', text)
+
+
+def _raw(values):
+    return _storable(' | '.join(_text(value) for value in values))[:MAX_RAW_LENGTH]
+
+
+# -- loading ------------------------------------------------------------------
+
+def _set_status(cursor, import_id, status, **counts):
+    assignments = ['status = %s'] + [f'{field} = %s' for field in counts]
+    if status in ('done', 'failed'):
+        assignments.append('finished_at = CURRENT_TIMESTAMP')
+    cursor.execute(f"UPDATE asset_imports SET {', '.join(assignments)} WHERE import_id = %s",
+                   [status, *counts.values(), import_id])
+
+
+def create_import(conn, filename, admin_id=None):
+    """Register a queued import and return its id"""
+    import_id = uuid.uuid4().hex
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO asset_imports (import_id, filename, admin_id) VALUES (%s, %s, %s)
+        """, (import_id, _storable(filename or '')[:255], admin_id))
+        conn.commit()
+    finally:
+        cursor.close()
+    return import_id
+
+
+def _flush(cursor, import_id, staged, rejected):
+    if staged:
+        cursor.executemany("""
+            INSERT INTO asset_import_staging (import_id, line_no, asset_name, `real`, ienes, black, private)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [(import_id, *row) for row in staged])
+    if rejected:
+        cursor.executemany("""
+            INSERT INTO asset_import_rejects (import_id, line_no, reason, raw_value)
+            VALUES (%s, %s, %s, %s)
+        """, [(import_id, *row) for row in rejected])
+
+
+def run_import(conn, import_id, path, filename, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Stage and load one file. Returns the final counts as a dict.
+
+    progress, if given, is called with the counts after every chunk.
+    """
+    cursor = conn.cursor()
+    counts = {'rows_read': 0, 'rows_staged': 0, 'rows_rejected': 0, 'rows_inserted': 0}
+    try:
+        _set_status(cursor, import_id, 'staging')
+        conn.commit()
+
+        rows = iter(read_rows(path, filename))
+        indexes = column_indexes(next(rows, None) or [])
+
+        staged, rejected = [], []
+        for line_no, values in enumerate(rows, start=2):
+            if not any(_text(value) for value in values):
+                continue  # blank line
+            counts['rows_read'] += 1
+            try:
+                staged.append((line_no, *parse_row(values, indexes)))
+            except ValueError as e:
+                rejected.append((line_no, _storable(str(e))[:255], _raw(values)))
+
+            if len(staged) + len(rejected) >= chunk_size:
+                _flush(cursor, import_id, staged, rejected)
+                counts['rows_staged'] += len(staged)
+                counts['rows_rejected'] += len(rejected)
+                staged, rejected = [], []
+                _set_status(cursor, import_id, 'staging', **counts)
+                conn.commit()
+                if progress:
+                    progress(dict(counts))
+
+        _flush(cursor, import_id, staged, rejected)
+        counts['rows_staged'] += len(staged)
+        counts['rows_rejected'] += len(rejected)
+        _set_status(cursor, import_id, 'loading', **counts)
+        conn.commit()
+        if progress:
+            progress(dict(counts))
+
+        conn.start_transaction()
+        # Repeats of an earlier row in the same file: one pass finds each title's
+        # first row, instead of joining every row to all earlier ones
+        cursor.execute("""
+            INSERT INTO asset_import_rejects (import_id, line_no, reason, raw_value)
+            SELECT s.import_id, s.line_no, CONCAT('Duplicate of row ', f.first_line_no), s.asset_name
+            FROM asset_import_staging s
+            JOIN (
+                SELECT asset_name, MIN(line_no) AS first_line_no
+                FROM asset_import_staging
+                WHERE import_id = %s
+                GROUP BY asset_name
+            ) f ON f.asset_name = s.asset_name AND s.line_no > f.first_line_no
+            WHERE s.import_id = %s
+        """, (import_id, import_id))
+        duplicates = cursor.rowcount
+
+        # Titles the catalog already has
+        cursor.execute("""
+            INSERT INTO asset_import_rejects (import_id, line_no, reason, raw_value)
+            SELECT s.import_id, s.line_no, 'Already in catalog', s.asset_name
+            FROM asset_import_staging s
+            LEFT JOIN asset_import_rejects r ON r.import_id = s.import_id AND r.line_no = s.line_no
+            WHERE s.import_id = %s AND r.line_no IS NULL
+              AND EXISTS (SELECT 1 FROM assets a WHERE a.asset_name = s.asset_name)
+        """, (import_id,))
+        existing = cursor.rowcount
+
+        cursor.execute("""
+            INSERT INTO assets (asset_name, `real`, ienes, black, private)
+            SELECT s.asset_name, s.`real`, s.ienes, s.black, s.private
+            FROM asset_import_staging s
+            LEFT JOIN asset_import_rejects r ON r.import_id = s.import_id AND r.line_no = s.line_no
+            WHERE s.import_id = %s AND r.line_no IS NULL
+            ORDER BY s.line_no
+        """, (import_id,))
+        counts['rows_inserted'] = cursor.rowcount
+        if counts['rows_inserted']:
+            bump_table_versions(cursor, ('assets',))
+        counts['rows_rejected'] += duplicates + existing
+
+        cursor.execute("DELETE FROM asset_import_staging WHERE import_id = %s", (import_id,))
+        _set_status(cursor, import_id, 'done', **counts)
+        conn.commit()
+        if progress:
+            progress(dict(counts))
+        return counts
+
+    except Exception as e:
+        try:
+            conn.rollback()
+            cursor.execute("DELETE FROM asset_import_staging WHERE import_id = %s", (import_id,))
+            _set_status(cursor, import_id, 'failed', error=str(e)[:500], **counts)
+            conn.commit()
+        except Exception as cleanup_error:
+            log.error("Could not record failure of asset import %s: %s", import_id, cleanup_error)
+        raise
+    finally:
+        cursor.close()
+
+
+def start_import(connect, import_id, path, filename, on_done=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Run an import on a background thread. The file at path is deleted when
+    the import ends; on_done(counts or None) is called afterwards.
+    """
+    def work():
+        counts = None
+        conn = None
+        try:
+            conn = connect()
+            counts = run_import(conn, import_id, path, filename, chunk_size)
+        except Exception as e:
+            log.exception("Asset import %s failed: %s", import_id, e)
+        finally:
+            if conn:
+                conn.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            if on_done:
+                on_done(counts)
+
+    thread = threading.Thread(target=work, name=f'asset-import-{import_id[:8]}', daemon=True)
+    thread.start()
+    return thread
+
+
+def import_status(cursor, import_id, reject_limit=100, reject_offset=0):
+    """Progress and a page of rejected rows for an import, or None if unknown"""
+    cursor.execute("""
+        SELECT import_id, filename, status, rows_read, rows_staged, rows_rejected, rows_inserted,
+               error, created_at, finished_at
+        FROM asset_imports WHERE import_id = %s
+    """, (import_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    cursor.execute("""
+        SELECT line_no, reason, raw_value FROM asset_import_rejects
+        WHERE import_id = %s
+        ORDER BY line_no
+        LIMIT %s OFFSET %s
+    """, (import_id, reject_limit, reject_offset))
+    rejects = [{'row': line_no, 'reason': reason, 'value': raw_value}
+               for line_no, reason, raw_value in cursor.fetchall()]
+
+    return {
+        'import_id': row[0],
+        'filename': row[1],
+        'status': row[2],
+        'rows_read': row[3],
+        'rows_staged': row[4],
+        'rows_rejected': row[5],
+        'rows_inserted': row[6],
+        'error': row[7],
+        'created_at': row[8].isoformat() if row[8] else None,
+        'finished_at': row[9].isoformat() if row[9] else None,
+        'rejects': rejects,
+    }
@@ -0,0 +1,174 @@
+# balances.py
+"""
+Materialized customer balances.
+
+customer_balances holds one row per customer with the running totals of the
+customer_accounts ledger and the description of the latest transaction. The
+routes that write the ledger update it in the same transaction, so reading a
+balance is a primary-key lookup however long the ledger gets.
+
+Migration 0004 creates the table and fills it. rebuild_customer_balances()
+and verify_customer_balances() back the `flask --app app balances
+rebuild|verify` commands.
+"""
+
+CREATE_CUSTOMER_BALANCES_SQL = """
+    CREATE TABLE IF NOT EXISTS customer_balances (
+        customer_id INT UNSIGNED NOT NULL,
+        total_debt DECIMAL(12,2) NOT NULL DEFAULT 0,
+        total_payments DECIMAL(12,2) NOT NULL DEFAULT 0,
+        total_credits DECIMAL(12,2) NOT NULL DEFAULT 0,
+        balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+        transaction_count INT NOT NULL DEFAULT 0,
+        last_description VARCHAR(255) DEFAULT NULL,
+        last_transaction_date DATE DEFAULT NULL,
+        updated_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (customer_id),
+        KEY idx_customer_balances_balance (balance),
+        CONSTRAINT customer_balances_ibfk_1 FOREIGN KEY (customer_id)
+            REFERENCES customers (customer_id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3
+"""
+
+# Same aggregates as the ledger itself; used by rebuild and verify
+LEDGER_TOTALS_SQL = """
+    SELECT ca.customer_id,
+        COALESCE(SUM(CASE WHEN ca.transaction_type = 'debit' THEN ca.amount ELSE 0 END), 0) AS total_debt,
+        COALESCE(SUM(CASE WHEN ca.transaction_type = 'payment' THEN ca.amount ELSE 0 END), 0) AS total_payments,
+        COALESCE(SUM(CASE WHEN ca.transaction_type = 'credit' THEN ca.amount ELSE 0 END), 0) AS total_credits,
+        COALESCE(SUM(CASE WHEN ca.transaction_type = 'debit' THEN ca.amount ELSE -ca.amount END), 0) AS balance,
+        COUNT(*) AS transaction_count,
+        (SELECT ca2.description FROM customer_accounts ca2
+            WHERE ca2.customer_id = ca.customer_id
+            ORDER BY ca2.transaction_date DESC, ca2.created_at DESC, ca2.account_id DESC
+            LIMIT 1) AS last_description,
+        MAX(ca.transaction_date) AS last_transaction_date
+    FROM customer_accounts ca
+    GROUP BY ca.customer_id
+"""
+
+BALANCE_FIELDS = ('total_debt', 'total_payments', 'total_credits', 'balance',
+                  'transaction_count', 'last_description', 'last_transaction_date')
+
+
+def _deltas(transaction_type, amount):
+    """(debt, payments, credits, balance) change for one ledger row"""
+    if transaction_type == 'debit':
+        return amount, 0, 0, amount
+    if transaction_type == 'payment':
+        return 0, amount, 0, -amount
+    if transaction_type == 'credit':
+        return 0, 0, amount, -amount
+    raise ValueError(f'Unknown transaction type: {transaction_type}')
+
+
+def record_transaction(cursor, customer_id, transaction_type, amount, description, transaction_date):
+    """
+    Apply a newly inserted ledger row to the customer's balance.
+
+    Must run in the same transaction as the customer_accounts INSERT. The new
+    row becomes the "last transaction" unless it is back-dated before the
+    current last one (assignments run left to right, so last_description is
+    compared against the old last_transaction_date).
+    """
+    debt, payments, credits, balance = _deltas(transaction_type, amount)
+    cursor.execute("""
+        INSERT INTO customer_balances (customer_id, total_debt, total_payments, total_credits,
+                                       balance, transaction_count, last_description, last_transaction_date)
+        VALUES (%s, %s, %s, %s, %s, 1, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_debt = total_debt + VALUES(total_debt),
+            total_payments = total_payments + VALUES(total_payments),
+            total_credits = total_credits + VALUES(total_credits),
+            balance = balance + VALUES(balance),
+            transaction_count = transaction_count + 1,
+            last_description = IF(last_transaction_date IS NULL
+                                  OR VALUES(last_transaction_date) >= last_transaction_date,
+                                  VALUES(last_description), last_description),
+            last_transaction_date = GREATEST(COALESCE(last_transaction_date, VALUES(last_transaction_date)),
+                                             VALUES(last_transaction_date))
+    """, (customer_id, debt, payments, credits, balance, description, transaction_date))
+
+
+def remove_transaction(cursor, customer_id, transaction_type, amount):
+    """
+    Take a deleted ledger row back out of the customer's balance.
+
+    Must run in the same transaction as the customer_accounts DELETE.
+    """
+    debt, payments, credits, balance = _deltas(transaction_type, amount)
+    cursor.execute("""
+        UPDATE customer_balances
+        SET total_debt = total_debt - %s,
+            total_payments = total_payments - %s,
+            total_credits = total_credits - %s,
+            balance = balance - %s,
+            transaction_count = transaction_count - 1
+        WHERE customer_id = %s
+    """, (debt, payments, credits, balance, customer_id))
+
+    # The deleted row may have been the latest one; one indexed LIMIT 1 lookup
+    cursor.execute("""
+        SELECT description, transaction_date FROM customer_accounts
+        WHERE customer_id = %s
+        ORDER BY transaction_date DESC, created_at DESC, account_id DESC
+        LIMIT 1
+    """, (customer_id,))
+    last = cursor.fetchone()
+    cursor.execute("""
+        UPDATE customer_balances
+        SET last_description = %s, last_transaction_date = %s
+        WHERE customer_id = %s
+    """, (last[0] if last else None, last[1] if last else None, customer_id))
+
+
+def fill_customer_balances(cursor):
+    """Replace every balance with the ledger totals. Returns the number of customers."""
+    cursor.execute("DELETE FROM customer_balances")
+    cursor.execute(f"""
+        INSERT INTO customer_balances (customer_id, {', '.join(BALANCE_FIELDS)})
+        {LEDGER_TOTALS_SQL}
+    """)
+    return cursor.rowcount
+
+
+def rebuild_customer_balances(conn):
+    """Recompute every balance from the ledger. Returns the number of customers."""
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        rebuilt = fill_customer_balances(cursor)
+        conn.commit()
+        return rebuilt
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def verify_customer_balances(conn):
+    """
+    Compare customer_balances with the ledger.
+
+    Returns a list of (customer_id, field, expected, stored) for every difference.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(LEDGER_TOTALS_SQL)
+        expected = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        cursor.execute(f"SELECT customer_id, {', '.join(BALANCE_FIELDS)} FROM customer_balances")
+        stored = {row[0]: row[1:] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+    empty = (0, 0, 0, 0, 0, None, None)
+    mismatches = []
+    for customer_id in sorted(set(expected) | set(stored)):
+        want = expected.get(customer_id, empty)
+        have = stored.get(customer_id, empty)
+        for field, want_value, have_value in zip(BALANCE_FIELDS, want, have):
+            if want_value != have_value:
+                mismatches.append((customer_id, field, want_value, have_value))
+    return mismatches
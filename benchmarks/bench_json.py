@@ -0,0 +1,78 @@
+# benchmarks/bench_json.py
+"""
+Encoding cost of API list responses: the stdlib encoder with per-row
+.isoformat() (what jsonify did before FastJSONProvider) against the provider
+(orjson when installed), for dict rows and the ?shape=columnar format.
+
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --rows 20000 --repeat 7
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_provider  # noqa: E402
+from bench_row_mapper import make_rows  # noqa: E402
+from row_mapper import RowMapper, MONEY, ISO  # noqa: E402
+
+# /api/orders shape, with dates left to the encoder (as app.API_ORDER_ROW)
+ORDER_ROW = RowMapper(
+    'order_id', 'customer_id', 'asset_code', 'customer_name', 'asset_name', 'order_date',
+    ('order_real', MONEY), 'order_ien', ('frete_brasil', MONEY), ('frete_jp', MONEY),
+    ('total_value', MONEY), 'delivery_date', 'payment_type', 'created_at'
+)
+
+# The same with .isoformat() per row, as the routes did for the stdlib encoder
+ORDER_ROW_ISO = RowMapper(
+    'order_id', 'customer_id', 'asset_code', 'customer_name', 'asset_name', ('order_date', ISO),
+    ('order_real', MONEY), 'order_ien', ('frete_brasil', MONEY), ('frete_jp', MONEY),
+    ('total_value', MONEY), ('delivery_date', ISO), 'payment_type', ('created_at', ISO)
+)
+
+
+class _Provider(json_provider.FastJSONProvider):
+    def __init__(self):  # no Flask app needed for dumps_bytes()
+        pass
+
+
+def stdlib_response(rows):
+    # Flask's DefaultJSONProvider outside debug mode: sorted keys, compact separators
+    return json.dumps({'success': True, 'orders': ORDER_ROW_ISO.map_all(rows)},
+                      sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, action='append',
+                        help='list size (repeatable; default 2600 and 20000)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case; the best is reported')
+    args = parser.parse_args()
+
+    provider = _Provider()
+    print(f'provider backend: {provider.backend}')
+
+    cases = (
+        ('stdlib + isoformat per row', stdlib_response),
+        ('provider, dict rows', lambda rows: provider.dumps_bytes(
+            {'success': True, 'orders': ORDER_ROW.map_all(rows)})),
+        ('provider, columnar', lambda rows: provider.dumps_bytes(
+            {'success': True, 'orders': {'columns': ORDER_ROW.names, 'rows': ORDER_ROW.map_lists(rows)}})),
+    )
+
+    for count in args.rows or (2600, 20000):
+        rows = make_rows(count)
+        print(f'{count} rows (best of {args.repeat}):')
+        baseline = None
+        for label, func in cases:
+            best = min(timeit.repeat(lambda: func(rows), number=1, repeat=args.repeat))
+            size = len(func(rows))
+            baseline = baseline or best
+            print(f'  {label:<28} {best * 1000:8.2f} ms  {size / 1024:8.0f} KiB  {baseline / best:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
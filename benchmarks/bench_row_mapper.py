@@ -0,0 +1,120 @@
+# benchmarks/bench_row_mapper.py
+"""
+Per-row conversion cost: hand-built dicts with safe_decimal_to_float()
+(what the list routes used to do) against the compiled RowMapper.
+
+Rows are synthetic tuples shaped like the /orders query (ints, strings,
+dates, Decimal money columns with some NULLs), so only the Python side is
+measured - no database needed.
+
+    python benchmarks/bench_row_mapper.py                 # 10k and 100k rows
+    python benchmarks/bench_row_mapper.py --rows 50000 --repeat 7
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from row_mapper import RowMapper, MONEY, ISO  # noqa: E402
+
+
+def safe_decimal_to_float(value):
+    """Copy of app.safe_decimal_to_float, so the benchmark does not import the Flask app"""
+    if value is None:
+        return 0.0
+    if isinstance(value, Decimal):
+        return float(value)
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def make_rows(count, seed=1):
+    """Rows in the column order of the /orders and /api/orders queries"""
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    rows = []
+    for order_id in range(1, count + 1):
+        order_date = start + timedelta(days=rng.randrange(2000))
+        delivered = rng.random() < 0.7
+        rows.append((
+            order_id,
+            rng.randrange(1, 500),
+            rng.randrange(1, 5000) if rng.random() < 0.8 else None,
+            f'Customer {rng.randrange(500)}',
+            f'Book {rng.randrange(5000)}',
+            order_date,
+            Decimal(rng.randrange(1000, 20000)) / 100,
+            rng.randrange(500, 9000),
+            Decimal(rng.randrange(0, 3000)) / 100 if rng.random() < 0.9 else None,
+            Decimal(rng.randrange(0, 1500)) if rng.random() < 0.9 else None,
+            Decimal(rng.randrange(1000, 20000)),
+            order_date + timedelta(days=14) if delivered else None,
+            rng.choice(('cash', 'transfer', 'paypay', '')),
+            datetime(order_date.year, order_date.month, order_date.day, 12, 0),
+        ))
+    return rows
+
+
+def legacy_api_orders(rows):
+    orders = []
+    for row in rows:
+        orders.append({
+            'order_id': row[0],
+            'customer_id': row[1],
+            'asset_code': row[2],
+            'customer_name': row[3],
+            'asset_name': row[4],
+            'order_date': row[5].isoformat() if row[5] else None,
+            'order_real': safe_decimal_to_float(row[6]),
+            'order_ien': row[7],
+            'frete_brasil': safe_decimal_to_float(row[8]),
+            'frete_jp': safe_decimal_to_float(row[9]),
+            'total_value': safe_decimal_to_float(row[10]),
+            'delivery_date': row[11].isoformat() if row[11] else None,
+            'payment_type': row[12],
+            'created_at': row[13].isoformat() if row[13] else None
+        })
+    return orders
+
+
+# Same shape as app.API_ORDER_ROW
+API_ORDER_ROW = RowMapper(
+    'order_id', 'customer_id', 'asset_code', 'customer_name', 'asset_name', ('order_date', ISO),
+    ('order_real', MONEY), 'order_ien', ('frete_brasil', MONEY), ('frete_jp', MONEY),
+    ('total_value', MONEY), ('delivery_date', ISO), 'payment_type', ('created_at', ISO)
+)
+
+
+def bench(label, func, rows, repeat):
+    best = min(timeit.repeat(lambda: func(rows), number=1, repeat=repeat))
+    per_row_ns = best / len(rows) * 1e9
+    print(f'  {label:<28} {best * 1000:9.2f} ms  {per_row_ns:8.0f} ns/row')
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, action='append',
+                        help='result set size (repeatable; default 10000 and 100000)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case; the best is reported')
+    args = parser.parse_args()
+
+    for count in args.rows or (10000, 100000):
+        rows = make_rows(count)
+        assert legacy_api_orders(rows[:100]) == API_ORDER_ROW.map_all(rows[:100])
+
+        print(f'{count} rows (best of {args.repeat}):')
+        legacy = bench('dict per row + safe_decimal', legacy_api_orders, rows, args.repeat)
+        mapped = bench('RowMapper.map_all', API_ORDER_ROW.map_all, rows, args.repeat)
+        print(f'  speedup: {legacy / mapped:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+# benchmarks/generate_data.py
+"""
+Build a scaled-up copy of the clubinho schema filled with synthetic data, for
+load tests (benchmarks/load_test.py) against a local MySQL.
+
+The tables are created from the CREATE TABLE statements in the committed dump
+(db_backup_20251128_144211.sql), so the benchmark database has the same
+columns, indexes and foreign keys as production. Rows are seeded random data
+shaped like the real ones: a few customers place most of the orders, order
+dates run up to today (so the dashboard's "last 7 days" windows are not
+empty), orders of the last few weeks are often still waiting for delivery,
+and the ledger mixes debits for orders with payments and credits. Afterwards the
+migrations are applied, which create and fill the derived tables
+(customer_balances, sales_rollup), as on a live install.
+
+    python benchmarks/generate_data.py                        # clubinho_bench, 10k customers,
+                                                              # 100k orders, 1M ledger rows
+    python benchmarks/generate_data.py --database bench_small --orders 10000 --ledger 50000
+
+Connection settings come from DB_HOST / DB_USER / DB_PASS like the app's. The
+target database is dropped and recreated table by table; refusing to touch
+the app's own DB_NAME unless --force is given.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_migrations import migrate  # noqa: E402
+
+DUMP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'db_backup_20251128_144211.sql')
+
+# Created from the dump, in foreign key order
+SCHEMA_TABLES = ('login', 'customers', 'assets', 'orders', 'quotes', 'customer_accounts', 'calculations')
+# Created by the migrations (or older app versions); dropped so they are rebuilt from the new data
+DERIVED_TABLES = ('customer_balances', 'sales_rollup', 'table_versions', 'schema_migrations',
+                  'asset_import_rejects', 'asset_import_staging', 'asset_imports')
+
+_CREATE_RE = re.compile(r'CREATE TABLE `(\w+)` \(.*?\) ENGINE=[^;]*;', re.S)
+_AUTO_INCREMENT_RE = re.compile(r' AUTO_INCREMENT=\d+')
+
+FIRST_NAMES = ('Ana', 'Bruno', 'Carla', 'Daniel', 'Eduardo', 'Fernanda', 'Gabriel', 'Helena', 'Igor',
+               'Juliana', 'Kenji', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Renato', 'Sakura',
+               'Thiago', 'Vitória', 'Yuki', 'João', 'Márcia', 'Hiroshi', 'Akemi', '健太', '由美')
+LAST_NAMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Pereira', 'Costa', 'Rodrigues', 'Almeida',
+              'Nakamura', 'Tanaka', 'Suzuki', 'Watanabe', 'Yamamoto', 'Ferreira', 'Gonçalves', 'Araújo',
+              'Ribeiro', 'Kobayashi', 'Sato', 'Ito', '佐藤', '鈴木')
+TITLE_WORDS = ('Dragon', 'Ball', 'One', 'Piece', 'Naruto', 'Sakura', 'Card', 'Captor', 'Hunter', 'Slam',
+               'Dunk', 'Attack', 'Titan', 'Death', 'Note', 'Chainsaw', 'Man', 'Spy', 'Family', 'Jujutsu',
+               'Kaisen', 'Blue', 'Lock', 'Frieren', 'Haikyu', 'Mob', 'Psycho', 'Kingdom', 'Vagabond',
+               'Berserk', 'ドラゴン', '進撃', '鬼滅', '呪術')
+EDITIONS = ('', ' - Edição Especial', ' (Kanzenban)', ' Box', ' - Capa Variante')
+PAYMENT_TYPES = ('cash', 'transfer', 'paypay', 'pix', '')
+DELIVERY_TIMES = ('Manhã', 'Tarde', 'Noite', 'Qualquer horário', None)
+QUOTE_STATUSES = ('pending', 'approved', 'rejected')
+
+
+def schema_statements(path=DUMP_PATH, tables=SCHEMA_TABLES):
+    """CREATE TABLE statements for tables from the dump, without AUTO_INCREMENT offsets"""
+    with open(path, encoding='utf-8') as f:
+        dump = f.read()
+    found = {match.group(1): _AUTO_INCREMENT_RE.sub('', match.group(0).rstrip(';'))
+             for match in _CREATE_RE.finditer(dump)}
+    missing = [table for table in tables if table not in found]
+    if missing:
+        raise SystemExit(f"{path} has no CREATE TABLE for {', '.join(missing)}")
+    return [(table, found[table]) for table in tables]
+
+
+def skewed_id(rng, count, skew):
+    """1..count, low ids far more likely (a few customers/books get most orders)"""
+    return min(int(count * rng.random() ** skew) + 1, count)
+
+
+def customer_rows(rng, count):
+    rows = []
+    for customer_id in range(1, count + 1):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {customer_id:05d}'
+        rows.append((customer_id, name,
+                     f'{rng.randrange(1, 40)}-{rng.randrange(1, 30)}-{rng.randrange(1, 20)} '
+                     f'{rng.choice(("Hamamatsu", "Toyohashi", "Oizumi", "Nagoya", "Suzuka"))}',
+                     f'0{rng.randrange(70, 91)}-{rng.randrange(1000, 9999)}-{rng.randrange(1000, 9999)}',
+                     rng.choice(DELIVERY_TIMES)))
+    return rows
+
+
+def asset_rows(rng, count):
+    rows = []
+    for asset_code in range(1, count + 1):
+        words = ' '.join(rng.sample(TITLE_WORDS, rng.randrange(1, 4)))
+        name = f'{words} Vol. {rng.randrange(1, 60)}{rng.choice(EDITIONS)} #{asset_code}'
+        ienes = rng.randrange(400, 3000)
+        rows.append((asset_code, name, round(ienes / 28.0 * 1.3, 2), ienes,
+                     int(rng.random() < 0.05), int(rng.random() < 0.02)))
+    return rows
+
+
+def order_rows(rng, count, customers, assets, today, days, order_customers):
+    """Orders; appends each order's customer_id to order_customers for the ledger"""
+    for order_id in range(1, count + 1):
+        customer_id = skewed_id(rng, len(customers), 3)
+        asset_code = skewed_id(rng, len(assets), 2) if rng.random() < 0.9 else None
+        # Dates run oldest to newest with the order ids, like real inserts
+        order_date = today - timedelta(days=int(days * (1 - order_id / count)))
+        order_ien = rng.randrange(400, 3000)
+        order_real = round(order_ien / 28.0 * 1.3, 2)
+        frete_brasil = round(rng.uniform(5, 40), 2) if rng.random() < 0.9 else None
+        frete_jp = rng.randrange(0, 1500) if rng.random() < 0.9 else None
+        if ((today - order_date).days < 21 and rng.random() < 0.5) or rng.random() < 0.02:
+            delivery_date = None
+        else:
+            delivery_date = min(order_date + timedelta(days=rng.randrange(3, 30)), today)
+        created_at = datetime.combine(order_date, datetime.min.time()) + timedelta(
+            seconds=rng.randrange(8 * 3600, 22 * 3600))
+        order_customers.append(customer_id)
+        yield (order_id, customer_id, asset_code, customers[customer_id - 1],
+               assets[asset_code - 1] if asset_code else f'Avulso {rng.randrange(10000)}',
+               order_date, order_real, order_ien, frete_brasil, frete_jp,
+               round(order_ien + (frete_jp or 0), 2), delivery_date, rng.choice(PAYMENT_TYPES),
+               created_at, created_at)
+
+
+def quote_rows(rng, count, customers, assets, now, admin_id):
+    for _ in range(count):
+        book_price = rng.randrange(400, 3000)
+        profit_percent = rng.choice((20, 25, 30, 35))
+        shipping_cost = rng.randrange(100, 800)
+        rate = round(rng.uniform(26, 30), 4)
+        profit = round(book_price * profit_percent / 100, 2)
+        total_jpy = int(book_price + profit + shipping_cost)
+        created_at = now - timedelta(seconds=rng.randrange(90 * 86400))
+        status = rng.choices(QUOTE_STATUSES, weights=(3, 6, 1))[0]
+        yield (customers[skewed_id(rng, len(customers), 3) - 1],
+               assets[skewed_id(rng, len(assets), 2) - 1], book_price, profit_percent, profit,
+               shipping_cost, 0, round(total_jpy / rate, 2), total_jpy, rate, 'benchmark',
+               status, admin_id, created_at, created_at)
+
+
+def ledger_rows(rng, count, customers, order_customers, today, days, admin_id):
+    order_count = len(order_customers)
+    for _ in range(count):
+        kind = rng.choices(('debit', 'payment', 'credit'), weights=(5, 4, 1))[0]
+        order_id = None
+        if kind == 'debit' and order_count and rng.random() < 0.6:
+            order_id = rng.randrange(1, order_count + 1)
+            customer_id = order_customers[order_id - 1]
+        else:
+            customer_id = skewed_id(rng, len(customers), 3)
+        amount = round(rng.uniform(10, 400), 2)
+        transaction_date = today - timedelta(days=rng.randrange(days))
+        description = f'Pedido #{order_id}' if order_id else {
+            'debit': 'Compra avulsa', 'payment': 'Pagamento', 'credit': 'Crédito'}[kind]
+        yield (customer_id, customers[customer_id - 1], kind, amount, description, order_id,
+               transaction_date, admin_id)
+
+
+def calculation_rows(rng, count, customers, assets, now, admin_id):
+    for _ in range(count):
+        book_price = rng.randrange(400, 3000)
+        rate = round(rng.uniform(26, 30), 4)
+        total_jpy = int(book_price * 1.3 + 300)
+        yield (customers[skewed_id(rng, len(customers), 3) - 1], assets[rng.randrange(len(assets))],
+               book_price, 30, round(book_price * 0.3, 2), 300, 0, round(total_jpy / rate, 2),
+               total_jpy, rate, 'benchmark', admin_id, now - timedelta(seconds=rng.randrange(90 * 86400)))
+
+
+def insert_rows(conn, table, columns, rows, batch_size, total):
+    """executemany in batches of batch_size (one multi-row INSERT each), committing per batch"""
+    column_list = ', '.join(f'`{column}`' for column in columns)
+    sql = f"INSERT INTO `{table}` ({column_list}) VALUES ({', '.join(['%s'] * len(columns))})"
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    inserted = 0
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                conn.commit()
+                inserted += len(batch)
+                batch = []
+                print(f'\r  {table}: {inserted}/{total}', end='', flush=True)
+        if batch:
+            cursor.executemany(sql, batch)
+            conn.commit()
+            inserted += len(batch)
+    finally:
+        cursor.close()
+    elapsed = time.perf_counter() - started
+    print(f'\r  {table}: {inserted} rows in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):,.0f} rows/s)')
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default=os.getenv('DB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default=os.getenv('DB_USER', 'root'))
+    parser.add_argument('--password', default=os.getenv('DB_PASS', 'secret'))
+    parser.add_argument('--database', default='clubinho_bench', help='database to (re)create')
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--assets', type=int, default=20000, help='books')
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--quotes', type=int, default=20000)
+    parser.add_argument('--ledger', type=int, default=1000000, help='customer_accounts rows')
+    parser.add_argument('--calculations', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=5 * 365, help='history length ending today')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per INSERT')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--admin-login', default='bench', help='admin user the load test logs in as')
+    parser.add_argument('--admin-password', default='bench')
+    parser.add_argument('--force', action='store_true',
+                        help="allow recreating the app's own database (DB_NAME)")
+    args = parser.parse_args()
+
+    if args.database == os.getenv('DB_NAME', 'clubinho') and not args.force:
+        raise SystemExit(f'Refusing to recreate the tables of {args.database}, the app database '
+                         f'(DB_NAME); pick another --database or pass --force')
+    if min(args.customers, args.assets) < 1:
+        raise SystemExit('--customers and --assets must be at least 1')
+
+    statements = schema_statements()
+    conn = mysql.connector.connect(host=args.host, port=args.port, user=args.user,
+                                   password=args.password, charset='utf8mb4', autocommit=False)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}` "
+                       f"DEFAULT CHARACTER SET utf8mb4")
+        cursor.execute(f"USE `{args.database}`")
+        # Bulk load: checks are off for this session only
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        cursor.execute("SET UNIQUE_CHECKS = 0")
+        for table in DERIVED_TABLES + tuple(reversed(SCHEMA_TABLES)):
+            cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+        for table, create_sql in statements:
+            cursor.execute(create_sql)
+        cursor.execute("INSERT INTO login (id, login, password) VALUES (1, %s, %s)",
+                       (args.admin_login, generate_password_hash(args.admin_password, method='pbkdf2:sha256')))
+        conn.commit()
+        cursor.close()
+        admin_id = 1
+
+        rng = random.Random(args.seed)
+        today = date.today()
+        now = datetime.now().replace(microsecond=0)
+        print(f'Loading {args.database} (seed {args.seed}):')
+
+        rows = customer_rows(rng, args.customers)
+        customers = [row[1] for row in rows]
+        insert_rows(conn, 'customers', ('customer_id', 'customer_name', 'customer_address',
+                                        'customer_telephone', 'customer_delivery_time_request'),
+                    rows, args.batch_size, args.customers)
+        rows = asset_rows(rng, args.assets)
+        assets = [row[1] for row in rows]
+        insert_rows(conn, 'assets', ('asset_code', 'asset_name', 'real', 'ienes', 'black', 'private'),
+                    rows, args.batch_size, args.assets)
+        order_customers = []
+        insert_rows(conn, 'orders', ('order_id', 'customer_id', 'asset_code', 'customer_name', 'asset_name',
+                                     'order_date', 'order_real', 'order_ien', 'frete_brasil', 'frete_jp',
+                                     'total_value', 'delivery_date', 'payment_type', 'created_at', 'updated_at'),
+                    order_rows(rng, args.orders, customers, assets, today, args.days, order_customers),
+                    args.batch_size, args.orders)
+        insert_rows(conn, 'quotes', ('customer_name', 'book_title', 'book_price', 'profit_percent', 'profit',
+                                     'shipping_cost', 'shipping_adjustment_jpy', 'total_brl', 'total_jpy',
+                                     'exchange_rate', 'rate_source', 'status', 'admin_id', 'created_at',
+                                     'updated_at'),
+                    quote_rows(rng, args.quotes, customers, assets, now, admin_id),
+                    args.batch_size, args.quotes)
+        insert_rows(conn, 'customer_accounts', ('customer_id', 'customer_name', 'transaction_type', 'amount',
+                                                'description', 'order_id', 'transaction_date', 'admin_id'),
+                    ledger_rows(rng, args.ledger, customers, order_customers, today, args.days, admin_id),
+                    args.batch_size, args.ledger)
+        insert_rows(conn, 'calculations', ('customer_name', 'book_title', 'book_price', 'profit_percent',
+                                           'profit', 'shipping_cost', 'shipping_adjustment_jpy', 'total_brl',
+                                           'total_jpy', 'exchange_rate', 'rate_source', 'admin_id',
+                                           'created_at'),
+                    calculation_rows(rng, args.calculations, customers, assets, now, admin_id),
+                    args.batch_size, args.calculations)
+
+        cursor = conn.cursor()
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+        cursor.execute("SET UNIQUE_CHECKS = 1")
+        conn.commit()
+        print('Applying migrations (they also fill the derived tables):')
+        applied = migrate(conn, echo=lambda text: print(f'  {text}'))
+        print(f'  {len(applied)} migrations applied')
+        for table in SCHEMA_TABLES:
+            cursor.execute(f"ANALYZE TABLE `{table}`")
+            cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+
+    print(f'Done. Run the app against it with DB_NAME={args.database} and log in as '
+          f'{args.admin_login}/{args.admin_password}')
+
+
+if __name__ == '__main__':
+    main()
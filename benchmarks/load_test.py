@@ -0,0 +1,474 @@
+# benchmarks/load_test.py
+"""
+Scripted HTTP load against a running app: per-route throughput and latency
+percentiles, saved as JSON and compared with a baseline run.
+
+Each worker thread logs in with its own session and loops over a weighted mix
+of scenarios (dashboard, order list pages and customer filters, reports,
+calculator, save-quote followed by approve, typeahead, customer account) until
+--duration is up. Requests in the first --warmup seconds are not recorded.
+A request counts as an error if it fails, answers with a non-2xx status, or
+is JSON with success: false. Percentiles are exact (every latency is kept).
+
+The server's own view is saved alongside: query statistics per endpoint from
+/admin/query-stats (reset before the run) and the latency estimates from
+/admin/request-stats.
+
+Point it at a copy filled by benchmarks/generate_data.py - the quote
+scenario creates quotes and approves them into orders:
+
+    DB_NAME=clubinho_bench flask --app app run --port 5000
+    python benchmarks/load_test.py --duration 60 --concurrency 8 --output before.json
+    ... change something, restart the app ...
+    python benchmarks/load_test.py --duration 60 --concurrency 8 --output after.json --baseline before.json
+    python benchmarks/load_test.py --report after.json --baseline before.json   # compare saved runs
+
+With --baseline the exit status is 1 when a route regressed: p50 or p95 up, or
+throughput down, by more than --threshold (and by at least --min-delta-ms for
+latencies), more errors, or more SQL statements per request.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+import requests
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Recorder:
+    """Latencies and errors per route for one worker thread"""
+
+    def __init__(self):
+        self.latencies = {}  # route -> [seconds]
+        self.errors = {}     # route -> count
+        self.statuses = {}   # route -> {status: count}
+        self.recording = False
+
+    def add(self, route, elapsed, status, ok):
+        if not self.recording:
+            return
+        if ok:
+            self.latencies.setdefault(route, []).append(elapsed)
+        else:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        statuses = self.statuses.setdefault(route, {})
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+class Client:
+    """requests.Session logged in as the admin, timing each call into a Recorder"""
+
+    def __init__(self, base_url, login, password, timeout, recorder):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.recorder = recorder
+        self.session = requests.Session()
+        response = self.session.post(f'{self.base_url}/admin/login',
+                                     data={'login': login, 'password': password},
+                                     allow_redirects=False, timeout=timeout)
+        if response.status_code != 302 or not response.headers.get('Location', '').endswith('/dashboard'):
+            raise SystemExit(f'Login as {login} failed (HTTP {response.status_code}); '
+                             f'did generate_data.py create that user?')
+
+    def request(self, route, method, path, **kwargs):
+        """Issue one request, record it under route; returns the response or None"""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.add(route, time.perf_counter() - started, type(e).__name__, False)
+            return None
+        elapsed = time.perf_counter() - started
+        ok = 200 <= response.status_code < 300
+        if ok and response.headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                body = response.json()
+            except ValueError:
+                ok = False
+            else:
+                ok = not (isinstance(body, dict) and body.get('success') is False)
+        self.recorder.add(route, elapsed, response.status_code, ok)
+        return response
+
+    def json(self, path):
+        response = self.session.get(self.base_url + path, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+# -- scenarios ----------------------------------------------------------------
+# Each takes (client, rng, data) and issues one or more requests.
+
+def run_dashboard(client, rng, data):
+    client.request('dashboard', 'GET', '/dashboard')
+
+
+def run_orders_page(client, rng, data):
+    # Mostly the first pages, now and then a deep one
+    page = 1 + int(rng.random() ** 3 * 200)
+    client.request('orders_page', 'GET', '/orders', params={'page': page})
+
+
+def run_orders_filter(client, rng, data):
+    name = rng.choice(data['customers'])
+    client.request('orders_filter', 'GET', '/orders', params={'customer': name[:rng.randrange(3, 12)]})
+
+
+def run_reports(client, rng, data):
+    client.request('reports', 'GET', '/reports')
+
+
+def run_orders_by_status(client, rng, data):
+    client.request('orders_by_status', 'GET', '/api/reports/orders-by-status',
+                   params={'status': rng.choice(('PROCESSING', 'DELIVERED'))})
+
+
+def run_calculate(client, rng, data):
+    client.request('calculate', 'POST', '/api/calculate', json={
+        'book_price': rng.randrange(400, 3000),
+        'shipping_cost': rng.randrange(100, 800),
+        'profit_percent': rng.choice((20, 25, 30, 35)),
+        'customer_name': rng.choice(data['customers']),
+        'book_title': rng.choice(data['books']),
+    })
+
+
+def run_quote_approve(client, rng, data):
+    total_jpy = rng.randrange(800, 5000)
+    response = client.request('save_quote', 'POST', '/api/save-quote', json={
+        'customer_name': rng.choice(data['customers']),
+        'book_title': rng.choice(data['books']),
+        'book_price': total_jpy * 0.7,
+        'profit_percent': 30,
+        'profit': total_jpy * 0.2,
+        'shipping_cost': total_jpy * 0.1,
+        'total_brl': round(total_jpy / 28.0, 2),
+        'total_jpy': total_jpy,
+        'exchange_rate': 28.0,
+        'rate_source': 'load_test',
+    })
+    quote_id = _json_field(response, 'quote_id')
+    if quote_id:
+        client.request('approve_quote', 'POST', f'/api/quotes/{quote_id}/approve')
+
+
+def run_typeahead(client, rng, data):
+    kind = rng.choice(('customers', 'books'))
+    name = rng.choice(data[kind])
+    client.request(f'typeahead_{kind}', 'GET', '/api/typeahead',
+                   params={'type': kind, 'q': name[:rng.randrange(1, 6)]})
+
+
+def run_customer_account(client, rng, data):
+    name = rng.choice(data['customers'])
+    client.request('customer_account', 'GET', f'/customer-account/{quote(name)}')
+
+
+# (name, weight, function, writes)
+SCENARIOS = (
+    ('dashboard', 15, run_dashboard, False),
+    ('orders_page', 20, run_orders_page, False),
+    ('orders_filter', 10, run_orders_filter, False),
+    ('reports', 5, run_reports, False),
+    ('orders_by_status', 5, run_orders_by_status, False),
+    ('calculate', 20, run_calculate, False),
+    ('quote_approve', 5, run_quote_approve, True),
+    ('typeahead', 15, run_typeahead, False),
+    ('customer_account', 5, run_customer_account, False),
+)
+
+
+def _json_field(response, field):
+    if response is None or not response.ok:
+        return None
+    try:
+        return response.json().get(field)
+    except (ValueError, AttributeError):
+        return None
+
+
+# -- running ------------------------------------------------------------------
+
+def worker(args, scenarios, data, seed, ready, clock, recorder, failures):
+    try:
+        client = Client(args.base_url, args.login, args.password, args.timeout, recorder)
+    except BaseException as e:
+        failures.append(e)
+        client = None
+    # Everyone starts together once all workers are logged in
+    ready.wait()
+    if client is None:
+        return
+    rng = random.Random(seed)
+    names = [scenario[0] for scenario in scenarios]
+    weights = [scenario[1] for scenario in scenarios]
+    functions = {scenario[0]: scenario[2] for scenario in scenarios}
+    while True:
+        now = time.perf_counter()
+        if now >= clock['stop']:
+            break
+        recorder.recording = now >= clock['measure']
+        functions[rng.choices(names, weights)[0]](client, rng, data)
+        if args.think_time:
+            time.sleep(rng.uniform(0, 2 * args.think_time))
+
+
+def percentile(values, p):
+    """p-th percentile of sorted values, linearly interpolated between ranks"""
+    if not values:
+        return None
+    rank = (len(values) - 1) * p / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarize(recorders, seconds):
+    routes = {}
+    for recorder in recorders:
+        for route in set(recorder.latencies) | set(recorder.errors):
+            entry = routes.setdefault(route, {'latencies': [], 'errors': 0, 'statuses': {}})
+            entry['latencies'] += recorder.latencies.get(route, [])
+            entry['errors'] += recorder.errors.get(route, 0)
+            for status, count in recorder.statuses.get(route, {}).items():
+                entry['statuses'][str(status)] = entry['statuses'].get(str(status), 0) + count
+
+    summary = {}
+    for route in sorted(routes):
+        entry = routes[route]
+        latencies = sorted(entry['latencies'])
+        total = len(latencies) + entry['errors']
+        row = {
+            'requests': total,
+            'errors': entry['errors'],
+            'error_rate': entry['errors'] / total if total else 0.0,
+            'throughput': len(latencies) / seconds if seconds else 0.0,
+            'mean_ms': sum(latencies) * 1000 / len(latencies) if latencies else None,
+            'min_ms': latencies[0] * 1000 if latencies else None,
+            'max_ms': latencies[-1] * 1000 if latencies else None,
+            'statuses': entry['statuses'],
+        }
+        for p in PERCENTILES:
+            value = percentile(latencies, p)
+            row[f'p{p}_ms'] = None if value is None else value * 1000
+        summary[route] = row
+    return summary
+
+
+def server_stats(client):
+    """Per-endpoint SQL counts and latency estimates from the admin stats routes"""
+    stats = {}
+    try:
+        queries = client.json('/admin/query-stats?format=json')
+        stats['queries'] = {row['endpoint']: {
+            'requests': row['requests'], 'avg_queries': row['avg_queries'], 'max_queries': row['max_queries'],
+            'avg_sql_ms': row['avg_ms'], 'slow': row['slow'], 'n_plus_one': row['n_plus_one'],
+        } for row in queries.get('endpoints', [])}
+    except (requests.RequestException, ValueError, KeyError) as e:
+        stats['queries_error'] = str(e)
+    try:
+        latency = client.json('/admin/request-stats')
+        stats['latency'] = {row['endpoint']: {
+            'requests': row['requests'], 'p50_ms': row['p50_ms'], 'p95_ms': row['p95_ms'],
+            'p99_ms': row['p99_ms'], 'errors': row['errors'],
+        } for row in latency.get('endpoints', [])}
+    except (requests.RequestException, ValueError, KeyError) as e:
+        stats['latency_error'] = str(e)
+    return stats
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    scenarios = [scenario for scenario in SCENARIOS
+                 if (not args.only or scenario[0] in args.only) and not (args.read_only and scenario[3])]
+    if not scenarios:
+        raise SystemExit('No scenarios left to run')
+
+    setup = Client(args.base_url, args.login, args.password, args.timeout, Recorder())
+    data = {
+        'customers': setup.json('/api/customers')['customers'],
+        'books': [asset['name'] for asset in setup.json('/api/assets')['assets']],
+    }
+    if not data['customers'] or not data['books']:
+        raise SystemExit('No customers or books in the database; run benchmarks/generate_data.py first')
+    setup.session.post(f'{setup.base_url}/admin/query-stats/reset', timeout=args.timeout)
+
+    recorders = [Recorder() for _ in range(args.concurrency)]
+    failures = []
+    clock = {}
+
+    def start_clock():
+        clock['measure'] = time.perf_counter() + args.warmup
+        clock['stop'] = clock['measure'] + args.duration
+
+    ready = threading.Barrier(args.concurrency, action=start_clock)
+    threads = [threading.Thread(target=worker, daemon=True,
+                                args=(args, scenarios, data, args.seed * 1000 + number, ready,
+                                      clock, recorder, failures))
+               for number, recorder in enumerate(recorders)]
+    for thread in threads:
+        thread.start()
+    print(f"{args.concurrency} workers, {args.warmup:g}s warmup + {args.duration:g}s against {args.base_url}: "
+          f"{', '.join(scenario[0] for scenario in scenarios)}")
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise SystemExit(f'{len(failures)} workers could not start: {failures[0]}')
+    measured = time.perf_counter() - clock['measure']
+
+    return {
+        'meta': {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'measured_seconds': measured,
+            'warmup': args.warmup,
+            'think_time': args.think_time,
+            'seed': args.seed,
+            'scenarios': [scenario[0] for scenario in scenarios],
+            'python': platform.python_version(),
+            'host': platform.node(),
+        },
+        'routes': summarize(recorders, measured),
+        'server': server_stats(setup),
+    }
+
+
+# -- reporting ----------------------------------------------------------------
+
+def _fmt(value, spec='.1f'):
+    return '-' if value is None else format(value, spec)
+
+
+def print_results(results):
+    meta = results['meta']
+    print(f"\nRevision {meta.get('revision') or '?'}, {meta['concurrency']} workers, "
+          f"{meta['measured_seconds']:.1f}s measured")
+    print(f"{'route':<20} {'req':>7} {'err':>5} {'req/s':>8} {'mean':>8} "
+          + ' '.join(f'{f"p{p}":>8}' for p in PERCENTILES) + f" {'max':>8}  (ms)")
+    for route, row in results['routes'].items():
+        print(f"{route:<20} {row['requests']:>7} {row['errors']:>5} {row['throughput']:>8.1f} "
+              f"{_fmt(row['mean_ms']):>8} "
+              + ' '.join(f"{_fmt(row[f'p{p}_ms']):>8}" for p in PERCENTILES)
+              + f" {_fmt(row['max_ms']):>8}")
+
+    queries = results.get('server', {}).get('queries')
+    if queries:
+        print(f"\n{'endpoint (server)':<32} {'req':>7} {'avg SQL':>8} {'max SQL':>8} {'SQL ms':>8} "
+              f"{'slow':>5} {'N+1':>5}")
+        for endpoint, row in sorted(queries.items()):
+            print(f"{endpoint:<32} {row['requests']:>7} {_fmt(row['avg_queries']):>8} {row['max_queries']:>8} "
+                  f"{_fmt(row['avg_sql_ms'], '.2f'):>8} {row['slow']:>5} {row['n_plus_one']:>5}")
+
+
+def _worse(old, new, threshold, min_delta=0.0):
+    """True if new exceeds old by more than threshold (relative) and min_delta (absolute)"""
+    if old is None or new is None:
+        return False
+    return new - old > min_delta and new > old * (1 + threshold)
+
+
+def compare(baseline, current, threshold, min_delta_ms):
+    """(route, field, old, new, regressed) rows for every route in both runs"""
+    rows = []
+    for route, new in current['routes'].items():
+        old = baseline['routes'].get(route)
+        if old is None:
+            continue
+        for field in ('p50_ms', 'p95_ms', 'p99_ms'):
+            # p99 is reported but too noisy on short runs to fail the build
+            regressed = field != 'p99_ms' and _worse(old[field], new[field], threshold, min_delta_ms)
+            rows.append((route, field, old[field], new[field], regressed))
+        rows.append((route, 'throughput', old['throughput'], new['throughput'],
+                     old['throughput'] > 0 and new['throughput'] < old['throughput'] * (1 - threshold)))
+        rows.append((route, 'error_rate', old['error_rate'], new['error_rate'],
+                     new['error_rate'] > old['error_rate'] + 0.01))
+
+    old_queries = baseline.get('server', {}).get('queries', {})
+    for endpoint, new in current.get('server', {}).get('queries', {}).items():
+        old = old_queries.get(endpoint)
+        if old is None:
+            continue
+        rows.append((f'[sql] {endpoint}', 'avg_queries', old['avg_queries'], new['avg_queries'],
+                     _worse(old['avg_queries'], new['avg_queries'], threshold, 1.0)))
+    return rows
+
+
+def print_comparison(rows, baseline):
+    meta = baseline['meta']
+    print(f"\nAgainst baseline {meta.get('revision') or '?'} ({meta['started']}):")
+    print(f"{'route':<40} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for route, field, old, new, regressed in rows:
+        change = '-' if not old or new is None else f'{(new - old) / old * 100:+.0f}%'
+        print(f"{route:<40} {field:<12} {_fmt(old, '.2f'):>10} {_fmt(new, '.2f'):>10} {change:>8}"
+              f"{'  REGRESSION' if regressed else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--login', default='bench', help='admin login (see generate_data.py)')
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--concurrency', type=int, default=8, help='worker threads')
+    parser.add_argument('--duration', type=float, default=60, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=10, help='seconds before recording starts')
+    parser.add_argument('--think-time', type=float, default=0,
+                        help='mean pause between scenarios per worker, seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='per request, seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', action='append', choices=[scenario[0] for scenario in SCENARIOS],
+                        help='run only this scenario (repeatable)')
+    parser.add_argument('--read-only', action='store_true', help='skip the scenarios that write')
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--report', help='load results from this JSON file instead of running')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative change that counts as a regression (default 0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=5,
+                        help='ignore latency increases smaller than this')
+    args = parser.parse_args()
+
+    if args.report:
+        with open(args.report, encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+    print_results(results)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(baseline, results, args.threshold, args.min_delta_ms)
+        print_comparison(rows, baseline)
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(f'\n{len(regressions)} regressions beyond {args.threshold:.0%}')
+            sys.exit(1)
+        print('\nNo regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# cache.py
+"""
+In-process cache for query results that depend on database tables.
+
+Every entry records which tables it was built from. Write routes call
+invalidate_tables() after committing, which bumps a per-table version and
+drops the dependent entries. A TTL bounds how stale an entry can get when the
+write happened in another worker process.
+
+The cache holds at most max_entries entries; the least recently used one is
+evicted to make room. With max_entry_size, values longer than that (len())
+are returned but not stored, so one huge list can't pin memory. stats()
+reports hits, misses, evictions and invalidations, for sizing the cache and
+checking that it earns its keep.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TableCache:
+    """Thread-safe key/value cache invalidated by table name"""
+
+    def __init__(self, default_ttl=60, max_entries=1000, max_entry_size=None):
+        self.default_ttl = float(default_ttl)
+        self.max_entries = max(int(max_entries), 1)
+        self.max_entry_size = max_entry_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, tables, versions, expires_at), LRU first
+        self._versions = {}  # table -> int
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._oversized = 0
+
+    def _current_versions(self, tables):
+        # Caller holds the lock
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing/expired/invalidated"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            value, tables, versions, expires_at = entry
+            if expires_at <= time.monotonic() or versions != self._current_versions(tables):
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def get_or_load(self, key, tables, loader, ttl=None):
+        """
+        Return the cached value for key, calling loader() on a miss.
+
+        The result is only stored if none of its tables were written to while
+        loader() ran, so a concurrent write can't leave a stale entry behind.
+        """
+        tables = tuple(tables)
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            versions = self._current_versions(tables)
+
+        value = loader()
+
+        ttl = self.default_ttl if ttl is None else float(ttl)
+        with self._lock:
+            if self.max_entry_size is not None and len(value) > self.max_entry_size:
+                self._oversized += 1
+            elif ttl > 0 and versions == self._current_versions(tables):
+                self._entries[key] = (value, tables, versions, time.monotonic() + ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    def invalidate_tables(self, *tables):
+        """Mark tables as written; drops every entry built from any of them"""
+        changed = set(tables)
+        with self._lock:
+            for table in changed:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            stale = [key for key, entry in self._entries.items() if changed.intersection(entry[1])]
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Entry count and hit/miss/eviction counters, for /admin/cache-stats"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else None,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidated_entries': self._invalidations,
+                'oversized': self._oversized,
+            }
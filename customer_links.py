@@ -0,0 +1,115 @@
+# customer_links.py
+"""
+Keeps orders.customer_id pointing at the right customer.
+
+The customer pages join orders to customers by customer_id (an indexed
+integer) rather than by name. Older rows were not always written with a
+usable id: the /orders form used to insert without one, and editing an
+order's customer only changed the name. reconcile_order_customers() repairs
+those rows from orders.customer_name and backs the
+`flask --app app customers reconcile` command.
+
+A name is only trusted when exactly one customer has it; orders whose name
+is missing, unknown or shared by several customers are reported and left
+alone.
+"""
+from table_versions import bump_table_versions
+
+# Customers whose name is unique, i.e. safe to link orders to by name
+UNIQUE_NAMES_SQL = """
+    SELECT customer_name, MIN(customer_id) AS customer_id
+    FROM customers
+    GROUP BY customer_name
+    HAVING COUNT(*) = 1
+"""
+
+LINK_STATUS_SQL = f"""
+    SELECT
+        COALESCE(SUM(cur.customer_id IS NULL AND named.customer_id IS NOT NULL), 0) AS dangling,
+        COALESCE(SUM(cur.customer_id IS NOT NULL AND named.customer_id IS NOT NULL
+                     AND named.customer_id <> o.customer_id), 0) AS mismatched,
+        COALESCE(SUM(cur.customer_id IS NULL AND named.customer_id IS NULL), 0) AS unresolved
+    FROM orders o
+    LEFT JOIN customers cur ON cur.customer_id = o.customer_id
+    LEFT JOIN ({UNIQUE_NAMES_SQL}) AS named ON named.customer_name = o.customer_name
+"""
+
+
+def resolve_customer_id(cursor, customer_name):
+    """customer_id for a name (the oldest customer if several share it), or None"""
+    cursor.execute("""
+        SELECT customer_id FROM customers
+        WHERE customer_name = %s
+        ORDER BY customer_id
+        LIMIT 1
+    """, (customer_name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def get_or_create_customer_id(cursor, customer_name):
+    """customer_id to store on an order, creating the customer if the name is new"""
+    customer_id = resolve_customer_id(cursor, customer_name)
+    if customer_id is None:
+        cursor.execute("""
+            INSERT INTO customers (customer_name, customer_address, customer_telephone, customer_delivery_time_request)
+            VALUES (%s, %s, %s, %s)
+        """, (customer_name, '', '', ''))
+        customer_id = cursor.lastrowid
+        bump_table_versions(cursor, ('customers',))
+    return customer_id
+
+
+def order_link_status(cursor):
+    """
+    Counts of orders needing attention:
+
+    dangling   -- customer_id matches no customer, but the name does
+    mismatched -- customer_id is a real customer, but the name belongs to
+                  another one (usually an order whose customer was changed
+                  by name only)
+    unresolved -- customer_id matches no customer and neither does the name
+    """
+    cursor.execute(LINK_STATUS_SQL)
+    dangling, mismatched, unresolved = cursor.fetchone()
+    return {'dangling': int(dangling), 'mismatched': int(mismatched), 'unresolved': int(unresolved)}
+
+
+def reconcile_order_customers(conn, fix_mismatched=False, dry_run=False):
+    """
+    Point orders at the customer named in orders.customer_name.
+
+    Dangling ids are always repaired. Mismatched ids are only repaired with
+    fix_mismatched, since a customer renamed after the order was placed also
+    looks like a mismatch when another customer now has the old name.
+    Returns (status before, number of orders updated).
+    """
+    cursor = conn.cursor()
+    try:
+        status = order_link_status(cursor)
+        # With autocommit off the status read has opened a transaction;
+        # end it so start_transaction() below does not raise
+        conn.commit()
+        if dry_run:
+            return status, 0
+
+        conditions = ['cur.customer_id IS NULL']
+        if fix_mismatched:
+            conditions.append('named.customer_id <> o.customer_id')
+
+        conn.start_transaction()
+        cursor.execute(f"""
+            UPDATE orders o
+            JOIN ({UNIQUE_NAMES_SQL}) AS named ON named.customer_name = o.customer_name
+            LEFT JOIN customers cur ON cur.customer_id = o.customer_id
+            SET o.customer_id = named.customer_id
+            WHERE {' OR '.join(conditions)}
+        """)
+        updated = cursor.rowcount
+        conn.commit()
+        return status, updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,278 @@
+# db_pool.py
+"""
+Thread-safe MySQL connection pool used by get_db_connection() in app.py.
+
+Connections are created on demand up to pool_size + max_overflow. Each new
+connection has the legacy sql_mode relaxation (NO_ZERO_DATE / NO_ZERO_IN_DATE)
+applied once, right after connecting, so checking a connection out of the pool
+costs no extra round trips. Overflow connections are closed when returned
+instead of being kept idle.
+"""
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import errors
+
+# Relax strict date checks so legacy '0000-00-00' rows don't error.
+# Applied once per physical connection, not once per checkout.
+LEGACY_SQL_MODE = (
+    "SET SESSION sql_mode=(SELECT REPLACE(REPLACE(@@sql_mode,"
+    "'NO_ZERO_DATE',''),'NO_ZERO_IN_DATE',''))"
+)
+
+
+class PoolTimeout(errors.PoolError):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class PooledConnection:
+    """
+    Proxy around a mysql.connector connection borrowed from a ConnectionPool.
+
+    Behaves like the raw connection (cursor, commit, rollback, ...) except
+    that close() hands the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._borrowed_at = None
+        self._returned_at = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        wrapper = self._pool.cursor_wrapper
+        return wrapper(cursor) if wrapper is not None else cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def raw_connection(self):
+        return self._raw
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if self._borrowed_at is not None:
+            self._pool._release(self)
+
+    def discard(self):
+        """
+        Close the connection instead of returning it to the pool, e.g. when a
+        streamed result was abandoned and draining the unread rows would cost
+        more than reconnecting.
+        """
+        if self._borrowed_at is not None:
+            self._pool._release(self, keep=False)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of MySQL connections.
+
+    pool_size      -- connections kept open while idle
+    max_overflow   -- extra connections allowed under load, closed on return
+    timeout        -- seconds to wait for a free connection before PoolTimeout
+    recycle        -- max lifetime in seconds; older connections are replaced
+    pre_ping       -- check liveness on borrow (ping without reconnect)
+    ping_after     -- only ping connections idle for at least this many seconds
+    cursor_wrapper -- optional callable applied to every cursor handed out
+                      (e.g. query_stats.QueryStats.wrap_cursor)
+    """
+
+    def __init__(self, connect_args, pool_size=5, max_overflow=10, timeout=30.0,
+                 recycle=3600, pre_ping=True, ping_after=30.0, cursor_wrapper=None):
+        self.connect_args = dict(connect_args)
+        self.pool_size = max(1, int(pool_size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.timeout = float(timeout)
+        self.recycle = float(recycle)
+        self.pre_ping = pre_ping
+        self.ping_after = float(ping_after)
+        self.cursor_wrapper = cursor_wrapper
+
+        self._idle = deque()
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        # Counters for /admin/pool-stats
+        self._created = 0
+        self._closed = 0
+        self._borrows = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._failed_pings = 0
+        self._recycled = 0
+
+    # -- connection lifecycle -------------------------------------------------
+
+    def _open(self):
+        raw = mysql.connector.connect(**self.connect_args)
+        cur = raw.cursor()
+        try:
+            cur.execute(LEGACY_SQL_MODE)
+        finally:
+            cur.close()
+        with self._lock:
+            self._created += 1
+        return PooledConnection(self, raw, time.monotonic())
+
+    def _discard(self, conn):
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._closed += 1
+
+    def _is_usable(self, conn, now):
+        if self.recycle > 0 and now - conn._created_at > self.recycle:
+            with self._lock:
+                self._recycled += 1
+            return False
+        if self.pre_ping and now - conn._returned_at >= self.ping_after:
+            try:
+                conn._raw.ping(reconnect=False)
+            except Exception:
+                with self._lock:
+                    self._failed_pings += 1
+                return False
+        return True
+
+    # -- public API -----------------------------------------------------------
+
+    def get_connection(self):
+        """Borrow a connection, opening a new one if the pool has capacity"""
+        deadline = None
+        waited_from = None
+
+        while True:
+            conn = None
+            must_open = False
+
+            with self._available:
+                while True:
+                    if self._idle:
+                        conn = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._in_use < self.pool_size + self.max_overflow:
+                        self._in_use += 1
+                        must_open = True
+                        break
+
+                    now = time.monotonic()
+                    if waited_from is None:
+                        waited_from = now
+                        deadline = now + self.timeout
+                        self._waits += 1
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        self._record_wait(now - waited_from)
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout:.1f}s "
+                            f"(pool_size={self.pool_size}, max_overflow={self.max_overflow})"
+                        )
+                    self._available.wait(remaining)
+
+                if waited_from is not None:
+                    self._record_wait(time.monotonic() - waited_from)
+                    waited_from = None
+
+            if must_open:
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._give_back_slot()
+                    raise
+            elif not self._is_usable(conn, time.monotonic()):
+                self._discard(conn)
+                self._give_back_slot()
+                continue
+
+            with self._lock:
+                self._borrows += 1
+            conn._borrowed_at = time.monotonic()
+            return conn
+
+    def _record_wait(self, waited):
+        # Caller holds the lock
+        self._wait_time_total += waited
+        if waited > self._wait_time_max:
+            self._wait_time_max = waited
+
+    def _give_back_slot(self):
+        with self._available:
+            self._in_use -= 1
+            self._available.notify()
+
+    def _release(self, conn, keep=True):
+        conn._borrowed_at = None
+        raw = conn._raw
+        try:
+            # Never hand the next request an open transaction or pending rows
+            if keep and raw.unread_result:
+                raw.consume_results()
+            if keep and raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            keep = False
+
+        now = time.monotonic()
+        if keep and self.recycle > 0 and now - conn._created_at > self.recycle:
+            keep = False
+
+        with self._available:
+            self._in_use -= 1
+            if keep and len(self._idle) < self.pool_size:
+                conn._returned_at = now
+                self._idle.append(conn)
+                keep_open = True
+            else:
+                keep_open = False
+            self._available.notify()
+
+        if not keep_open:
+            self._discard(conn)
+
+    def dispose(self):
+        """Close every idle connection (borrowed ones close when returned)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Snapshot of pool usage, for sizing pool_size / max_overflow"""
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'overflow_in_use': max(0, self._in_use - self.pool_size),
+                'created': self._created,
+                'closed': self._closed,
+                'recycled': self._recycled,
+                'failed_pings': self._failed_pings,
+                'borrows': self._borrows,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._waits, 3) if self._waits else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+            }
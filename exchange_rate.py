@@ -0,0 +1,312 @@
+# exchange_rate.py
+"""
+Cached BRL -> JPY exchange rate service.
+
+Request handlers call ExchangeRateService.get_rate() / get_rate_info(), which
+only ever read memory: the upstream API is polled by a background thread.
+When the cached rate goes stale it is still served (stale-while-revalidate),
+flagged as stale, and the refresher is woken up. Every successful fetch is
+persisted to disk so a restart, or an upstream outage, falls back to the last
+known good rate instead of a hardcoded number.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RATE_URL = 'https://api.exchangerate-api.com/v4/latest/BRL'
+
+
+class ExchangeRateService:
+    """
+    In-process TTL cache for the BRL -> JPY rate with a background refresher.
+
+    url               -- upstream endpoint returning {"rates": {"JPY": ...}}
+    ttl               -- seconds a fetched rate counts as fresh
+    timeout           -- upstream request timeout (only paid by the refresher)
+    retry_interval    -- seconds between attempts while the upstream is failing
+    cache_file        -- JSON file holding the last known good rate
+    default_rate      -- used only when no rate has ever been fetched or seeded
+    seed_loader       -- optional callable returning a rate (e.g. last one
+                         recorded in the database), tried once when there is
+                         no persisted rate yet
+    """
+
+    def __init__(self, url=DEFAULT_RATE_URL, ttl=3600, timeout=5, retry_interval=60,
+                 cache_file=None, default_rate=30.0, seed_loader=None,
+                 source_name='ExchangeRate-API', on_fetch=None):
+        self.url = url
+        self.ttl = float(ttl)
+        self.timeout = float(timeout)
+        self.retry_interval = float(retry_interval)
+        self.cache_file = cache_file
+        self.default_rate = float(default_rate)
+        self.seed_loader = seed_loader
+        self.source_name = source_name
+        self.on_fetch = on_fetch
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._rate = None
+        self._source = None
+        self._fetched_at = None  # wall clock, persisted
+        self._fresh_until = 0.0  # monotonic, in-process only
+        self._next_attempt = 0.0  # monotonic, backoff after a failed fetch
+
+        self._fetches = 0
+        self._failures = 0
+        self._last_error = None
+        self._last_fetch_ms = None
+
+        self._load_persisted()
+
+    # -- persistence ----------------------------------------------------------
+
+    def _load_persisted(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+            rate = float(data['rate'])
+            if rate > 0:
+                self._rate = rate
+                self._source = data.get('source') or self.source_name
+                self._fetched_at = float(data.get('fetched_at') or 0) or None
+                # Treat a persisted rate as stale so the refresher runs at once
+                self._fresh_until = 0.0
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("Could not read exchange rate cache %s: %s", self.cache_file, e)
+
+    def _persist(self, rate, source, fetched_at):
+        if not self.cache_file:
+            return
+        tmp_path = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'rate': rate, 'source': source, 'fetched_at': fetched_at}, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            log.warning("Could not write exchange rate cache %s: %s", self.cache_file, e)
+
+    # -- upstream -------------------------------------------------------------
+
+    def fetch(self):
+        """Fetch the rate from upstream (blocking). Returns the rate or None."""
+        started = time.monotonic()
+        rate = None
+        try:
+            response = requests.get(self.url, timeout=self.timeout)
+            if response.status_code == 200:
+                data = response.json()
+                if 'rates' in data and 'JPY' in data['rates']:
+                    rate = round(float(data['rates']['JPY']), 4)
+            if rate is None:
+                self._last_error = f"Unexpected response: HTTP {response.status_code}"
+        except Exception as e:
+            self._last_error = str(e)
+        finally:
+            elapsed = time.monotonic() - started
+            self._last_fetch_ms = round(elapsed * 1000, 3)
+            if self.on_fetch is not None:
+                try:
+                    self.on_fetch(elapsed, rate is not None)
+                except Exception as e:
+                    log.warning("Exchange rate fetch observer failed: %s", e)
+        return rate
+
+    def refresh(self):
+        """Fetch and store a new rate. Returns True on success."""
+        rate = self.fetch()
+        now = time.time()
+        with self._lock:
+            self._fetches += 1
+            if rate is None or rate <= 0:
+                self._failures += 1
+                log.warning("Error fetching from %s: %s", self.source_name, self._last_error)
+                return False
+            self._rate = rate
+            self._source = self.source_name
+            self._fetched_at = now
+            self._fresh_until = time.monotonic() + self.ttl
+            self._last_error = None
+        self._persist(rate, self.source_name, now)
+        return True
+
+    def _seed(self):
+        if self.seed_loader is None or self._rate is not None:
+            return
+        try:
+            rate = self.seed_loader()
+        except Exception as e:
+            log.warning("Could not seed exchange rate: %s", e)
+            return
+        if rate:
+            with self._lock:
+                if self._rate is None:
+                    self._rate = round(float(rate), 4)
+                    self._source = 'Last recorded rate'
+
+    # -- background refresher -------------------------------------------------
+
+    def start(self):
+        """Start the background refresher (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='exchange-rate-refresher', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        self._seed()
+        while not self._stopping.is_set():
+            now = time.monotonic()
+            due = max(self._fresh_until, self._next_attempt)
+            if now >= due:
+                if not self.refresh():
+                    self._next_attempt = time.monotonic() + self.retry_interval
+                continue
+            self._wake.wait(due - now)
+            self._wake.clear()
+
+    # -- request path ---------------------------------------------------------
+
+    def get_rate(self):
+        """Return (rate, source) without touching the network; see get_rate_info()"""
+        rate, source, _stale, _as_of = self.get_rate_info()
+        return rate, source
+
+    def get_rate_info(self):
+        """
+        Return (rate, source, stale, as_of) without touching the network.
+
+        source is a short label (it is stored in VARCHAR(50) columns); whether
+        the rate is stale, and when it was fetched (datetime, or None if not
+        known), come back separately. Stale rates are served while the
+        refresher is woken up to replace them.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+
+        with self._lock:
+            rate = self._rate
+            source = self._source
+            fetched_at = self._fetched_at
+            fresh = time.monotonic() < self._fresh_until
+
+        if rate is None:
+            self._wake.set()
+            return self.default_rate, 'Fallback (Update manually)', True, None
+
+        as_of = datetime.fromtimestamp(fetched_at) if fetched_at else None
+        if fresh:
+            return rate, source, False, as_of
+
+        self._wake.set()
+        return rate, source, True, as_of
+
+    def status(self):
+        with self._lock:
+            return {
+                'rate': self._rate,
+                'source': self._source,
+                'fetched_at': datetime.fromtimestamp(self._fetched_at).isoformat() if self._fetched_at else None,
+                'fresh': time.monotonic() < self._fresh_until,
+                'fetches': self._fetches,
+                'failures': self._failures,
+                'last_error': self._last_error,
+                'last_fetch_ms': self._last_fetch_ms,
+                'refresher_alive': self._thread is not None and self._thread.is_alive(),
+            }
+
+
+class StubRateServer:
+    """
+    Local stand-in for the exchange rate API, for tests and offline work.
+
+        with StubRateServer(rate=28.5) as stub:
+            service = ExchangeRateService(url=stub.url)
+
+    Set .rate, .status or .delay on a running stub to simulate rate changes,
+    upstream errors or a slow upstream.
+    """
+
+    def __init__(self, rate=30.0, status=200, delay=0.0, host='127.0.0.1', port=0):
+        self.rate = rate
+        self.status = status
+        self.delay = delay
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                body = json.dumps({'base': 'BRL', 'rates': {'JPY': stub.rate}}).encode()
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v4/latest/BRL'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    # Run a stub upstream: python exchange_rate.py [rate] [port]
+    import sys
+
+    stub = StubRateServer(
+        rate=float(sys.argv[1]) if len(sys.argv) > 1 else 30.0,
+        port=int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    )
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    log.info("Stub exchange rate API at %s (Ctrl+C to stop)", stub.url)
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
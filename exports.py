@@ -0,0 +1,198 @@
+# exports.py
+"""
+Streaming CSV / JSON exports (orders, customers, customer ledger).
+
+The export query runs on an unbuffered cursor, so the server sends rows as
+they are read instead of the connector loading the whole result first. Rows
+are pulled with fetchmany(), encoded and handed to the HTTP response in
+chunks of roughly chunk_bytes, so memory use stays flat however many years
+of orders are exported and the first bytes go out immediately.
+
+ExportStream owns the pooled connection for the lifetime of the response.
+It is returned to the pool when the last row has been sent; if the client
+goes away mid-download the connection is discarded instead, since draining
+the unread rows would cost more than reconnecting.
+"""
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+log = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'json')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+# A slow download keeps the server waiting on the socket; allow more than
+# MySQL's default 60s per write before it aborts the query
+EXPORT_NET_WRITE_TIMEOUT = 600
+
+ORDERS_EXPORT_COLUMNS = (
+    'order_id', 'customer_id', 'asset_code', 'customer_name', 'asset_name',
+    'order_date', 'order_real', 'order_ien', 'frete_brasil', 'frete_jp',
+    'total_value', 'delivery_date', 'payment_type', 'created_at',
+)
+
+ORDERS_EXPORT_SQL = """
+    SELECT o.order_id, o.customer_id, o.asset_code, o.customer_name, o.asset_name,
+        o.order_date, o.order_real, o.order_ien, o.frete_brasil, o.frete_jp,
+        o.total_value, o.delivery_date, o.payment_type, o.created_at
+    FROM orders o
+"""
+
+CUSTOMERS_EXPORT_COLUMNS = (
+    'customer_id', 'customer_name', 'customer_address', 'customer_telephone',
+    'customer_delivery_time_request', 'created_at', 'total_orders', 'total_spent',
+    'last_order', 'total_debt', 'total_payments', 'total_credits', 'balance',
+)
+
+# Order totals are aggregated once in a derived table rather than grouping
+# the customer columns, and balances come from the materialized table
+CUSTOMERS_EXPORT_SQL = """
+    SELECT c.customer_id, c.customer_name, c.customer_address, c.customer_telephone,
+        c.customer_delivery_time_request, c.created_at,
+        COALESCE(o.total_orders, 0), COALESCE(o.total_spent, 0), o.last_order,
+        COALESCE(b.total_debt, 0), COALESCE(b.total_payments, 0),
+        COALESCE(b.total_credits, 0), COALESCE(b.balance, 0)
+    FROM customers c
+    LEFT JOIN (
+        SELECT customer_id, COUNT(*) AS total_orders, SUM(total_value) AS total_spent,
+            MAX(order_date) AS last_order
+        FROM orders
+        GROUP BY customer_id
+    ) o ON o.customer_id = c.customer_id
+    LEFT JOIN customer_balances b ON b.customer_id = c.customer_id
+    ORDER BY c.customer_name, c.customer_id
+"""
+
+LEDGER_EXPORT_COLUMNS = (
+    'account_id', 'customer_id', 'customer_name', 'transaction_type', 'amount',
+    'description', 'order_id', 'transaction_date', 'created_at',
+)
+
+LEDGER_EXPORT_SQL = """
+    SELECT a.account_id, a.customer_id, a.customer_name, a.transaction_type, a.amount,
+        a.description, a.order_id, a.transaction_date, a.created_at
+    FROM customer_accounts a
+"""
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def csv_chunks(columns, batches, chunk_bytes):
+    """Header plus rows as UTF-8 CSV (with BOM so Excel reads accents)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def json_chunks(columns, batches, chunk_bytes):
+    """Rows as a JSON array of objects, one object per line"""
+    parts = ['[']
+    size = 1
+    separator = '\n'
+    for rows in batches:
+        for row in rows:
+            item = separator + json.dumps(dict(zip(columns, row)), default=_json_default,
+                                          ensure_ascii=False)
+            separator = ',\n'
+            parts.append(item)
+            size += len(item)
+        if size >= chunk_bytes:
+            yield ''.join(parts).encode('utf-8')
+            parts = []
+            size = 0
+    parts.append('\n]\n')
+    yield ''.join(parts).encode('utf-8')
+
+
+def open_export_cursor(conn, sql, params=()):
+    """Run the export query on an unbuffered cursor; rows are read as they are sent"""
+    cursor = conn.cursor(buffered=False)
+    cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT,))
+    cursor.execute(sql, list(params))
+    return cursor
+
+
+class ExportStream:
+    """
+    Iterable of encoded chunks for a Flask Response.
+
+    conn    -- pooled connection that ran the query (owned from here on)
+    cursor  -- unbuffered cursor from open_export_cursor()
+    columns -- names for the CSV header / JSON keys, in select order
+    """
+
+    def __init__(self, conn, cursor, columns, fmt, fetch_size=500, chunk_bytes=64 * 1024):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f'Unknown export format "{fmt}"')
+        self.conn = conn
+        self.cursor = cursor
+        self.columns = tuple(columns)
+        self.fmt = fmt
+        self.fetch_size = max(int(fetch_size), 1)
+        self.chunk_bytes = max(int(chunk_bytes), 1)
+        self.rows_sent = 0
+
+    def _batches(self):
+        while True:
+            rows = self.cursor.fetchmany(self.fetch_size)
+            if not rows:
+                return
+            self.rows_sent += len(rows)
+            yield rows
+
+    def __iter__(self):
+        encode = csv_chunks if self.fmt == 'csv' else json_chunks
+        try:
+            yield from encode(self.columns, self._batches(), self.chunk_bytes)
+        except Exception as e:
+            # Headers are already sent; dropping the connection mid-body is
+            # the only way left to tell the client the file is incomplete
+            log.error("Export failed after %d rows: %s", self.rows_sent, e)
+            self._release(finished=False)
+            raise
+        self._release(finished=True)
+
+    def close(self):
+        """Called by the WSGI server when the response ends or the client disconnects"""
+        self._release(finished=False)
+
+    def _release(self, finished):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        if not finished:
+            conn.discard()
+            return
+        try:
+            self.cursor.execute("SET SESSION net_write_timeout = DEFAULT")
+            self.cursor.close()
+        except Exception:
+            conn.discard()
+            return
+        conn.close()
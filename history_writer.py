@@ -0,0 +1,227 @@
+# history_writer.py
+"""
+Background writer for append-only history rows (calculation history).
+
+Request handlers call submit(), which only puts the row on a bounded
+in-process queue. A daemon thread drains the queue and writes whatever has
+accumulated with one executemany(), which mysql.connector sends as a single
+multi-row INSERT, on one pooled connection per batch.
+
+When the queue is full, submit() / submit_many() wait up to put_timeout
+(per call, however many rows) for room (backpressure) and then drop rows
+rather than slow the request further.
+
+If a batch INSERT fails, its rows are retried one by one, so a row the table
+rejects (too long, bad value) is the only one lost. Dropped rows, and rows
+whose retry failed too, are counted in stats(). stop() flushes what is
+queued; it is registered with atexit so a normal shutdown does not lose
+history.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """
+    Bounded queue plus one worker thread writing rows in batches.
+
+    connect         -- callable returning a DB connection (closed after each batch)
+    insert_sql      -- INSERT statement with one %s per column
+    max_queue       -- rows held before submit() starts pushing back
+    batch_size      -- most rows written by one INSERT
+    flush_interval  -- longest a row waits while more rows are collected
+    put_timeout     -- how long one submit()/submit_many() call waits for room
+                       before dropping rows
+    """
+
+    def __init__(self, connect, insert_sql, max_queue=1000, batch_size=100,
+                 flush_interval=0.5, put_timeout=0.05, name='history-writer'):
+        self.connect = connect
+        self.insert_sql = insert_sql
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+        self.put_timeout = float(put_timeout)
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max(int(max_queue), 1))
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._submitted = 0
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._batches = 0
+        self._last_error = None
+        self._last_batch_ms = None
+
+        atexit.register(self.stop)
+
+    # -- request path ---------------------------------------------------------
+
+    def submit(self, row):
+        """Queue one row. Returns False if it was dropped because the queue stayed full."""
+        return self.submit_many((row,)) == 1
+
+    def submit_many(self, rows):
+        """
+        Queue several rows, waiting at most put_timeout in total (not per row)
+        for room; returns how many were accepted, the rest are dropped.
+        """
+        rows = list(rows)
+        if self._stopping.is_set():
+            with self._lock:
+                self._dropped += len(rows)
+            return 0
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        deadline = time.monotonic() + self.put_timeout
+        accepted = 0
+        for row in rows:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    self._queue.put(row, timeout=remaining)
+                else:
+                    self._queue.put_nowait(row)
+                accepted += 1
+            except queue.Full:
+                pass
+        with self._lock:
+            self._submitted += accepted
+            self._dropped += len(rows) - accepted
+        return accepted
+
+    # -- worker ---------------------------------------------------------------
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _collect(self, first):
+        """first plus whatever arrives within flush_interval, up to batch_size rows"""
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or self._stopping.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        started = time.monotonic()
+        try:
+            self._insert(lambda cursor: cursor.executemany(self.insert_sql, batch))
+            written = len(batch)
+        except Exception as e:
+            self._last_error = str(e)
+            # Second attempt row by row: a transient error gets its retry, and
+            # a row the table rejects (too long, bad value) loses only itself
+            try:
+                written = self._insert(lambda cursor: self._insert_rows(cursor, batch))
+            except Exception as e:
+                self._last_error = str(e)
+                written = 0
+        with self._lock:
+            self._written += written
+            self._failed += len(batch) - written
+            self._batches += 1
+            self._last_batch_ms = round((time.monotonic() - started) * 1000, 3)
+        if written < len(batch):
+            log.error("%s: dropped %d of %d rows: %s", self.name, len(batch) - written,
+                      len(batch), self._last_error)
+
+    def _insert_rows(self, cursor, rows):
+        written = 0
+        for row in rows:
+            try:
+                cursor.execute(self.insert_sql, row)
+                written += 1
+            except Exception as e:
+                self._last_error = str(e)
+        return written
+
+    def _insert(self, insert):
+        """Run insert(cursor) on a fresh connection and commit; returns what insert returned"""
+        conn = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            result = insert(cursor)
+            conn.commit()
+            cursor.close()
+            return result
+        except Exception:
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            raise
+        finally:
+            if conn:
+                conn.close()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            batch = self._collect(first)
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # -- shutdown -------------------------------------------------------------
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued row has been written (or given up on)"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            if self._thread is None or not self._thread.is_alive():
+                self.start()
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def stop(self, timeout=5.0):
+        """Stop accepting rows, write what is queued and stop the worker"""
+        flushed = self.flush(timeout)
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return flushed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'submitted': self._submitted,
+                'written': self._written,
+                'dropped': self._dropped,
+                'failed': self._failed,
+                'batches': self._batches,
+                'last_error': self._last_error,
+                'last_batch_ms': self._last_batch_ms,
+                'worker_alive': self._thread is not None and self._thread.is_alive(),
+            }
@@ -0,0 +1,108 @@
+# json_provider.py
+"""
+JSON provider for the Flask app (app.json), used by every jsonify() call.
+
+Uses orjson when it is installed (the fast-json extra, or pip install orjson)
+and the stdlib encoder otherwise. Both produce the same output for the values
+the app sends:
+
+- date / datetime as ISO 8601 ('2024-01-02', '2024-01-02T03:00:00'), so
+  routes pass the database values through instead of calling .isoformat()
+  per row (Flask's default would be an HTTP date string)
+- Decimal as a float, like safe_decimal_to_float()
+- keys in insertion order (no sort), no indentation, no ASCII escaping
+- NaN and +/-Infinity (float or Decimal) as null, which is what orjson
+  writes; the stdlib would write the non-JSON literals NaN and Infinity
+
+orjson encodes straight to bytes, so response() skips the str round trip.
+"""
+import dataclasses
+import decimal
+import json
+import math
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+
+def _default(value):
+    """Types neither encoder handles natively (orjson already covers dates and UUIDs)"""
+    if isinstance(value, decimal.Decimal):
+        return float(value) if value.is_finite() else None
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _finite(value):
+    """value with NaN and infinite floats replaced by None, in nested dicts and lists too"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _stdlib_dumps(obj, **kwargs):
+    """json.dumps, writing non-finite floats as null like orjson"""
+    kwargs.setdefault('default', _default)
+    kwargs.setdefault('ensure_ascii', False)
+    kwargs.setdefault('separators', (',', ':'))
+    if 'allow_nan' in kwargs:
+        return json.dumps(obj, **kwargs)
+    try:
+        return json.dumps(obj, allow_nan=False, **kwargs)
+    except ValueError:
+        # Rare, so the copy is only made when a NaN or infinity is actually there
+        return json.dumps(_finite(obj), allow_nan=False, **kwargs)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson when available"""
+
+    mimetype = 'application/json'
+
+    @property
+    def backend(self):
+        return 'orjson' if orjson is not None else 'json'
+
+    def dumps_bytes(self, obj):
+        """obj as UTF-8 encoded JSON"""
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return _stdlib_dumps(obj).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        # Explicit options (e.g. sort_keys from the tojson template filter) go to the stdlib
+        return _stdlib_dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
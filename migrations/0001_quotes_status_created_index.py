@@ -0,0 +1,26 @@
+# migrations/0001_quotes_status_created_index.py
+"""
+Index quotes by (status, created_at) for the status-filtered quote lists
+
+dashboard(), create_order(), api_quotes() and quotes() all filter quotes by
+status and sort by created_at DESC; with only the primary key and admin_id
+they read and sort the whole table. The index serves the filter, returns
+rows already in created_at order and answers COUNT(*) ... WHERE status on
+its own.
+"""
+from schema_migrations import add_index
+
+
+def upgrade(cursor):
+    add_index(cursor, 'quotes', 'idx_quotes_status_created', ('status', 'created_at'))
+
+
+EXPLAIN_CHECKS = [
+    ('pending quotes, newest first',
+     "SELECT quote_id, customer_name, book_title, total_jpy, created_at FROM quotes "
+     "WHERE status = 'pending' ORDER BY created_at DESC LIMIT 5",
+     'idx_quotes_status_created'),
+    ('pending quote count',
+     "SELECT COUNT(*) FROM quotes WHERE status = 'pending'",
+     'idx_quotes_status_created'),
+]
@@ -0,0 +1,32 @@
+# migrations/0002_orders_order_date_id_index.py
+"""
+Replace the duplicate order_date indexes on orders with (order_date, order_id)
+
+idx_orders_order_date and idx_orders_date are the same single-column index;
+every write maintained both. The order lists page by the keyset
+(order_date, order_id) (pagination.py), which the composite index matches
+exactly. It is created before the old ones are dropped so date queries
+always have an index.
+"""
+from pagination import order_by, seek_after
+from schema_migrations import add_index, drop_index
+
+
+def upgrade(cursor):
+    add_index(cursor, 'orders', 'idx_orders_order_date_id', ('order_date', 'order_id'))
+    drop_index(cursor, 'orders', 'idx_orders_date')
+    drop_index(cursor, 'orders', 'idx_orders_order_date')
+
+
+def _page_after(ascending):
+    """The order lists' next-page query (pagination.fetch_keyset_page) after a sample cursor"""
+    condition, params = seek_after('2025-01-01', 1000000, ascending)
+    sql = (f"SELECT o.order_id, o.customer_name, o.order_date FROM orders o WHERE {condition}"
+           f"{order_by(ascending)} LIMIT %s")
+    return sql, params + [21]
+
+
+EXPLAIN_CHECKS = [
+    ('orders list next page, newest first', _page_after(False), 'idx_orders_order_date_id'),
+    ('orders list next page, oldest first', _page_after(True), 'idx_orders_order_date_id'),
+]
@@ -0,0 +1,26 @@
+# migrations/0003_orders_delivery_pending_index.py
+"""
+Index orders by (delivery_date, order_date, order_id) for the pending-delivery lists
+
+The dashboard's processing orders and the reports' orders-by-status list
+select delivery_date IS NULL (or NOT NULL) and page by (order_date,
+order_id), and the status counts sum over delivery_date for dated orders.
+The composite index serves the filter and the sort together and covers the
+counts; it makes the single-column idx_orders_delivery_date redundant.
+"""
+from schema_migrations import add_index, drop_index
+
+
+def upgrade(cursor):
+    add_index(cursor, 'orders', 'idx_orders_delivery_order_date',
+              ('delivery_date', 'order_date', 'order_id'))
+    drop_index(cursor, 'orders', 'idx_orders_delivery_date')
+
+
+EXPLAIN_CHECKS = [
+    ('processing orders page, newest first',
+     "SELECT o.order_id, o.customer_name, o.order_date FROM orders o "
+     "WHERE o.order_date IS NOT NULL AND o.delivery_date IS NULL "
+     "ORDER BY o.order_date DESC, o.order_id DESC LIMIT 25",
+     'idx_orders_delivery_order_date'),
+]
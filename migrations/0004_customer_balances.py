@@ -0,0 +1,16 @@
+# migrations/0004_customer_balances.py
+"""
+Create customer_balances and fill it from the customer_accounts ledger
+
+The dashboard and the customer pages read balances from this table, and
+every ledger write keeps it in step (balances.py). Filling it is the same
+set-based rebuild as `flask --app app balances rebuild`, so running the
+migration again, or on an install that was already rebuilt by hand, just
+recomputes the same totals.
+"""
+from balances import CREATE_CUSTOMER_BALANCES_SQL, fill_customer_balances
+
+
+def upgrade(cursor):
+    cursor.execute(CREATE_CUSTOMER_BALANCES_SQL)
+    fill_customer_balances(cursor)
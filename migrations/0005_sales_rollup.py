@@ -0,0 +1,14 @@
+# migrations/0005_sales_rollup.py
+"""
+Create sales_rollup and fill it from orders
+
+/reports reads its aggregates from this table and every order write keeps
+it in step (sales_rollup.py). Filling it is the same rebuild as
+`flask --app app rollup rebuild`, so it is safe to run again.
+"""
+from sales_rollup import CREATE_SALES_ROLLUP_SQL, fill_sales_rollup
+
+
+def upgrade(cursor):
+    cursor.execute(CREATE_SALES_ROLLUP_SQL)
+    fill_sales_rollup(cursor)
@@ -0,0 +1,13 @@
+# migrations/0006_table_versions.py
+"""
+Create table_versions, the change counters behind the lookup list ETags
+
+Writes to customers and assets bump their counter in the same transaction
+(table_versions.py). A table with no row counts as version 0, so nothing
+needs filling in.
+"""
+from table_versions import CREATE_TABLE_VERSIONS_SQL
+
+
+def upgrade(cursor):
+    cursor.execute(CREATE_TABLE_VERSIONS_SQL)
@@ -0,0 +1,13 @@
+# migrations/0007_asset_import_tables.py
+"""
+Create the asset import tables (asset_imports, asset_import_staging, asset_import_rejects)
+
+They only hold imports started after this migration, so nothing needs
+filling in.
+"""
+from asset_import import CREATE_IMPORT_TABLES_SQL
+
+
+def upgrade(cursor):
+    for statement in CREATE_IMPORT_TABLES_SQL:
+        cursor.execute(statement)
@@ -0,0 +1,125 @@
+# pagination.py
+"""
+Keyset (seek) pagination for order lists sorted by (order_date, order_id).
+
+Instead of LIMIT/OFFSET, a page is fetched relative to the first or last row
+of the previous one (seek_after() spells out "order_date < ... OR
+(order_date = ... AND order_id < ...)"), so page 500 is as cheap as page 1.
+Positions are handed to the client as opaque cursor tokens.
+
+MySQL sorts NULL before any value, so NULL order dates come last in DESC
+order and first in ASC order; the seek conditions below follow that. Legacy
+'0000-00-00' dates are carried as strings (CAST(order_date AS CHAR)) because
+the connector turns them into None.
+"""
+import base64
+import binascii
+import json
+
+# Select this alongside order_id so the cursor can be built from the row
+ORDER_DATE_KEY_SQL = "CAST(o.order_date AS CHAR)"
+
+
+def encode_cursor(order_date_key, order_id, direction):
+    """Opaque token for a position; direction is 'next' or 'prev'"""
+    payload = json.dumps([order_date_key, int(order_id), direction[0]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Returns (order_date_key, order_id, direction); raises ValueError if malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        order_date_key, order_id, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {token}') from e
+    if direction not in ('n', 'p') or not isinstance(order_id, int) or \
+            not (order_date_key is None or isinstance(order_date_key, str)):
+        raise ValueError(f'Invalid cursor: {token}')
+    return order_date_key, order_id, 'next' if direction == 'n' else 'prev'
+
+
+def is_valid_cursor(token):
+    try:
+        decode_cursor(token)
+        return True
+    except ValueError:
+        return False
+
+
+def seek_after(order_date_key, order_id, ascending, alias='o'):
+    """
+    WHERE fragment selecting rows strictly after (order_date_key, order_id)
+    when sorted by order_date, order_id in the given direction.
+    """
+    date_col = f'{alias}.order_date'
+    id_col = f'{alias}.order_id'
+    if ascending:
+        if order_date_key is None:
+            return (f'({date_col} IS NOT NULL OR ({date_col} IS NULL AND {id_col} > %s))',
+                    [order_id])
+        return (f'({date_col} > %s OR ({date_col} = %s AND {id_col} > %s))',
+                [order_date_key, order_date_key, order_id])
+    if order_date_key is None:
+        return (f'({date_col} IS NULL AND {id_col} < %s)', [order_id])
+    return (f'({date_col} < %s OR ({date_col} = %s AND {id_col} < %s) OR {date_col} IS NULL)',
+            [order_date_key, order_date_key, order_id])
+
+
+def order_by(ascending, alias='o'):
+    direction = 'ASC' if ascending else 'DESC'
+    return f' ORDER BY {alias}.order_date {direction}, {alias}.order_id {direction}'
+
+
+def fetch_keyset_page(cursor, select_sql, where_conditions, params, ascending, per_page,
+                      cursor_token=None, offset=0, key_index=(-2, -1)):
+    """
+    Run select_sql (which must select ORDER_DATE_KEY_SQL and o.order_id at the
+    positions given by key_index) for one page.
+
+    With a cursor token the page is found by seeking; without one, offset is
+    used (page 1, or a direct jump to a numbered page). Returns
+    (rows, next_cursor, prev_cursor); a cursor is None when there is nothing
+    in that direction.
+    """
+    conditions = list(where_conditions)
+    query_params = list(params)
+    going_back = False
+
+    if cursor_token:
+        order_date_key, order_id, direction = decode_cursor(cursor_token)
+        going_back = direction == 'prev'
+        # Walking backwards is walking forwards in the opposite sort order
+        condition, seek_params = seek_after(order_date_key, order_id, ascending != going_back)
+        conditions.append(condition)
+        query_params.extend(seek_params)
+
+    sql = select_sql
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += order_by(ascending != going_back)
+    # One extra row tells us whether there is another page in this direction
+    sql += ' LIMIT %s'
+    query_params.append(per_page + 1)
+    if not cursor_token and offset:
+        sql += ' OFFSET %s'
+        query_params.append(offset)
+
+    cursor.execute(sql, query_params)
+    rows = cursor.fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if going_back:
+        rows.reverse()
+
+    date_pos, id_pos = key_index
+    next_cursor = prev_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        more_after = has_more if not going_back else True
+        more_before = (has_more if going_back else bool(cursor_token) or offset > 0)
+        if more_after:
+            next_cursor = encode_cursor(last[date_pos], last[id_pos], 'next')
+        if more_before:
+            prev_cursor = encode_cursor(first[date_pos], first[id_pos], 'prev')
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,369 @@
+# query_stats.py
+"""
+SQL instrumentation: how many queries each endpoint runs and how long they take.
+
+ConnectionPool wraps every cursor it hands out in an InstrumentedCursor
+(cursor_wrapper=query_stats.wrap_cursor). For each statement it records the
+normalized text (literals replaced by ?), time spent in execute and fetch,
+rows returned and the call site (first frame outside this module). Records
+belong to the request opened with begin(endpoint) and closed with end(); the
+app calls these from before_request / teardown_request. Statements run
+outside a request (background index rebuilds, the history writer, CLI
+commands) are filed under the endpoint '(background)'.
+
+Per endpoint it keeps request/query/time totals and the most queries seen in
+one request. It also keeps totals per statement, the most recent slow
+statements (above slow_query_ms), and N+1 patterns: one statement run from
+the same call site at least n_plus_one_threshold times in a single request.
+
+The wrapper only adds a perf_counter() pair, a frame walk and one dict
+update per statement; aggregation happens once per request in end().
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
+
+BACKGROUND_ENDPOINT = '(background)'
+
+_THIS_FILE = os.path.normcase(os.path.abspath(__file__))
+_SKIP_DIRS = (os.path.normcase(os.path.dirname(os.path.abspath(threading.__file__))),)
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(sql):
+    """Statement text with literals and placeholders as ?, IN lists collapsed, one line"""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    text = _STRING_RE.sub('?', sql)
+    text = _PLACEHOLDER_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _IN_LIST_RE.sub('(...)', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def _call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.normcase(frame.f_code.co_filename)
+        if filename != _THIS_FILE and not filename.startswith(_SKIP_DIRS):
+            return f'{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}'
+        frame = frame.f_back
+    return '?'
+
+
+class QueryRecord:
+    """One executed statement; rows and duration grow while its result is fetched"""
+
+    __slots__ = ('statement', 'call_site', 'duration', 'rows')
+
+    def __init__(self, statement, call_site, duration):
+        self.statement = statement
+        self.call_site = call_site
+        self.duration = duration
+        self.rows = 0
+
+
+class RequestQueries:
+    """Statements run while handling one request"""
+
+    __slots__ = ('endpoint', 'records', 'started')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.records = []
+        self.started = time.perf_counter()
+
+
+_current = ContextVar('query_stats_request', default=None)
+
+
+class InstrumentedCursor:
+    """Cursor proxy timing execute/fetch calls into the collector"""
+
+    def __init__(self, cursor, collector):
+        self._cursor = cursor
+        self._collector = collector
+        self._record = None
+        self._background = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        if row is None:
+            raise StopIteration
+        return row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _begin(self, statement, started):
+        self._flush_background()
+        record = QueryRecord(normalize_statement(statement), _call_site(),
+                             time.perf_counter() - started)
+        self._record = record
+        request = _current.get()
+        if request is not None:
+            request.records.append(record)
+        else:
+            # Outside a request nothing calls end(); hand the record over
+            # when the cursor moves on or closes
+            self._background = record
+
+    def _fetched(self, started, rows):
+        record = self._record
+        if record is not None:
+            record.duration += time.perf_counter() - started
+            record.rows += rows
+
+    def _flush_background(self):
+        if self._background is not None:
+            self._collector.add_background(self._background)
+            self._background = None
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._begin(operation, started)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._begin(operation, started)
+            self._record.rows = max(self._cursor.rowcount or 0, 0)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=1):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+    def close(self):
+        self._flush_background()
+        return self._cursor.close()
+
+
+class _Totals:
+    __slots__ = ('count', 'seconds', 'max_seconds', 'rows')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+    def add(self, record):
+        self.count += 1
+        self.seconds += record.duration
+        self.rows += record.rows
+        if record.duration > self.max_seconds:
+            self.max_seconds = record.duration
+
+
+class QueryStats:
+    """
+    Aggregated query statistics.
+
+    slow_query_ms          -- statements slower than this are kept in slow_queries
+    n_plus_one_threshold   -- repeats of one statement from one call site in a
+                              request that count as an N+1 pattern
+    max_statements         -- distinct statements tracked; later ones are pooled
+                              under '(other)'
+    history                -- slow queries / N+1 events kept
+    """
+
+    def __init__(self, slow_query_ms=100.0, n_plus_one_threshold=10, max_statements=500, history=50):
+        self.slow_query_seconds = float(slow_query_ms) / 1000.0
+        self.n_plus_one_threshold = int(n_plus_one_threshold)
+        self.max_statements = int(max_statements)
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._statements = {}
+        self._slow = deque(maxlen=history)
+        self._n_plus_one = deque(maxlen=history)
+        self._started = time.time()
+
+    # -- request lifecycle ----------------------------------------------------
+
+    def wrap_cursor(self, cursor):
+        return InstrumentedCursor(cursor, self)
+
+    def begin(self, endpoint):
+        """Start collecting for the current request"""
+        return _current.set(RequestQueries(endpoint or '(unknown)'))
+
+    def end(self, token=None):
+        """Stop collecting and aggregate the request's statements"""
+        request = _current.get()
+        if token is not None:
+            _current.reset(token)
+        else:
+            _current.set(None)
+        if request is not None:
+            self._aggregate(request.endpoint, request.records, request=True)
+        return request
+
+    def current(self):
+        return _current.get()
+
+    def add_background(self, record):
+        self._aggregate(BACKGROUND_ENDPOINT, [record], request=False)
+
+    def _statement_totals(self, statement):
+        totals = self._statements.get(statement)
+        if totals is None:
+            if len(self._statements) >= self.max_statements:
+                statement = '(other)'
+                totals = self._statements.get(statement)
+            if totals is None:
+                totals = self._statements[statement] = _Totals()
+        return totals
+
+    def _aggregate(self, endpoint, records, request):
+        repeats = {}
+        for record in records:
+            key = (record.statement, record.call_site)
+            repeats[key] = repeats.get(key, 0) + 1
+        now = time.time()
+
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'seconds': 0.0, 'rows': 0,
+                    'max_queries': 0, 'slow': 0, 'n_plus_one': 0,
+                }
+            if request:
+                stats['requests'] += 1
+                stats['max_queries'] = max(stats['max_queries'], len(records))
+            stats['queries'] += len(records)
+            for record in records:
+                stats['seconds'] += record.duration
+                stats['rows'] += record.rows
+                self._statement_totals(record.statement).add(record)
+                if record.duration >= self.slow_query_seconds:
+                    stats['slow'] += 1
+                    self._slow.append({
+                        'at': now, 'endpoint': endpoint, 'statement': record.statement,
+                        'call_site': record.call_site, 'ms': record.duration * 1000,
+                        'rows': record.rows,
+                    })
+            if request:
+                for (statement, call_site), count in repeats.items():
+                    if count >= self.n_plus_one_threshold:
+                        stats['n_plus_one'] += 1
+                        self._n_plus_one.append({
+                            'at': now, 'endpoint': endpoint, 'statement': statement,
+                            'call_site': call_site, 'count': count,
+                        })
+
+    # -- reporting ------------------------------------------------------------
+
+    def snapshot(self, top=20):
+        """Endpoints, the top statements by total time, slow queries and N+1 events"""
+        with self._lock:
+            endpoints = []
+            for endpoint, stats in self._endpoints.items():
+                requests = stats['requests']
+                endpoints.append(dict(
+                    stats, endpoint=endpoint, ms=stats['seconds'] * 1000,
+                    avg_queries=stats['queries'] / requests if requests else None,
+                    avg_ms=stats['seconds'] * 1000 / requests if requests else None,
+                ))
+            statements = [{
+                'statement': statement, 'count': totals.count, 'ms': totals.seconds * 1000,
+                'avg_ms': totals.seconds * 1000 / totals.count, 'max_ms': totals.max_seconds * 1000,
+                'rows': totals.rows,
+            } for statement, totals in self._statements.items()]
+            slow = list(self._slow)
+            n_plus_one = list(self._n_plus_one)
+
+        endpoints.sort(key=lambda row: row['seconds'], reverse=True)
+        statements.sort(key=lambda row: row['ms'], reverse=True)
+        return {
+            'since': self._started,
+            'slow_query_ms': self.slow_query_seconds * 1000,
+            'n_plus_one_threshold': self.n_plus_one_threshold,
+            'endpoints': endpoints,
+            'statements': statements[:top],
+            'slow_queries': slow[::-1],
+            'n_plus_one': n_plus_one[::-1],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._statements.clear()
+            self._slow.clear()
+            self._n_plus_one.clear()
+            self._started = time.time()
+
+    def prometheus_lines(self):
+        """Metrics in the Prometheus text exposition format (one string per line)"""
+        with self._lock:
+            endpoints = {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
+
+        metrics = (
+            ('db_requests_total', 'counter', 'Requests that ran through the query collector', 'requests'),
+            ('db_queries_total', 'counter', 'SQL statements executed', 'queries'),
+            ('db_query_seconds_total', 'counter', 'Time spent executing and fetching SQL', 'seconds'),
+            ('db_query_rows_total', 'counter', 'Rows returned by SQL statements', 'rows'),
+            ('db_slow_queries_total', 'counter', 'Statements slower than the slow query threshold', 'slow'),
+            ('db_n_plus_one_total', 'counter', 'Requests repeating one statement from one call site', 'n_plus_one'),
+            ('db_request_queries_max', 'gauge', 'Most statements run by a single request', 'max_queries'),
+        )
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint in sorted(endpoints):
+                value = endpoints[endpoint][field]
+                lines.append(f'{name}{{endpoint="{escape_label(endpoint)}"}} {format_value(value)}')
+        return lines
+
+
+def escape_label(value):
+    """Label value escaped for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
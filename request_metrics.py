@@ -0,0 +1,258 @@
+# request_metrics.py
+"""
+In-process request metrics: latency and response size histograms per
+endpoint, method and status, requests in flight, unhandled exceptions, and
+upstream call timings (the exchange rate API).
+
+Counters live in per-thread shards. A thread only ever writes its own shard,
+so recording a request takes no lock: a dict lookup, a bisect over the
+bucket bounds and a few list increments. Readers (the /metrics route) sum
+the shards; totals read while another thread is writing may be off by that
+one request, which is fine for monitoring. Shards of threads that have
+exited are folded into a retired shard whenever a new thread registers its
+shard (and at read time), so a thread-per-request server keeps the shard list
+at about the number of live threads even if nothing reads the metrics.
+
+Quantiles (p50/p95/p99) are estimated from the histogram buckets by linear
+interpolation, the same way Prometheus' histogram_quantile() does.
+"""
+import bisect
+import threading
+import time
+
+from query_stats import escape_label
+
+# Seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-on-export histogram: per-bucket counts, sum and count"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for position, count in enumerate(other.counts):
+            self.counts[position] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """Estimated q-quantile (0..1), or None without observations"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.bounds[position - 1] if position > 0 else 0.0
+                if position == len(self.bounds):
+                    return lower  # +Inf bucket: the highest finite bound
+                return lower + (self.bounds[position] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class _Shard:
+    __slots__ = ('thread', 'requests', 'sizes', 'in_flight', 'exceptions', 'upstream')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.requests = {}    # (endpoint, method, status) -> latency Histogram
+        self.sizes = {}       # endpoint -> size Histogram
+        self.in_flight = 0
+        self.exceptions = {}  # endpoint -> count
+        self.upstream = {}    # (name, outcome) -> Histogram
+
+    def merge(self, other):
+        # The owning thread may add keys meanwhile; copying the items is atomic
+        for key, histogram in tuple(other.requests.items()):
+            self._histogram(self.requests, key, LATENCY_BUCKETS).merge(histogram)
+        for key, histogram in tuple(other.sizes.items()):
+            self._histogram(self.sizes, key, SIZE_BUCKETS).merge(histogram)
+        for key, histogram in tuple(other.upstream.items()):
+            self._histogram(self.upstream, key, UPSTREAM_BUCKETS).merge(histogram)
+        for key, count in tuple(other.exceptions.items()):
+            self.exceptions[key] = self.exceptions.get(key, 0) + count
+        self.in_flight += other.in_flight
+
+    @staticmethod
+    def _histogram(table, key, bounds):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(bounds)
+        return histogram
+
+
+class RequestMetrics:
+    """Registry of per-thread shards; see the module docstring"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()  # shard registration and reads only
+        self._started = time.time()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._retire_dead_shards()
+                self._shards.append(shard)
+        return shard
+
+    def _retire_dead_shards(self):
+        """Fold shards of exited threads into the retired shard; call with the lock held"""
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                self._retired.merge(shard)
+        self._shards = alive
+
+    # -- hot path -------------------------------------------------------------
+
+    def request_started(self):
+        self._shard().in_flight += 1
+        return time.perf_counter()
+
+    def request_finished(self, started, endpoint, method, status, size=None):
+        """Record one response; size is None for streamed bodies of unknown length"""
+        elapsed = time.perf_counter() - started
+        shard = self._shard()
+        endpoint = endpoint or '(unmatched)'
+        shard._histogram(shard.requests, (endpoint, method, status), LATENCY_BUCKETS).observe(elapsed)
+        if size is not None:
+            shard._histogram(shard.sizes, endpoint, SIZE_BUCKETS).observe(size)
+        return elapsed
+
+    def request_closed(self, endpoint=None, exception=False):
+        shard = self._shard()
+        shard.in_flight -= 1
+        if exception:
+            endpoint = endpoint or '(unmatched)'
+            shard.exceptions[endpoint] = shard.exceptions.get(endpoint, 0) + 1
+
+    def observe_upstream(self, name, seconds, ok):
+        shard = self._shard()
+        key = (name, 'success' if ok else 'failure')
+        shard._histogram(shard.upstream, key, UPSTREAM_BUCKETS).observe(seconds)
+
+    # -- reading --------------------------------------------------------------
+
+    def _merged(self):
+        total = _Shard(None)
+        with self._lock:
+            self._retire_dead_shards()
+            total.merge(self._retired)
+            for shard in self._shards:
+                total.merge(shard)
+        return total
+
+    def summary(self):
+        """Per-endpoint counts, error rate and estimated p50/p95/p99 in ms"""
+        merged = self._merged()
+        endpoints = {}
+        for (endpoint, method, status), histogram in merged.requests.items():
+            entry = endpoints.get(endpoint)
+            if entry is None:
+                entry = endpoints[endpoint] = {
+                    'endpoint': endpoint, 'requests': 0, 'errors': 0,
+                    'statuses': {}, 'latency': Histogram(LATENCY_BUCKETS),
+                }
+            entry['requests'] += histogram.count
+            if status >= 500:
+                entry['errors'] += histogram.count
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + histogram.count
+            entry['latency'].merge(histogram)
+
+        rows = []
+        for endpoint, entry in endpoints.items():
+            latency = entry.pop('latency')
+            sizes = merged.sizes.get(endpoint)
+            entry.update(
+                error_rate=entry['errors'] / entry['requests'] if entry['requests'] else 0.0,
+                exceptions=merged.exceptions.get(endpoint, 0),
+                avg_ms=latency.sum * 1000 / latency.count if latency.count else None,
+                **{f'p{int(q * 100)}_ms': _ms(latency.quantile(q)) for q in (0.5, 0.95, 0.99)},
+                avg_bytes=sizes.sum / sizes.count if sizes and sizes.count else None,
+            )
+            rows.append(entry)
+        rows.sort(key=lambda row: row['requests'], reverse=True)
+
+        upstream = [{
+            'name': name, 'outcome': outcome, 'calls': histogram.count,
+            'avg_ms': histogram.sum * 1000 / histogram.count if histogram.count else None,
+            'p95_ms': _ms(histogram.quantile(0.95)),
+        } for (name, outcome), histogram in sorted(merged.upstream.items())]
+
+        return {'since': self._started, 'in_flight': merged.in_flight,
+                'endpoints': rows, 'upstream': upstream}
+
+    def prometheus_lines(self):
+        """Metrics in the Prometheus text exposition format (one string per line)"""
+        merged = self._merged()
+        lines = [
+            '# HELP http_requests_in_flight Requests being handled',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight {merged.in_flight}',
+        ]
+        lines += _histogram_lines(
+            'http_request_duration_seconds', 'Time to build the response, by endpoint, method and status',
+            {(('endpoint', endpoint), ('method', method), ('status', status)): histogram
+             for (endpoint, method, status), histogram in merged.requests.items()})
+        lines += _histogram_lines(
+            'http_response_size_bytes', 'Response body size by endpoint (known lengths only)',
+            {(('endpoint', endpoint),): histogram for endpoint, histogram in merged.sizes.items()})
+        lines += ['# HELP http_request_exceptions_total Unhandled exceptions by endpoint',
+                  '# TYPE http_request_exceptions_total counter']
+        lines += [f'http_request_exceptions_total{_labels((("endpoint", endpoint),))} {count}'
+                  for endpoint, count in sorted(merged.exceptions.items())]
+        lines += _histogram_lines(
+            'upstream_request_duration_seconds', 'Calls to external services by name and outcome',
+            {(('upstream', name), ('outcome', outcome)): histogram
+             for (name, outcome), histogram in merged.upstream.items()})
+        return lines
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def _format_bound(bound):
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+def _histogram_lines(name, help_text, histograms):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels in sorted(histograms, key=lambda pairs: [str(value) for _, value in pairs]):
+        histogram = histograms[labels]
+        cumulative = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels + (("le", _format_bound(bound)),))} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+        lines.append(f'{name}_sum{_labels(labels)} {histogram.sum!r}')
+        lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+    return lines
@@ -0,0 +1,125 @@
+# row_mapper.py
+"""
+Compiled tuple -> dict mappers for the list routes.
+
+The routes read rows from plain tuple cursors and hand dicts to templates
+and jsonify(). Building each dict by hand, with a safe_decimal_to_float()
+call (isinstance checks and a try/except) per money column, made Python the
+slow part of every large listing.
+
+A RowMapper is declared once per query shape, next to its SELECT:
+
+    ORDER_ROW = RowMapper('order_id', 'customer_name', ('total_value', MONEY), ...)
+
+Fields are listed in select order; a bare name copies the column as is and
+(name, converter) converts it. The mapper generates the source of a single
+function that builds the dict with one literal, with the built-in converters
+inlined as expressions, and compiles it once (the same approach as
+collections.namedtuple). map_all() applies it with a list comprehension.
+Custom converters can be any callable taking the column value.
+
+Use None as the name to skip a column (e.g. a sort key selected for keyset
+pagination).
+"""
+
+
+class Converter:
+    """A column conversion inlined into the generated code as an expression over {v}"""
+
+    def __init__(self, name, expression):
+        self.name = name
+        self.expression = expression
+
+    def __repr__(self):
+        return f'<Converter {self.name}>'
+
+
+# Numeric column as float; NULL becomes 0.0 (what safe_decimal_to_float returned)
+MONEY = Converter('MONEY', '(0.0 if {v} is None else float({v}))')
+
+# Numeric column as float, keeping NULL as None
+FLOAT = Converter('FLOAT', '(None if {v} is None else float({v}))')
+
+# date/datetime as an ISO string for JSON; NULL (and legacy zero dates) as None
+ISO = Converter('ISO', '({v}.isoformat() if {v} else None)')
+
+# Empty string instead of NULL, for optional text shown in templates
+TEXT = Converter('TEXT', "({v} or '')")
+
+
+def default(fallback):
+    """The column, or fallback when it is NULL or empty (e.g. 'Unknown Customer')"""
+    literal = repr(fallback).replace('{', '{{').replace('}', '}}')
+    return Converter(f'default({fallback!r})', f'({{v}} or {literal})')
+
+
+class RowMapper:
+    """
+    Maps rows (tuples in select order) to dicts.
+
+    Calling the mapper converts one row; map_all() converts a list of rows.
+    map_lists() converts rows to lists in the order of names, for compact
+    (columnar) responses that send the keys once.
+    """
+
+    def __init__(self, *fields):
+        self.fields = []
+        names = set()
+        for field in fields:
+            name, converter = (field, None) if isinstance(field, str) or field is None else field
+            if name is not None:
+                if name in names:
+                    raise ValueError(f'Duplicate field name {name!r}')
+                names.add(name)
+            self.fields.append((name, converter))
+        self.width = len(self.fields)
+        self.source, self._map, self._map_list = self._compile()
+
+    @property
+    def names(self):
+        return [name for name, _ in self.fields if name is not None]
+
+    def _compile(self):
+        namespace = {}
+        items = []
+        for index, (name, converter) in enumerate(self.fields):
+            if name is None:
+                continue
+            value = f'row[{index}]'
+            if converter is None:
+                expression = value
+            elif isinstance(converter, Converter):
+                expression = converter.expression.format(v=value)
+            elif callable(converter):
+                helper = f'_convert_{index}'
+                namespace[helper] = converter
+                expression = f'{helper}({value})'
+            else:
+                raise TypeError(f'Converter for {name!r} must be a Converter or a callable')
+            items.append((name, expression))
+
+        source = (
+            'def map_row(row):\n'
+            '    return {' + ', '.join(f'{name!r}: {expression}' for name, expression in items) + '}\n'
+            '\n'
+            'def map_list(row):\n'
+            '    return [' + ', '.join(expression for _, expression in items) + ']\n'
+        )
+        exec(compile(source, f'<RowMapper {", ".join(self.names)}>', 'exec'), namespace)
+        return source, namespace['map_row'], namespace['map_list']
+
+    def __call__(self, row):
+        return self._map(row)
+
+    def map_all(self, rows):
+        """List of dicts for rows (any iterable of tuples)"""
+        map_row = self._map
+        return [map_row(row) for row in rows]
+
+    def map_lists(self, rows):
+        """List of value lists for rows, in the order of names"""
+        map_list = self._map_list
+        return [map_list(row) for row in rows]
+
+    def __repr__(self):
+        return f'RowMapper({", ".join(self.names)})'
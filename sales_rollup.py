@@ -0,0 +1,141 @@
+# sales_rollup.py
+"""
+Pre-aggregated sales for the reports page.
+
+sales_rollup holds one row per (month, customer, asset) with the order count
+and revenue of the matching orders, so the monthly sales chart and the top
+books/customers tables read a table that grows with months x customers x
+assets instead of re-aggregating every order on each visit.
+
+Every route that writes orders keeps it in step inside the same transaction:
+subtract_orders() before an UPDATE or DELETE, add_orders() after an INSERT
+or UPDATE. Both take a WHERE fragment over orders, so one statement covers a
+single order or a batch. Orders without an order date roll up under month ''
+and missing customer/asset names under '' (key columns can't be NULL).
+
+Migration 0005 creates the table and fills it. rebuild_sales_rollup() and
+verify_sales_rollup() back the `flask --app app rollup rebuild|verify`
+commands.
+"""
+
+CREATE_SALES_ROLLUP_SQL = """
+    CREATE TABLE IF NOT EXISTS sales_rollup (
+        month CHAR(7) NOT NULL,
+        customer_name VARCHAR(100) NOT NULL,
+        asset_name VARCHAR(200) NOT NULL,
+        order_count INT NOT NULL DEFAULT 0,
+        revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+        priced_orders INT NOT NULL DEFAULT 0,
+        priced_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+        asset_orders INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (month, customer_name, asset_name),
+        KEY idx_sales_rollup_customer (customer_name),
+        KEY idx_sales_rollup_asset (asset_name),
+        KEY idx_sales_rollup_order_count (order_count)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3
+"""
+
+ROLLUP_FIELDS = ('order_count', 'revenue', 'priced_orders', 'priced_revenue', 'asset_orders')
+
+# Rollup rows for the orders matched by {where}, multiplied by {sign} (1 or -1)
+ROLLUP_SELECT_SQL = """
+    SELECT COALESCE(DATE_FORMAT(order_date, '%Y-%m'), '') AS month,
+        COALESCE(customer_name, '') AS customer_name,
+        COALESCE(asset_name, '') AS asset_name,
+        {sign} * COUNT(*) AS order_count,
+        {sign} * COALESCE(SUM(total_value), 0) AS revenue,
+        {sign} * COALESCE(SUM(total_value > 0), 0) AS priced_orders,
+        {sign} * COALESCE(SUM(CASE WHEN total_value > 0 THEN total_value ELSE 0 END), 0) AS priced_revenue,
+        {sign} * SUM(asset_code IS NOT NULL) AS asset_orders
+    FROM orders
+    {where}
+    GROUP BY 1, 2, 3
+"""
+
+
+def _apply(cursor, sign, where_sql, params):
+    select_sql = ROLLUP_SELECT_SQL.format(sign=sign, where=f'WHERE {where_sql}')
+    # A grouped SELECT has to be wrapped in a derived table to be used with
+    # ON DUPLICATE KEY UPDATE; targets are qualified to avoid clashing with it
+    cursor.execute(f"""
+        INSERT INTO sales_rollup (month, customer_name, asset_name, {', '.join(ROLLUP_FIELDS)})
+        SELECT * FROM ({select_sql}) AS changed
+        ON DUPLICATE KEY UPDATE
+            {', '.join(f'{field} = sales_rollup.{field} + VALUES({field})' for field in ROLLUP_FIELDS)}
+    """, list(params))
+
+
+def add_orders(cursor, where_sql, params=()):
+    """
+    Add the orders matched by where_sql to the rollup.
+
+    Call after the INSERT or UPDATE, in the same transaction.
+    """
+    _apply(cursor, 1, where_sql, params)
+
+
+def subtract_orders(cursor, where_sql, params=()):
+    """
+    Take the orders matched by where_sql out of the rollup.
+
+    Call before the UPDATE or DELETE, in the same transaction. The orders are
+    locked first so nobody can change them between here and the write.
+    """
+    cursor.execute(f"SELECT order_id FROM orders WHERE {where_sql} FOR UPDATE", list(params))
+    cursor.fetchall()
+    _apply(cursor, -1, where_sql, params)
+    cursor.execute("DELETE FROM sales_rollup WHERE order_count <= 0")
+
+
+def fill_sales_rollup(cursor):
+    """Replace the rollup with fresh totals from orders. Returns the number of rollup rows."""
+    cursor.execute("DELETE FROM sales_rollup")
+    cursor.execute(f"""
+        INSERT INTO sales_rollup (month, customer_name, asset_name, {', '.join(ROLLUP_FIELDS)})
+        {ROLLUP_SELECT_SQL.format(sign=1, where='')}
+    """)
+    return cursor.rowcount
+
+
+def rebuild_sales_rollup(conn):
+    """Recompute the rollup from orders. Returns the number of rollup rows."""
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        rebuilt = fill_sales_rollup(cursor)
+        conn.commit()
+        return rebuilt
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def verify_sales_rollup(conn):
+    """
+    Compare sales_rollup with orders.
+
+    Returns a list of ((month, customer, asset), field, expected, stored) for
+    every difference.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(ROLLUP_SELECT_SQL.format(sign=1, where=''))
+        expected = {tuple(row[:3]): row[3:] for row in cursor.fetchall()}
+
+        cursor.execute(f"SELECT month, customer_name, asset_name, {', '.join(ROLLUP_FIELDS)} FROM sales_rollup")
+        stored = {tuple(row[:3]): row[3:] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+    empty = (0,) * len(ROLLUP_FIELDS)
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, empty)
+        have = stored.get(key, empty)
+        for field, want_value, have_value in zip(ROLLUP_FIELDS, want, have):
+            if want_value != have_value:
+                mismatches.append((key, field, want_value, have_value))
+    return mismatches
@@ -0,0 +1,241 @@
+# schema_migrations.py
+"""
+Versioned schema migrations for the tables the app does not create itself.
+
+Migrations are Python files in migrations/ named NNNN_description.py, applied
+in version order. Each defines upgrade(cursor) and, optionally, EXPLAIN_CHECKS:
+(description, sql, expected_index) tuples naming the index a hot query should
+use once the migration is in. sql may also be a (sql, params) pair, so a check
+can use the same builder and placeholders as the app.
+
+MySQL commits DDL implicitly, so a migration cannot be rolled back halfway;
+instead every step must be idempotent (add_index() and drop_index() below
+check information_schema first), and a migration that failed midway is simply
+run again. Applied versions are recorded in schema_migrations together with a
+checksum of the file, so status() can flag a migration edited after it ran.
+
+migrate() takes a named lock (GET_LOCK), so several hosts deploying at once
+apply each migration exactly once. Migrations are forward-only. status() only
+reads, so the app can check the schema without running any DDL.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import time
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_LOCK = 'schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 60
+
+CREATE_SCHEMA_MIGRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT UNSIGNED NOT NULL,
+        name VARCHAR(200) NOT NULL,
+        checksum CHAR(40) NOT NULL,
+        duration_ms INT UNSIGNED NOT NULL DEFAULT 0,
+        applied_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (version)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3
+"""
+
+_FILE_RE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+
+class MigrationError(Exception):
+    """Raised for a broken migrations directory or when the lock is not acquired"""
+
+
+class Migration:
+    """One migrations/NNNN_name.py file; the module is loaded on first use"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self._module = None
+        with open(path, 'rb') as f:
+            self.checksum = hashlib.sha1(f.read()).hexdigest()
+
+    def __repr__(self):
+        return f'<Migration {self.version:04d}_{self.name}>'
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(
+                f'migration_{self.version:04d}_{self.name}', self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            if not callable(getattr(module, 'upgrade', None)):
+                raise MigrationError(f'{self.path} does not define upgrade(cursor)')
+            self._module = module
+        return self._module
+
+    @property
+    def description(self):
+        doc = self.module.__doc__ or self.name.replace('_', ' ')
+        return doc.strip().split('\n')[0]
+
+    @property
+    def explain_checks(self):
+        return tuple(getattr(self.module, 'EXPLAIN_CHECKS', ()))
+
+    def upgrade(self, cursor):
+        self.module.upgrade(cursor)
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Migrations found in directory, sorted by version"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = _FILE_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f'Duplicate migration version {version:04d}: {filename}')
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+# Idempotent DDL helpers for migration files
+
+def index_columns(cursor, table, index):
+    """Columns of index on table in order, or [] if it does not exist"""
+    cursor.execute("""
+        SELECT column_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        ORDER BY seq_in_index
+    """, (table, index))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def add_index(cursor, table, index, columns):
+    """Create index on table(columns) unless it already exists with those columns"""
+    columns = list(columns)
+    existing = index_columns(cursor, table, index)
+    if [column.lower() for column in existing] == [column.lower() for column in columns]:
+        return False
+    if existing:
+        drop_index(cursor, table, index)
+    column_list = ', '.join(f'`{column}`' for column in columns)
+    # Online DDL: reads and writes continue while the index is built
+    cursor.execute(f"ALTER TABLE `{table}` ADD INDEX `{index}` ({column_list}), "
+                   f"ALGORITHM=INPLACE, LOCK=NONE")
+    return True
+
+
+def drop_index(cursor, table, index):
+    """Drop index from table if it exists"""
+    if not index_columns(cursor, table, index):
+        return False
+    cursor.execute(f"ALTER TABLE `{table}` DROP INDEX `{index}`, ALGORITHM=INPLACE, LOCK=NONE")
+    return True
+
+
+# Applying and inspecting
+
+def applied_migrations(cursor, create=True):
+    """
+    {version: (name, checksum, applied_at)} of the migrations recorded as
+    applied. With create=False a missing schema_migrations table means none.
+    """
+    if create:
+        cursor.execute(CREATE_SCHEMA_MIGRATIONS_SQL)
+    else:
+        cursor.execute("""
+            SELECT 1 FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'schema_migrations'
+        """)
+        if not cursor.fetchall():
+            return {}
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+    return {int(row[0]): tuple(row[1:]) for row in cursor.fetchall()}
+
+
+def migrate(conn, directory=MIGRATIONS_DIR, target=None, echo=None):
+    """
+    Apply pending migrations up to target (all by default); returns the ones
+    applied. Progress goes to echo(text) if given (e.g. click.echo), else the log.
+    """
+    echo = echo or log.info
+    migrations = [migration for migration in discover(directory)
+                  if target is None or migration.version <= target]
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise MigrationError(f'Could not acquire the {MIGRATION_LOCK} lock '
+                                 f'within {MIGRATION_LOCK_TIMEOUT}s')
+        try:
+            # Read under the lock: another worker may have just applied some
+            applied = applied_migrations(cursor)
+            done = []
+            for migration in migrations:
+                if migration.version in applied:
+                    continue
+                echo(f'Applying migration {migration.version:04d}_{migration.name}: {migration.description}')
+                started = time.perf_counter()
+                migration.upgrade(cursor)
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                cursor.execute("""
+                    INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                    VALUES (%s, %s, %s, %s)
+                """, (migration.version, migration.name, migration.checksum, duration_ms))
+                conn.commit()
+                done.append(migration)
+            return done
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def status(conn, directory=MIGRATIONS_DIR):
+    """(migration, state, applied_at) per migration; state is applied, pending or changed"""
+    cursor = conn.cursor()
+    try:
+        applied = applied_migrations(cursor, create=False)
+    finally:
+        cursor.close()
+    rows = []
+    for migration in discover(directory):
+        record = applied.get(migration.version)
+        if record is None:
+            rows.append((migration, 'pending', None))
+        elif record[1] != migration.checksum:
+            rows.append((migration, 'changed', record[2]))
+        else:
+            rows.append((migration, 'applied', record[2]))
+    return rows
+
+
+def explain_keys(cursor, sql):
+    """Index names MySQL picks for sql (a string or a (sql, params) pair), one per table in the plan"""
+    sql, params = sql if isinstance(sql, tuple) else (sql, ())
+    cursor.execute(f"EXPLAIN {sql}", tuple(params))
+    columns = [column[0] for column in cursor.description]
+    key_position = columns.index('key')
+    return [row[key_position] for row in cursor.fetchall()]
+
+
+def check_plans(conn, directory=MIGRATIONS_DIR):
+    """
+    Run the EXPLAIN_CHECKS of every migration; returns
+    (migration, description, expected_index, used_indexes, ok) tuples.
+    """
+    results = []
+    cursor = conn.cursor()
+    try:
+        for migration in discover(directory):
+            for description, sql, expected in migration.explain_checks:
+                keys = explain_keys(cursor, sql)
+                results.append((migration, description, expected, keys, expected in keys))
+    finally:
+        cursor.close()
+    return results
@@ -0,0 +1,267 @@
+# search_index.py
+"""
+In-process inverted index behind /search and /api/search.
+
+Text is normalized before indexing and querying: accents are folded for
+Latin script (São Paulo -> sao paulo), katakana is folded to hiragana and
+full/half-width forms are unified (NFKC). Latin text is indexed by word;
+Japanese/Chinese runs, which have no spaces, are indexed as single
+characters plus character bigrams so any substring of two or more
+characters can be found.
+
+Query terms match exactly, by prefix (search as you type) or, for Latin
+words of four or more letters, within a small edit distance (typos). A
+document has to match every query term; results are ranked by the sum of
+term scores weighted by field.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+log = logging.getLogger(__name__)
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.7
+FUZZY_SCORE = 0.5
+
+# Cap on vocabulary terms a single prefix or typo can expand to
+MAX_EXPANSIONS = 200
+
+_WORD_RE = re.compile(r'\w+')
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_DIGIT_GROUPS_RE = re.compile(r'\d+')
+
+
+def normalize(text):
+    """Casefold, fold Latin accents and katakana, unify character widths"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    out = []
+    for ch in text:
+        code = ord(ch)
+        if 0x7f < code < 0x250:
+            decomposed = unicodedata.normalize('NFKD', ch)
+            out.append(''.join(c for c in decomposed if not unicodedata.combining(c)))
+        elif 0x30a1 <= code <= 0x30f6:
+            out.append(chr(code - 0x60))
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def _split_word(word):
+    """Yield (token, is_cjk) for a \\w+ run, splitting CJK runs out of it"""
+    pos = 0
+    for match in _CJK_RE.finditer(word):
+        if match.start() > pos:
+            yield word[pos:match.start()], False
+        yield match.group(), True
+        pos = match.end()
+    if pos < len(word):
+        yield word[pos:], False
+
+
+def index_tokens(text):
+    """Tokens stored for a field value"""
+    if not text:
+        return []
+    text = normalize(str(text))
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        for part, is_cjk in _split_word(word):
+            if is_cjk:
+                tokens.extend(part)
+                tokens.extend(part[i:i + 2] for i in range(len(part) - 1))
+            else:
+                tokens.append(part)
+    # Phone numbers are typed with or without separators
+    digit_groups = _DIGIT_GROUPS_RE.findall(text)
+    if len(digit_groups) > 1:
+        tokens.append(''.join(digit_groups))
+    return tokens
+
+
+def query_terms(query):
+    """Terms a query must match: (term, is_cjk)"""
+    terms = []
+    for word in _WORD_RE.findall(normalize(query)):
+        for part, is_cjk in _split_word(word):
+            if is_cjk and len(part) > 1:
+                terms.extend((part[i:i + 2], True) for i in range(len(part) - 1))
+            else:
+                terms.append((part, is_cjk))
+    return terms
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance with adjacent transpositions, or limit + 1 if larger"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        best = current[0]
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            best = min(best, value)
+        if best > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Immutable index over a list of result rows.
+
+    field_weights maps a column index in each row to the weight of matches
+    in that column. Rows keep their input order as the tie-breaker, so pass
+    them in the order results should appear for equal scores.
+    """
+
+    def __init__(self, rows, field_weights):
+        self.rows = list(rows)
+        self.postings = {}  # token -> {row position: weight}
+        for position, row in enumerate(self.rows):
+            for column, weight in field_weights.items():
+                for token in index_tokens(row[column]):
+                    docs = self.postings.setdefault(token, {})
+                    if docs.get(position, 0) < weight:
+                        docs[position] = weight
+        self.vocabulary = sorted(self.postings)
+
+        # Latin vocabulary by trigram, for typo candidates
+        self.trigram_index = {}
+        for token in self.vocabulary:
+            if len(token) >= 3 and not _CJK_RE.match(token):
+                for gram in _trigrams(token):
+                    self.trigram_index.setdefault(gram, []).append(token)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _prefix_terms(self, term):
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term + '\uffff')
+        return self.vocabulary[start:min(end, start + MAX_EXPANSIONS)]
+
+    def _fuzzy_terms(self, term):
+        limit = 1 if len(term) < 8 else 2
+        candidates = {}
+        for gram in _trigrams(term):
+            for token in self.trigram_index.get(gram, ()):
+                candidates[token] = candidates.get(token, 0) + 1
+        best = sorted(candidates, key=candidates.get, reverse=True)[:MAX_EXPANSIONS]
+        return [token for token in best if edit_distance(term, token, limit) <= limit]
+
+    def _term_scores(self, term, is_cjk):
+        """{row position: score} for one query term"""
+        scores = {}
+
+        def add(token, factor):
+            for position, weight in self.postings.get(token, {}).items():
+                score = weight * factor
+                if scores.get(position, 0) < score:
+                    scores[position] = score
+
+        add(term, EXACT_SCORE)
+        for token in self._prefix_terms(term):
+            if token != term:
+                add(token, PREFIX_SCORE)
+        if not scores and not is_cjk and len(term) >= 4:
+            for token in self._fuzzy_terms(term):
+                add(token, FUZZY_SCORE)
+        return scores
+
+    def search(self, query, limit=20):
+        """Return up to limit (row, score) pairs, best first"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        totals = None
+        for term, is_cjk in terms:
+            scores = self._term_scores(term, is_cjk)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {position: totals[position] + score
+                          for position, score in scores.items() if position in totals}
+            if not totals:
+                return []
+
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(self.rows[position], round(score, 3)) for position, score in ranked]
+
+
+class RefreshingIndex:
+    """
+    Holder that keeps a SearchIndex in step with its table.
+
+    load_rows() returns the rows to index. mark_stale() is called after
+    writes; the next get() still answers from the current index and rebuilds
+    it on a background thread, so queries never wait for a rebuild (only the
+    very first one does). max_age bounds staleness for writes made by other
+    worker processes.
+    """
+
+    def __init__(self, load_rows, field_weights, max_age=300):
+        self.load_rows = load_rows
+        self.field_weights = field_weights
+        self.max_age = float(max_age)
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0.0
+        self._generation = 0
+        self._built_generation = -1
+        self._rebuilding = False
+
+    def mark_stale(self):
+        with self._lock:
+            self._generation += 1
+
+    def _build(self):
+        with self._lock:
+            generation = self._generation
+        index = SearchIndex(self.load_rows(), self.field_weights)
+        with self._lock:
+            self._index = index
+            self._built_at = time.monotonic()
+            self._built_generation = generation
+        return index
+
+    def _rebuild_in_background(self):
+        try:
+            self._build()
+        except Exception as e:
+            log.exception("Search index rebuild failed: %s", e)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def get(self):
+        with self._lock:
+            index = self._index
+            stale = (self._built_generation != self._generation
+                     or time.monotonic() - self._built_at > self.max_age)
+            start_rebuild = index is not None and stale and not self._rebuilding
+            if start_rebuild:
+                self._rebuilding = True
+
+        if index is None:
+            return self._build()
+        if start_rebuild:
+            threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+        return index
@@ -1,8 +1,8 @@
 // Calculator JavaScript - calculator.js
 class Calculator {
     constructor() {
-        this.customers = [];
-        this.assets = [];
+        this.typeaheadResults = {};
+        this.typeaheadRequests = {};
         this.currentResult = null;
         this.isEditingProfit = false;
         this.initialized = false;
@@ -107,64 +107,10 @@ class Calculator {
     }
 
     async loadData() {
-        console.log('📊 Loading data from APIs...');
-        
-        try {
-            // Load customers
-            console.log('🔍 Fetching customers...');
-            const customersResponse = await fetch('/api/customers');
-            console.log('📡 Customers response status:', customersResponse.status);
-            
-            if (customersResponse.ok) {
-                const customersData = await customersResponse.json();
-                console.log('📝 Customers data:', customersData);
-                
-                if (customersData.success && customersData.customers) {
-                    this.customers = customersData.customers;
-                    console.log('✅ Loaded customers:', this.customers.length, this.customers);
-                } else {
-                    console.warn('⚠️ No customers data or unsuccessful response');
-                    this.customers = [];
-                }
-            } else {
-                console.error('❌ Failed to load customers, status:', customersResponse.status);
-                const errorText = await customersResponse.text();
-                console.error('❌ Error details:', errorText);
-            }
-
-            // Load assets
-            // Load assets
-            console.log('🔍 Fetching assets...');
-            const assetsResponse = await fetch('/api/assets');
-            console.log('📡 Assets response status:', assetsResponse.status);
-
-            if (assetsResponse.ok) {
-                const assetsData = await assetsResponse.json();
-                console.log('📝 Assets data:', assetsData);
-                
-                if (assetsData.success && assetsData.assets) {
-                    // Store the full asset objects for price lookup
-                    this.assetsWithPrices = assetsData.assets;
-                    // Extract just the names for the dropdown
-                    this.assets = assetsData.assets.map(asset => asset.name);
-                    console.log('✅ Loaded assets:', this.assets.length, this.assets);
-                } else {
-                    console.warn('⚠️ No assets data or unsuccessful response');
-                    this.assets = [];
-                    this.assetsWithPrices = [];
-                }
-            } else {
-                console.error('❌ Failed to load assets, status:', assetsResponse.status);
-                const errorText = await assetsResponse.text();
-                console.error('❌ Error details:', errorText);
-            }
-            
-            console.log('📊 Data loading completed. Customers:', this.customers.length, 'Assets:', this.assets.length);
-            
-        } catch (error) {
-            console.error('❌ Error loading data:', error);
-            this.showError('Failed to load customer and book data: ' + error.message);
-        }
+        // Customers and books are no longer downloaded in full: the comboboxes
+        // ask /api/typeahead for the top matches as the user types
+        this.typeaheadResults = {};
+        this.typeaheadRequests = {};
     }
 
     initializeComboboxes() {
@@ -178,15 +124,12 @@ class Calculator {
             return;
         }
         
-        console.log('📋 Customers for combobox:', this.customers);
-        console.log('📚 Assets for combobox:', this.assets);
-        
-        this.setupCombobox('customer-name', this.customers, 'Add New Customer');
-        this.setupCombobox('book-title', this.assets, 'Add New Asset');
+        this.setupCombobox('customer-name', 'customers', 'Add New Customer');
+        this.setupCombobox('book-title', 'books', 'Add New Asset');
     }
 
-    setupCombobox(inputId, dataArray, addNewText) {
-        console.log(`🔧 Setting up combobox for ${inputId} with ${dataArray.length} items`);
+    setupCombobox(inputId, type, addNewText) {
+        console.log(`🔧 Setting up ${type} combobox for ${inputId}`);
         
         const input = document.getElementById(inputId);
         if (!input) {
@@ -194,8 +137,6 @@ class Calculator {
             return;
         }
     
-        console.log(`✅ Found input element:`, input);
-    
         const container = input.parentElement;
         
         const existingDropdown = container.querySelector('.combobox-dropdown');
@@ -208,28 +149,19 @@ class Calculator {
         dropdown.style.display = 'none';
         container.appendChild(dropdown);
     
-        console.log(`✅ Created dropdown for ${inputId}`);
-    
         const newInput = input.cloneNode(true);
         input.parentNode.replaceChild(newInput, input);
     
-        newInput.addEventListener('input', (e) => {
-            console.log(`📝 Input event on ${inputId}:`, e.target.value);
-            this.filterDropdown(newInput, dropdown, dataArray, addNewText);
-            
-            // Auto-populate price if this is the book title input
-            if (inputId === 'book-title') {
-                this.autoPopulateBookPrice(e.target.value);
-            }
-        });
-    
-        newInput.addEventListener('focus', (e) => {
-            console.log(`🎯 Focus event on ${inputId}`);
-            this.filterDropdown(newInput, dropdown, dataArray, addNewText);
-        });
+        let debounceTimer = null;
+        const lookup = () => {
+            clearTimeout(debounceTimer);
+            debounceTimer = setTimeout(() => this.typeahead(newInput, dropdown, type, addNewText), 120);
+        };
+
+        newInput.addEventListener('input', lookup);
+        newInput.addEventListener('focus', lookup);
     
         newInput.addEventListener('blur', (e) => {
-            console.log(`👋 Blur event on ${inputId}`);
             setTimeout(() => {
                 dropdown.style.display = 'none';
             }, 200);
@@ -242,10 +174,43 @@ class Calculator {
         });
     }
 
+    async typeahead(input, dropdown, type, addNewText) {
+        const query = input.value.trim();
+        // Responses can arrive out of order; only the latest request is rendered
+        const requestId = (this.typeaheadRequests[type] || 0) + 1;
+        this.typeaheadRequests[type] = requestId;
+
+        let items = [];
+        if (query) {
+            try {
+                const params = new URLSearchParams({ type: type, q: query, limit: 10 });
+                const response = await fetch(`/api/typeahead?${params}`);
+                const data = await response.json();
+                if (data.success) {
+                    items = data.results;
+                } else {
+                    console.warn(`⚠️ Typeahead ${type} failed:`, data.error);
+                }
+            } catch (error) {
+                console.error(`❌ Typeahead ${type} error:`, error);
+            }
+        }
+
+        if (this.typeaheadRequests[type] !== requestId) return;
+        this.typeaheadResults[type] = items;
+        this.filterDropdown(input, dropdown, items, addNewText);
+
+        // Auto-populate price if this is the book title input
+        if (type === 'books') {
+            this.autoPopulateBookPrice(input.value);
+        }
+    }
+
     autoPopulateBookPrice(bookTitle) {
-        if (!this.assetsWithPrices || !bookTitle) return;
+        const books = (this.typeaheadResults && this.typeaheadResults.books) || [];
+        if (!bookTitle) return;
         
-        const matchingAsset = this.assetsWithPrices.find(asset => 
+        const matchingAsset = books.find(asset => 
             asset.name.toLowerCase() === bookTitle.toLowerCase()
         );
         
@@ -261,30 +226,23 @@ class Calculator {
     }
 
 
-    filterDropdown(input, dropdown, dataArray, addNewText) {
-        const value = input.value.toLowerCase();
-        console.log(`🔍 Filtering dropdown with value: "${value}" from ${dataArray.length} items`);
-        
-        const filtered = dataArray.filter(item => 
-            item.toLowerCase().includes(value)
-        );
-
-        console.log(`📋 Filtered results: ${filtered.length} items`, filtered);
+    filterDropdown(input, dropdown, items, addNewText) {
+        const value = input.value.trim().toLowerCase();
 
         dropdown.innerHTML = '';
 
-        filtered.slice(0, 10).forEach(item => {
+        items.forEach(item => {
             const option = document.createElement('div');
             option.className = 'combobox-option';
-            option.textContent = item;
+            option.textContent = item.name;
             option.addEventListener('click', () => {
-                console.log(`👆 Selected item: ${item}`);
-                input.value = item;
+                console.log(`👆 Selected item: ${item.name}`);
+                input.value = item.name;
                 dropdown.style.display = 'none';
                 
                 // Auto-populate price if this is the book title input
                 if (input.id === 'book-title') {
-                    this.autoPopulateBookPrice(item);
+                    this.autoPopulateBookPrice(item.name);
                 }
                 
                 this.validateForm();
@@ -292,7 +250,7 @@ class Calculator {
             dropdown.appendChild(option);
         });
 
-        if (value && !dataArray.some(item => item.toLowerCase() === value)) {
+        if (value && !items.some(item => item.name.toLowerCase() === value)) {
             const addOption = document.createElement('div');
             addOption.className = 'combobox-option add-new';
             addOption.innerHTML = `<i class="fas fa-plus me-2"></i>${addNewText}: "${input.value}"`;
@@ -304,8 +262,7 @@ class Calculator {
             dropdown.appendChild(addOption);
         }
 
-        dropdown.style.display = filtered.length > 0 || value ? 'block' : 'none';
-        console.log(`👁️ Dropdown display: ${dropdown.style.display}`);
+        dropdown.style.display = items.length > 0 || value ? 'block' : 'none';
     }
 
     setupEventListeners() {
@@ -657,7 +614,7 @@ class Calculator {
                 </div>
             </div>
             <div class="exchange-info">
-                Exchange rate: 1 BRL = ${result.exchange_rate} JPY (${result.rate_source})
+                Exchange rate: 1 BRL = ${result.exchange_rate} JPY (${result.rate_source}${result.rate_stale ? `, last known good${result.rate_as_of ? ' ' + result.rate_as_of.replace('T', ' ') : ''}` : ''})
             </div>
         `;
 
@@ -0,0 +1,56 @@
+# table_versions.py
+"""
+Shared change counters per table, for conditional GETs on lookup lists.
+
+table_versions holds one row per table with a counter that every write to
+customers or assets bumps in its own transaction, right after the INSERT,
+UPDATE or DELETE. The new version becomes visible exactly when the write
+commits and disappears with it on rollback, so an ETag built from it can
+never outlive the data it describes. Being in the database, the counter is
+the same for every worker process, so an ETag is valid whichever worker
+answers the revalidation.
+
+Reading the versions is a primary-key lookup of a few rows, so a client
+revalidating an unchanged /api/customers or /api/assets costs one tiny query
+and an empty 304. Writes that bypass the app (manual SQL, restores) don't
+bump the counter; run `flask --app app versions bump` after them. The table
+is created by migration 0006.
+"""
+
+CREATE_TABLE_VERSIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name VARCHAR(64) NOT NULL,
+        version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (table_name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb3
+"""
+
+
+def get_table_versions(cursor, tables):
+    """{table: version} for tables; 0 for a table never written through the app"""
+    tables = tuple(tables)
+    cursor.execute(f"""
+        SELECT table_name, version FROM table_versions
+        WHERE table_name IN ({', '.join(['%s'] * len(tables))})
+    """, tables)
+    versions = dict.fromkeys(tables, 0)
+    versions.update({name: int(version) for name, version in cursor.fetchall()})
+    return versions
+
+
+def bump_table_versions(cursor, tables):
+    """
+    Increment the counters of tables as part of the caller's transaction.
+
+    Call it next to the write, before the caller commits; the row lock on
+    the counter is held until then, so concurrent writers bump in turn.
+    """
+    tables = tuple(sorted(set(tables)))
+    if not tables:
+        return
+    cursor.execute(f"""
+        INSERT INTO table_versions (table_name, version)
+        VALUES {', '.join(['(%s, 1)'] * len(tables))}
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, tables)
@@ -0,0 +1,52 @@
+# tests/test_migration_plans.py
+"""
+EXPLAIN the migrations' EXPLAIN_CHECKS against a test database and fail when
+a hot query doesn't use the index its migration added.
+
+Needs a MySQL database with realistic row counts, since the optimizer picks
+plans from table statistics; build one with benchmarks/generate_data.py and
+point TEST_DB_NAME at it (DB_HOST / DB_USER / DB_PASS as for the app). The
+pending migrations are applied first. Skipped when TEST_DB_NAME is not set.
+
+    TEST_DB_NAME=clubinho_bench python -m pytest tests/test_migration_plans.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_migrations import discover, explain_keys, migrate  # noqa: E402
+
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+
+CHECKS = [pytest.param(sql, expected, id=f'{migration.version:04d} {description}')
+          for migration in discover()
+          for description, sql, expected in migration.explain_checks]
+
+
+@pytest.fixture(scope='module')
+def conn():
+    if not TEST_DB_NAME:
+        pytest.skip('TEST_DB_NAME is not set')
+    mysql_connector = pytest.importorskip('mysql.connector')
+    conn = mysql_connector.connect(host=os.getenv('DB_HOST', '127.0.0.1'),
+                                   user=os.getenv('DB_USER', 'root'),
+                                   password=os.getenv('DB_PASS', 'secret'),
+                                   database=TEST_DB_NAME)
+    try:
+        migrate(conn)
+        yield conn
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('sql, expected', CHECKS)
+def test_query_uses_migrated_index(conn, sql, expected):
+    cursor = conn.cursor()
+    try:
+        keys = explain_keys(cursor, sql)
+    finally:
+        cursor.close()
+    assert expected in keys, f'plan uses {keys}, expected {expected}'
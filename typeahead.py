@@ -0,0 +1,238 @@
+# typeahead.py
+"""
+Prefix (search-as-you-type) lookups for customer names and book titles.
+
+PrefixIndex keeps two sorted key lists: the whole normalized name, and the
+name from each later word start (every character inside Japanese/Chinese
+runs, which have no spaces). A query is two bisects plus a scan of at most
+a few entries, so answering takes microseconds however large the catalog
+is. Names that start with the query come first, then names with a word that
+does, each alphabetically. Normalization is search_index.normalize(), so
+"sao" finds "São Paulo" and katakana matches hiragana.
+
+TypeaheadIndex keeps a PrefixIndex in step with its table incrementally:
+after mark_stale() (called from mark_tables_changed) or max_age, the next
+lookup re-reads only the rows whose updated_at moved, and compares the row
+count and an id checksum (BIT_XOR) to notice deletes, which trigger a full
+reload.
+"""
+import bisect
+import re
+import threading
+import time
+
+from search_index import normalize
+
+_WORD_START_RE = re.compile(r'(?<!\w)\w')
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿豈-﫿]')
+
+# Rows changed this many seconds before the last sync are read again, so a
+# write committed a moment after its updated_at was stamped is not missed
+SYNC_OVERLAP = 60
+
+
+def word_starts(key):
+    """Positions in a normalized name a query may match from (0 excluded)"""
+    starts = {match.start() for match in _WORD_START_RE.finditer(key)}
+    starts.update(match.start() for match in _CJK_RE.finditer(key))
+    starts.discard(0)
+    return sorted(starts)
+
+
+class PrefixIndex:
+    """
+    Sorted prefix index over (item_id, name, price) items.
+
+    Not thread-safe on its own; TypeaheadIndex serializes access.
+    """
+
+    def __init__(self, items=()):
+        self.items = {}       # item_id -> (name, price, key)
+        self._names = []      # sorted (key, name, item_id)
+        self._words = []      # sorted (key[start:], name, item_id)
+        self.replace_all(items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def replace_all(self, items):
+        self.items = {}
+        names = []
+        words = []
+        for item_id, name, price in items:
+            key = normalize(name)
+            self.items[item_id] = (name, price, key)
+            names.append((key, name, item_id))
+            words.extend((key[start:], name, item_id) for start in word_starts(key))
+        names.sort()
+        words.sort()
+        self._names = names
+        self._words = words
+
+    def _discard(self, entries, entry):
+        position = bisect.bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def remove(self, item_id):
+        current = self.items.pop(item_id, None)
+        if current is None:
+            return
+        name, _, key = current
+        self._discard(self._names, (key, name, item_id))
+        for start in word_starts(key):
+            self._discard(self._words, (key[start:], name, item_id))
+
+    def upsert(self, item_id, name, price):
+        """Add an item, or update it in place; returns False if nothing changed"""
+        current = self.items.get(item_id)
+        if current is not None and current[:2] == (name, price):
+            return False
+        if current is not None and current[0] == name:
+            self.items[item_id] = (name, price, current[2])
+            return True
+        self.remove(item_id)
+        key = normalize(name)
+        self.items[item_id] = (name, price, key)
+        bisect.insort(self._names, (key, name, item_id))
+        for start in word_starts(key):
+            bisect.insort(self._words, (key[start:], name, item_id))
+        return True
+
+    @staticmethod
+    def _scan(entries, prefix, limit, seen, out):
+        position = bisect.bisect_left(entries, (prefix,))
+        while position < len(entries) and len(out) < limit:
+            key, _, item_id = entries[position]
+            if not key.startswith(prefix):
+                break
+            if item_id not in seen:
+                seen.add(item_id)
+                out.append(item_id)
+            position += 1
+
+    def search(self, query, limit=10):
+        """Up to limit (item_id, name, price): name prefix matches first, then word prefix"""
+        prefix = normalize(query).strip()
+        if not prefix or limit <= 0:
+            return []
+        seen = set()
+        found = []
+        self._scan(self._names, prefix, limit, seen, found)
+        self._scan(self._words, prefix, limit, seen, found)
+        return [(item_id, self.items[item_id][0], self.items[item_id][1]) for item_id in found]
+
+
+class TypeaheadIndex:
+    """
+    PrefixIndex over one table, synced incrementally.
+
+    table, id_column, name_column, price_column name what to index
+    (price_column may be None); connect returns a pooled connection.
+    """
+
+    def __init__(self, connect, table, id_column, name_column, price_column=None, max_age=300):
+        self.connect = connect
+        self.table = table
+        self.max_age = float(max_age)
+        price = price_column or 'NULL'
+        self._select_sql = (
+            f"SELECT {id_column}, {name_column}, {price}, UNIX_TIMESTAMP(updated_at) FROM {table} "
+            f"WHERE {name_column} IS NOT NULL AND {name_column} != ''"
+        )
+        self._fingerprint_sql = (
+            f"SELECT COUNT(*), COALESCE(BIT_XOR({id_column}), 0) FROM {table} "
+            f"WHERE {name_column} IS NOT NULL AND {name_column} != ''"
+        )
+        self._lock = threading.Lock()
+        self._index = None
+        self._watermark = None
+        self._synced_at = 0.0
+        self._generation = 0
+        self._synced_generation = -1
+        self._full_loads = 0
+        self._delta_syncs = 0
+        self._rows_synced = 0
+
+    def mark_stale(self):
+        with self._lock:
+            self._generation += 1
+
+    def _rows(self, cursor, since=None):
+        if since is None:
+            cursor.execute(self._select_sql)
+        else:
+            cursor.execute(self._select_sql + " AND updated_at >= FROM_UNIXTIME(%s)", (since,))
+        return cursor.fetchall()
+
+    def _advance_watermark(self, rows):
+        stamps = [row[3] for row in rows if row[3] is not None]
+        if stamps:
+            latest = float(max(stamps))
+            if self._watermark is None or latest > self._watermark:
+                self._watermark = latest
+
+    def _price(self, value):
+        return None if value is None else float(value)
+
+    def _full_load(self, cursor):
+        rows = self._rows(cursor)
+        self._index = PrefixIndex((row[0], row[1], self._price(row[2])) for row in rows)
+        self._watermark = None
+        self._advance_watermark(rows)
+        self._full_loads += 1
+
+    def _delta_sync(self, cursor):
+        if self._watermark is None:
+            self._full_load(cursor)
+            return
+        rows = self._rows(cursor, since=self._watermark - SYNC_OVERLAP)
+        for item_id, name, price, _ in rows:
+            self._index.upsert(item_id, name, self._price(price))
+        self._advance_watermark(rows)
+        self._delta_syncs += 1
+        self._rows_synced += len(rows)
+
+        # Deletes (and renames to an empty name) leave no updated_at behind
+        cursor.execute(self._fingerprint_sql)
+        count, checksum = cursor.fetchone()
+        expected = 0
+        for item_id in self._index.items:
+            expected ^= item_id
+        if count != len(self._index) or int(checksum) != expected:
+            self._full_load(cursor)
+
+    def _sync(self):
+        # Caller holds the lock
+        generation = self._generation
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if self._index is None:
+                self._full_load(cursor)
+            else:
+                self._delta_sync(cursor)
+            cursor.close()
+        finally:
+            conn.close()
+        self._synced_generation = generation
+        self._synced_at = time.monotonic()
+
+    def search(self, query, limit=10):
+        """(item_id, name, price) matches, syncing first if the table was written"""
+        with self._lock:
+            if (self._index is None or self._synced_generation != self._generation
+                    or time.monotonic() - self._synced_at > self.max_age):
+                self._sync()
+            return self._index.search(query, limit)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'table': self.table,
+                'items': len(self._index) if self._index is not None else None,
+                'full_loads': self._full_loads,
+                'delta_syncs': self._delta_syncs,
+                'rows_synced': self._rows_synced,
+                'stale': self._synced_generation != self._generation,
+            }